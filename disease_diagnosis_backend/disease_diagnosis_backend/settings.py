@@ -43,6 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Removes itself from the chain unless REQUEST_PROFILING is True
+    'diseases.instrumentation.ProfilingMiddleware',
+    # Applies catalog changes made by other processes, see CATALOG_SYNC_INTERVAL
+    'diseases.changefeed.CatalogSyncMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -81,9 +85,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Persistent connections, checked before reuse in each request
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        # Seconds a writer waits for the SQLite lock before "database is locked"
+        'OPTIONS': {'timeout': 20},
     }
 }
 
+# Optional read replica: reads of the diseases app go to 'replica' outside
+# transactions on the primary (see diseases.db.ReadReplicaRouter). With
+# PostgreSQL, point it at a streaming replica. With SQLite, opening the same
+# file read-only keeps API reads off the write lock during reloads:
+# DATABASES['replica'] = {
+#     **DATABASES['default'],
+#     'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+#     'TEST': {'MIRROR': 'default'},
+# }
+DATABASE_ROUTERS = ['diseases.db.ReadReplicaRouter']
+
+# Applied to every new SQLite connection; mmap_size is in bytes, a negative
+# cache_size in KiB. These only last for the connection.
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+}
+
+# Switch SQLite databases to WAL so readers run during a write. The journal
+# mode is stored in the database file and WAL leaves -wal/-shm files next to
+# it, so leave it off for the db.sqlite3 committed with the project and turn
+# it on where the database is created at deploy time.
+SQLITE_WAL = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -137,6 +171,8 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 
 # REST Framework settings
+# 'diseases.renderers.ORJSONRenderer' can replace JSONRenderer for faster
+# rendering of the same bytes (orjson, from requirements-optional.txt)
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -147,3 +183,77 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.JSONParser',
     ],
 }
+
+# Disease list search backend: 'auto' uses SQLite FTS5 or PostgreSQL full-text
+# search depending on the database, 'contains' keeps unranked substring search
+DISEASE_SEARCH_BACKEND = 'auto'
+
+# Seconds the disease stats snapshot stays cached. It is also invalidated on
+# every Disease change, but with the default per-process cache a reload from
+# another process is only picked up once the snapshot expires.
+DISEASE_STATS_CACHE_TIMEOUT = 60
+
+# Maximum number of symptom lists accepted by /api/symptom-checker/batch/
+SYMPTOM_CHECKER_BATCH_MAX_SIZE = 5000
+
+# Per-request phase and SQL timings as Server-Timing headers, aggregated
+# per route at /api/metrics/ (Prometheus text format)
+REQUEST_PROFILING = False
+
+# Symptom-checker result cache: 'local' (per-process LRU), 'django' (the
+# SYMPTOM_CHECKER_CACHE_ALIAS cache, shared across processes) or None
+SYMPTOM_CHECKER_CACHE = 'local'
+SYMPTOM_CHECKER_CACHE_ALIAS = 'default'
+SYMPTOM_CHECKER_CACHE_SIZE = 10000
+SYMPTOM_CHECKER_CACHE_TIMEOUT = 300
+
+# Single-flight coalescing of identical concurrent symptom-checker and list
+# search requests; waiters compute on their own after the timeout (seconds)
+REQUEST_COALESCING = True
+REQUEST_COALESCING_TIMEOUT = 10
+
+# Catalog change feed: seconds between polls for changes made by other
+# processes (None disables polling), versions kept in the change log, and
+# changed rows above which indexes are rebuilt rather than patched
+CATALOG_SYNC_INTERVAL = 1.0
+CATALOG_CHANGE_RETENTION = 1000
+CATALOG_DELTA_MAX_ROWS = 1000
+
+# Patched catalog slots above which the compact catalog is compacted into a
+# new one, when they also outnumber the current diseases
+CATALOG_COMPACT_MIN_ROWS = 1000
+
+# Serve symptom-checker rows from the shared in-memory compact catalog
+# (diseases.catalog) instead of one database query per request
+SYMPTOM_CHECKER_CATALOG = True
+
+# Warm-start snapshot of the compact catalog and symptom index written by
+# build_snapshot. Processes map them from it while the database is at the
+# catalog version it was written at or loaded from the same CSV file, and
+# rewrite it when stale; None disables
+CATALOG_SNAPSHOT_PATH = None
+
+# Symptom checker scoring engine: 'index' (in-memory inverted index),
+# 'sparse' (vectorized sparse-matrix scoring, requires numpy and scipy from
+# requirements-optional.txt) or 'parallel' (inverted index sharded across
+# worker processes)
+SYMPTOM_SCORING_ENGINE = 'index'
+
+# 'parallel' engine: pool size (None uses every CPU), the catalog size
+# below which it scores in process instead, and the multiprocessing start
+# method of its workers (None uses the platform default)
+SYMPTOM_SCORING_WORKERS = None
+SYMPTOM_SCORING_PARALLEL_THRESHOLD = 50000
+SYMPTOM_SCORING_START_METHOD = None
+
+# Default minimum trigram similarity for fuzzy symptom matching
+SYMPTOM_FUZZY_THRESHOLD = 0.3
+
+# BM25 parameters of ranking=idf: term saturation and length normalization
+SYMPTOM_BM25_K1 = 1.2
+SYMPTOM_BM25_B = 0.75
+
+# Seconds the catalog version stamp behind ETags and the response cache is
+# cached, and how long rendered list/detail/stats responses are kept
+CATALOG_VERSION_CACHE_TIMEOUT = 60
+DISEASE_RESPONSE_CACHE_TIMEOUT = 300
@@ -12,13 +12,17 @@ ALLOWED_HOSTS = [
     '127.0.0.1',
 ]
 
-# Database configuration for Vercel (using SQLite for simplicity)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': '/tmp/db.sqlite3',
-    }
-}
+# Database configuration for Vercel (using SQLite for simplicity). /tmp is
+# the only writable path; connection and pragma tuning come from settings.py
+DATABASES['default']['NAME'] = '/tmp/db.sqlite3'
+SQLITE_WAL = True
+
+# Optional warm-start snapshot. The database above starts empty on every
+# instance and is loaded from Diseases_Symptoms.csv; a snapshot written at
+# build time from the same file serves every such instance, as it is
+# matched by the file's hash and its ids are remapped by disease code, e.g.
+#   python manage.py load_diseases && python manage.py build_snapshot --output catalog.snapshot
+CATALOG_SNAPSHOT_PATH = os.environ.get('CATALOG_SNAPSHOT_PATH') or None
 
 # Static files configuration for Vercel
 STATIC_URL = '/static/'
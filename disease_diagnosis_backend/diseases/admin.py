@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Disease
+from .models import Disease, Symptom, Treatment
 
 
 @admin.register(Disease)
@@ -21,3 +21,9 @@ class DiseaseAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(Symptom, Treatment)
+class TermAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
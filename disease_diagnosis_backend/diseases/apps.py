@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class DiseasesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'diseases'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .db import apply_sqlite_pragmas
+        from .search import ensure_sqlite_fts_triggers
+
+        post_migrate.connect(ensure_sqlite_fts_triggers, sender=self)
+        connection_created.connect(apply_sqlite_pragmas)
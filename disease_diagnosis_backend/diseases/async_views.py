@@ -0,0 +1,211 @@
+"""
+Async variants of the read API and the symptom checker for ASGI deployments.
+
+DRF views are synchronous, so these are plain Django coroutine views that
+return the same JSON as their counterparts in views.py. Rows are read with
+the async ORM and symptoms are scored on worker threads, so neither a
+request waiting on the database nor one being scored blocks the event
+loop. They skip the catalog ETag/response cache of the sync views.
+"""
+import json
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .catalog import compact_catalog
+from .coalescing import disease_list_flight, symptom_checker_flight
+from .fast_serializers import (
+    DISEASE_COLUMNS, DISEASE_LIST_FIELDS, SYMPTOM_CHECKER_COLUMNS, disease_data
+)
+from .instrumentation import phase
+from .models import Disease
+from .result_cache import get_result_cache
+from .serializers import SymptomCheckerSerializer
+from .stats import aget_stats
+from .views import (
+    DiseaseListView, disease_list_queryset, get_symptom_engine, get_symptom_matcher, symptom_checker_key,
+    symptom_checker_payload, symptom_checker_results, use_compact_catalog, with_query_options
+)
+
+
+def render_json(data, status=200):
+    """Render with the first configured DRF renderer, as the sync views do"""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    with phase('render'):
+        content = renderer.render(data)
+    return HttpResponse(content, content_type=renderer.media_type, status=status)
+
+
+def async_api_view(methods):
+    """Method check and CSRF exemption of @api_view, for coroutine views"""
+    allowed = set(methods) | ({'HEAD'} if 'GET' in methods else set())
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in allowed:
+                response = render_json({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+                response['Allow'] = ', '.join(sorted(allowed))
+                return response
+            return await view_func(request, *args, **kwargs)
+
+        # csrf_exempt() would hide the coroutine behind a sync wrapper in Django 4.1
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+async def amatch_many(queries, options):
+    """
+    Score (input_symptoms, top_k) queries like get_symptom_matcher(options).
+
+    An unbuilt engine is built first on the thread that holds the request's
+    database connection. Scoring itself is CPU-bound but needs no
+    connection, so it runs on any free worker thread, off the event loop.
+    """
+    engine = get_symptom_engine(options)
+    if not engine.is_built:
+        await sync_to_async(engine.ensure_built)()
+    return await sync_to_async(get_symptom_matcher(options), thread_sensitive=False)(queries)
+
+
+async def acatalog_records(disease_ids):
+    """compact_catalog.records(); building the catalog reads every row, so that happens in a thread"""
+    catalog = compact_catalog.current() or await sync_to_async(compact_catalog.get)()
+    return catalog.records(disease_ids)
+
+
+@async_api_view(['GET'])
+async def disease_list(request):
+    """
+    Async DiseaseListView: same filters, search and page-number pagination
+    (?pagination=cursor is not supported here)
+    """
+    if request.GET.get('search'):
+        # Identical concurrent searches share one query
+        data, status = await disease_list_flight.ado(
+            request.build_absolute_uri(), partial(disease_list_data, request)
+        )
+    else:
+        data, status = await disease_list_data(request)
+    return render_json(data, status=status)
+
+
+async def disease_list_data(request):
+    """(data, status) of the async disease list, paged like DiseaseListView"""
+    # Picking the search backend may introspect the schema, so build it in a thread
+    queryset = await sync_to_async(disease_list_queryset)(request.GET)
+    queryset = queryset.values(*DISEASE_LIST_FIELDS)
+
+    paginator = DiseaseListView.pagination_class()
+    drf_request = Request(request)
+    django_paginator = paginator.django_paginator_class(queryset, paginator.get_page_size(drf_request))
+    # Paginator.count is a cached_property; fill it with the async ORM
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(drf_request, django_paginator)
+    try:
+        page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        message = paginator.invalid_page_message.format(page_number=page_number, message=str(exc))
+        return {'detail': message}, 404
+
+    with phase('fetch'):
+        results = [row async for row in page.object_list.aiterator()]
+    paginator.page = page
+    paginator.request = drf_request
+    return paginator.get_paginated_response(results).data, 200
+
+
+@async_api_view(['GET'])
+async def disease_detail(request, pk):
+    """
+    Async DiseaseDetailView
+    """
+    try:
+        with phase('fetch'):
+            row = await Disease.objects.values(*DISEASE_COLUMNS).aget(pk=pk)
+    except Disease.DoesNotExist:
+        return render_json({'detail': 'Not found.'}, status=404)
+    with phase('serialize'):
+        data = disease_data(row)
+    return render_json(data)
+
+
+@async_api_view(['POST'])
+async def symptom_checker(request):
+    """
+    Async symptom_checker
+    """
+    try:
+        data = json.loads(request.body) if request.body else {}
+    except ValueError as e:
+        return render_json({'detail': f'JSON parse error - {e}'}, status=400)
+
+    serializer = SymptomCheckerSerializer(data=with_query_options(data, request.GET))
+    if not serializer.is_valid():
+        return render_json(serializer.errors, status=400)
+
+    input_symptoms = serializer.validated_data['symptoms']
+    options = serializer.validated_data
+    # Identical concurrent queries share one scoring run
+    results = await symptom_checker_flight.ado(
+        symptom_checker_key(input_symptoms, 10, options),
+        partial(symptom_checker_results_for, input_symptoms, options)
+    )
+    return render_json(symptom_checker_payload(input_symptoms, results))
+
+
+async def symptom_checker_results_for(input_symptoms, options):
+    """Serialized top-10 results of one query, matches through the result cache"""
+    queries = [(input_symptoms, 10)]
+    result_cache = None if options.get('fuzzy') else get_result_cache()
+    matches = None
+    if result_cache is not None:
+        # The catalog version may need a query and shared caches do I/O
+        [key] = await sync_to_async(result_cache.make_keys)(queries, options.get('ranking', 'match'))
+        matches = (await sync_to_async(result_cache.get_many)([key])).get(key)
+
+    if matches is None:
+        with phase('score'):
+            [matches] = await amatch_many(queries, options)
+        if result_cache is not None:
+            await sync_to_async(result_cache.set_many)({key: matches})
+
+    disease_ids = {match[0] for match in matches}
+    with phase('fetch'):
+        if not use_compact_catalog():
+            rows = Disease.objects.filter(pk__in=disease_ids).values(*SYMPTOM_CHECKER_COLUMNS)
+            diseases = {row['id']: row async for row in rows.aiterator()}
+        else:
+            diseases = await acatalog_records(disease_ids)
+
+    with phase('serialize'):
+        return symptom_checker_results(matches, diseases)
+
+
+@async_api_view(['GET'])
+async def disease_stats(request):
+    """
+    Async disease_stats
+    """
+    return render_json(await aget_stats())
+
+
+@async_api_view(['GET'])
+async def health_check(request):
+    """
+    Async health_check
+    """
+    stats = await aget_stats()
+    return render_json({
+        'status': 'healthy',
+        'backend': 'django',
+        'database_connected': True,
+        'diseases_loaded': stats['total_diseases'] > 0,
+        'total_diseases': stats['total_diseases']
+    })
@@ -0,0 +1,134 @@
+import hashlib
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from .db import use_primary
+from .models import CatalogVersion, Disease
+
+CATALOG_VERSION_CACHE_KEY = 'diseases:catalog-version'
+RESPONSE_CACHE_KEY_PREFIX = 'diseases:response'
+DISEASE_UPDATED_AT_CACHE_KEY_PREFIX = 'diseases:updated-at'
+
+# Headers recomputed per request and never replayed from the response cache
+UNCACHED_HEADERS = {'etag', 'last-modified', 'content-length'}
+
+
+def get_catalog_version():
+    """
+    Return the cached (version, last_modified) stamp of the Disease table.
+
+    Both halves come from the CatalogVersion row the change feed bumps on
+    every save and delete, so ETags and Last-Modified move together. The
+    stamp is dropped by invalidate_catalog_version() whenever this process
+    applies a change.
+    """
+    stamp = cache.get(CATALOG_VERSION_CACHE_KEY)
+    if stamp is None:
+        with use_primary():
+            row = CatalogVersion.objects.filter(pk=1).values_list('version', 'updated_at').first()
+        version, last_modified = row or (0, None)
+        # The timestamp keeps stamps unique if the table is ever reset
+        version = '{}-{}'.format(version, last_modified.timestamp() if last_modified else 0)
+        stamp = (version, last_modified)
+        cache.set(CATALOG_VERSION_CACHE_KEY, stamp, getattr(settings, 'CATALOG_VERSION_CACHE_TIMEOUT', 60))
+    return stamp
+
+
+def invalidate_catalog_version():
+    cache.delete(CATALOG_VERSION_CACHE_KEY)
+
+
+def _request_key(request):
+    version, _ = get_catalog_version()
+    # The absolute URI: pagination links embed the scheme and host
+    return hashlib.md5(f'{version}:{request.build_absolute_uri()}'.encode()).hexdigest()
+
+
+def catalog_etag(request, *args, **kwargs):
+    """Strong ETag for a read endpoint: catalog version plus absolute URL"""
+    return f'"{_request_key(request)}"'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return get_catalog_version()[1]
+
+
+def disease_last_modified(request, pk, *args, **kwargs):
+    """
+    Last-Modified of a single disease: its own updated_at, cached under the
+    catalog version so a revalidation does not query the database
+    """
+    version, _ = get_catalog_version()
+    key = f'{DISEASE_UPDATED_AT_CACHE_KEY_PREFIX}:{version}:{pk}'
+    # Cached as a 1-tuple, so a missing disease is cached too
+    cached = cache.get(key)
+    if cached is None:
+        with use_primary():
+            cached = (Disease.objects.filter(pk=pk).values_list('updated_at', flat=True).first(),)
+        cache.set(key, cached, getattr(settings, 'DISEASE_RESPONSE_CACHE_TIMEOUT', 300))
+    return cached[0]
+
+
+def cache_catalog_response(view_func):
+    """
+    Serve GET responses from the cache framework, keyed on the absolute URL
+    and the catalog version, so any Disease write makes old entries unreachable.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+
+        key = f'{RESPONSE_CACHE_KEY_PREFIX}:{_request_key(request)}'
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers:
+                response.headers[header] = value
+            return response
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            def store(rendered):
+                headers = [
+                    (header, value) for header, value in rendered.items()
+                    if header.lower() not in UNCACHED_HEADERS
+                ]
+                cache.set(
+                    key, (rendered.content, headers),
+                    getattr(settings, 'DISEASE_RESPONSE_CACHE_TIMEOUT', 300)
+                )
+            response.add_post_render_callback(store)
+        return response
+
+    return wrapper
+
+
+def catalog_cached(view_func=None, *, last_modified_func=catalog_last_modified):
+    """
+    Conditional GET (ETag / Last-Modified, answering 304 before the view
+    runs) in front of the catalog response cache. Views whose
+    representation has its own modification time pass last_modified_func.
+    """
+    if view_func is None:
+        return partial(catalog_cached, last_modified_func=last_modified_func)
+
+    conditional_view = condition(etag_func=catalog_etag, last_modified_func=last_modified_func)(
+        cache_catalog_response(view_func)
+    )
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        # Only successful representations are validators clients may revalidate
+        if response.status_code >= 400:
+            del response.headers['ETag']
+            del response.headers['Last-Modified']
+        return response
+
+    return wrapper
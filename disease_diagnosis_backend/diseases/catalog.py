@@ -0,0 +1,511 @@
+"""
+Compact catalog of the columns the symptom checker returns.
+
+Instead of one dict or model instance per disease, every column lives in a
+flat buffer shared by all rows, indexed by slot:
+
+    ids                   array('q'), one disease per slot
+    names, codes          string tables: UTF-8 bytes plus array('I') end offsets
+    vocabulary            distinct symptom phrases, interned as integers
+    symptom_offsets       array('I') CSR row pointers into symptom_ids
+    symptom_ids           array('I') vocabulary ids of each disease's phrases
+    flags                 bytearray bit array, FLAG_COUNT bits per disease
+    lookup_ids/positions  ids sorted for binary search, and their slots
+
+A freshly built catalog holds its diseases in name order. Changed rows are
+appended as new slots and the slots they replace are retired, both stamped
+with the catalog generation that made the change, so readers pinned to a
+generation see a consistent catalog while it is patched. Symptom indexes
+follow the change log to update only the affected postings. A catalog
+built from a warm-start snapshot reads its columns from the mapped file
+until its first change copies them, and carries the snapshot's index
+buffers for the symptom index to start from.
+
+DiseaseRecord is a __slots__ view of one row that reads like a
+values(*SYMPTOM_CHECKER_COLUMNS) dict, so the fast serializers accept it.
+footprint() reports the bytes held per buffer.
+"""
+import logging
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import transaction
+
+from .db import use_primary
+from .instrumentation import metrics_registry
+from .models import Disease
+from .snapshot import catalog_version, warm_start_buffers, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+CONTAGIOUS = 0
+CHRONIC = 1
+FLAG_COUNT = 2
+
+# Columns read from Disease, in CompactCatalog row order
+CATALOG_COLUMNS = ['id', 'name', 'disease_code', 'contagious', 'chronic', 'symptoms_list']
+
+STRING_TABLES = {'names', 'codes', 'vocabulary'}
+
+# Generation stamped on slots that are still current
+CURRENT = 1 << 63
+
+
+class StringTable:
+    """Strings stored end to end as UTF-8, addressed by index; append-only"""
+
+    __slots__ = ['data', 'ends']
+
+    def __init__(self, strings=()):
+        self.data = bytearray()
+        self.ends = array('I')
+        self.extend(strings)
+
+    @classmethod
+    def from_buffers(cls, data, ends):
+        """Wrap the buffers() of a table, UTF-8 bytes and byte end offsets, without copying"""
+        table = cls()
+        table.data = data
+        table.ends = ends
+        return table
+
+    def materialize(self):
+        """Copy buffers that are views of a snapshot, so the table can be appended to"""
+        if isinstance(self.data, memoryview):
+            self.data = bytearray(self.data)
+            self.ends = array('I', self.ends.tobytes())
+
+    def buffers(self):
+        return self.data, self.ends
+
+    def append(self, string):
+        self.data += string.encode('utf-8')
+        self.ends.append(len(self.data))
+
+    def extend(self, strings):
+        for string in strings:
+            self.append(string)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, index):
+        start = self.ends[index - 1] if index else 0
+        return str(self.data[start:self.ends[index]], 'utf-8')
+
+    def nbytes(self):
+        return sys.getsizeof(self.data) + sys.getsizeof(self.ends)
+
+
+class DiseaseRecord:
+    """View of one catalog row; item access mirrors a values() row"""
+
+    __slots__ = ['catalog', 'position']
+
+    def __init__(self, catalog, position):
+        self.catalog = catalog
+        self.position = position
+
+    @property
+    def id(self):
+        return self.catalog.ids[self.position]
+
+    @property
+    def name(self):
+        return self.catalog.names[self.position]
+
+    @property
+    def disease_code(self):
+        return self.catalog.codes[self.position]
+
+    @property
+    def contagious(self):
+        return self.catalog.flag(self.position, CONTAGIOUS)
+
+    @property
+    def chronic(self):
+        return self.catalog.flag(self.position, CHRONIC)
+
+    @property
+    def symptoms_list(self):
+        return self.catalog.symptoms(self.position)
+
+    def __getitem__(self, key):
+        if key not in CATALOG_COLUMNS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+class CompactCatalog:
+    """
+    Catalog built once from (id, name, code, contagious, chronic,
+    symptoms_list) rows and patched in place by apply_rows()
+    """
+
+    BUFFERS = [
+        'ids', 'names', 'codes', 'vocabulary', 'symptom_offsets', 'symptom_ids',
+        'flags', 'lookup_ids', 'lookup_positions',
+    ]
+    __slots__ = BUFFERS + [
+        'generation', 'changes', 'born', 'retired', 'moved', 'live', 'symptom_total', 'interned',
+        'index_buffers',
+    ]
+
+    def __init__(self, rows):
+        """rows in name order"""
+        rows = list(rows)
+        self.ids = array('q')
+        self.names = StringTable()
+        self.codes = StringTable()
+        self.vocabulary = StringTable()
+        self.symptom_offsets = array('I', [0])
+        self.symptom_ids = array('I')
+        self.flags = bytearray()
+        self.interned = {}
+        for row in rows:
+            self.append(row)
+        # The phrase -> id dict is only kept while the catalog is patched
+        self.interned = None
+        # IndexState.buffers() of this catalog's unpatched slots, if known
+        self.index_buffers = None
+
+        self.sort_lookup()
+        self.reset_changes()
+
+    def sort_lookup(self):
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        self.lookup_ids = array('q', [self.ids[position] for position in order])
+        self.lookup_positions = array('I', order)
+
+    def reset_changes(self):
+        self.generation = 0
+        # (generation, retired slots, added slots) for every apply_rows()
+        self.changes = []
+        # Generation that added or retired each slot, for slots changed since the build
+        self.born = {}
+        self.retired = {}
+        # Current slot of every id changed since the build
+        self.moved = {}
+        self.live = len(self.ids)
+        self.symptom_total = len(self.symptom_ids)
+
+    def append(self, row):
+        """Store a row in a new slot and return the slot"""
+        disease_id, name, code, contagious, chronic, phrases = row
+        position = len(self.ids)
+        if self.interned is None:
+            vocabulary = self.vocabulary
+            self.interned = {vocabulary[phrase_id]: phrase_id for phrase_id in range(len(vocabulary))}
+        for phrase in phrases:
+            phrase_id = self.interned.get(phrase)
+            if phrase_id is None:
+                phrase_id = self.interned[phrase] = len(self.vocabulary)
+                self.vocabulary.append(phrase)
+            self.symptom_ids.append(phrase_id)
+        self.symptom_offsets.append(len(self.symptom_ids))
+
+        while len(self.flags) * 8 < (position + 1) * FLAG_COUNT:
+            self.flags.append(0)
+        for flag, value in ((CONTAGIOUS, contagious), (CHRONIC, chronic)):
+            if value:
+                bit = position * FLAG_COUNT + flag
+                self.flags[bit >> 3] |= 1 << (bit & 7)
+
+        self.names.append(name)
+        self.codes.append(code)
+        # Written last: the slot exists once its id does
+        self.ids.append(disease_id)
+        return position
+
+    def apply_rows(self, disease_ids, rows):
+        """
+        Replace the diseases in disease_ids by rows, their current CATALOG_COLUMNS
+        values; ids without a row were deleted. Callers serialize writes.
+        """
+        if self.mapped:
+            self.materialize()
+        generation = self.generation + 1
+        retired = [
+            position for position in map(self.position, disease_ids) if position is not None
+        ]
+        added = []
+        for row in rows:
+            position = self.append(row)
+            self.born[position] = generation
+            added.append(position)
+
+        # Point ids at their new slots before retiring the old ones, so
+        # records() never misses an updated disease
+        for position in added:
+            self.moved[self.ids[position]] = position
+        for position in retired:
+            self.retired[position] = generation
+
+        self.live += len(added) - len(retired)
+        self.symptom_total += (
+            sum(self.symptom_count(position) for position in added)
+            - sum(self.symptom_count(position) for position in retired)
+        )
+        self.changes.append((generation, retired, added))
+        # Published last, once the change is complete
+        self.generation = generation
+
+    def visible(self, position, generation):
+        """Whether the slot holds a current row as of generation"""
+        return self.born.get(position, 0) <= generation < self.retired.get(position, CURRENT)
+
+    def needs_compaction(self):
+        """
+        Whether slots added or retired since the build outnumber
+        max(CATALOG_COMPACT_MIN_ROWS, current diseases), so a catalog built
+        from rows() would be much smaller
+        """
+        patched = len(self.born) + len(self.retired)
+        return patched > max(getattr(settings, 'CATALOG_COMPACT_MIN_ROWS', 1000), self.live)
+
+    def __len__(self):
+        """Number of current diseases; len(ids) counts slots"""
+        return self.live
+
+    def flag(self, position, flag):
+        bit = position * FLAG_COUNT + flag
+        return bool(self.flags[bit >> 3] & (1 << (bit & 7)))
+
+    def symptoms(self, position):
+        vocabulary = self.vocabulary
+        return [vocabulary[symptom_id] for symptom_id in self.phrase_ids(position)]
+
+    def phrase_ids(self, position):
+        """Vocabulary ids of the row's symptom phrases, in list order"""
+        return self.symptom_ids[self.symptom_offsets[position]:self.symptom_offsets[position + 1]]
+
+    def symptom_count(self, position):
+        return self.symptom_offsets[position + 1] - self.symptom_offsets[position]
+
+    def position(self, disease_id):
+        """Current slot of disease_id, or None"""
+        position = self.moved.get(disease_id)
+        if position is None:
+            index = bisect_left(self.lookup_ids, disease_id)
+            if index == len(self.lookup_ids) or self.lookup_ids[index] != disease_id:
+                return None
+            position = self.lookup_positions[index]
+        return None if position in self.retired else position
+
+    def name_order(self):
+        """Current slots in name order"""
+        if not self.generation:
+            return range(len(self.ids))
+        return sorted(
+            (position for position in range(len(self.ids)) if position not in self.retired),
+            key=self.names.__getitem__
+        )
+
+    def records(self, disease_ids):
+        """{id: DiseaseRecord} for the ids present in the catalog"""
+        records = {}
+        for disease_id in disease_ids:
+            position = self.position(disease_id)
+            if position is not None:
+                records[disease_id] = DiseaseRecord(self, position)
+        return records
+
+    def row(self, position):
+        """The row in a slot, in constructor form"""
+        return (
+            self.ids[position], self.names[position], self.codes[position],
+            self.flag(position, CONTAGIOUS), self.flag(position, CHRONIC), self.symptoms(position),
+        )
+
+    def rows(self):
+        """Every current row in constructor form, in name order"""
+        for position in self.name_order():
+            yield self.row(position)
+
+    @property
+    def mapped(self):
+        """Whether the columns are still views of a warm-start snapshot"""
+        return isinstance(self.names.data, memoryview)
+
+    def materialize(self):
+        """Copy columns that are views of a warm-start snapshot into buffers the catalog owns"""
+        for name in self.BUFFERS:
+            value = getattr(self, name)
+            if name in STRING_TABLES:
+                value.materialize()
+            elif isinstance(value, memoryview):
+                setattr(self, name, bytearray(value) if value.format == 'B' else array(value.format, value.tobytes()))
+
+    @classmethod
+    def from_buffers(cls, buffers):
+        """Rebuild a catalog from the {name: buffer} mapping of buffers(), without copying"""
+        catalog = cls.__new__(cls)
+        for name in cls.BUFFERS:
+            if name in STRING_TABLES:
+                value = StringTable.from_buffers(buffers[f'{name}.data'], buffers[f'{name}.ends'])
+            else:
+                value = buffers[name]
+            setattr(catalog, name, value)
+        catalog.interned = None
+        catalog.index_buffers = {name: buffer for name, buffer in buffers.items() if name.startswith('index.')} or None
+        catalog.reset_changes()
+        return catalog
+
+    def remap_ids(self, code_ids):
+        """
+        Give every slot of an unpatched catalog the id code_ids maps its
+        disease code to; False, leaving the catalog unchanged, unless
+        code_ids holds exactly the catalog's codes
+        """
+        codes = self.codes
+        if len(code_ids) != len(codes):
+            return False
+        try:
+            ids = array('q', [code_ids[codes[position]] for position in range(len(codes))])
+        except KeyError:
+            return False
+        self.ids = ids
+        self.sort_lookup()
+        return True
+
+    def buffers(self):
+        """{name: bytes or array} of every column of an unpatched catalog, as stored by the warm-start snapshot"""
+        buffers = {}
+        for name in self.BUFFERS:
+            value = getattr(self, name)
+            if name in STRING_TABLES:
+                buffers[f'{name}.data'], buffers[f'{name}.ends'] = value.buffers()
+            else:
+                buffers[name] = value
+        return buffers
+
+    def footprint(self):
+        """Bytes held by each buffer, plus their total"""
+        sizes = {
+            'ids': sys.getsizeof(self.ids),
+            'names': self.names.nbytes(),
+            'codes': self.codes.nbytes(),
+            'vocabulary': self.vocabulary.nbytes(),
+            'symptoms': sys.getsizeof(self.symptom_offsets) + sys.getsizeof(self.symptom_ids),
+            'flags': sys.getsizeof(self.flags),
+            'lookup': sys.getsizeof(self.lookup_ids) + sys.getsizeof(self.lookup_positions),
+        }
+        sizes['total'] = sum(sizes.values())
+        return sizes
+
+
+class CatalogStore:
+    """
+    Process-wide CompactCatalog of the Disease table, built lazily and
+    shared by the symptom-checker views and every in-process symptom index,
+    which derive their state from it. Changed rows are read again and
+    patched into the catalog in place; once the patched slots outnumber
+    max(CATALOG_COMPACT_MIN_ROWS, current diseases) the catalog is
+    compacted into a new one from memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        """Drop the catalog so it is rebuilt on next use"""
+        with self._lock:
+            self._state = None
+
+    @property
+    def is_built(self):
+        """Whether the catalog is loaded, so records() will not query the database"""
+        return self._state is not None
+
+    @use_primary()
+    def build(self):
+        """
+        Build the catalog from the warm-start snapshot if it serves the
+        database, else from the Disease table and rewrite the snapshot
+        """
+        warm_start = warm_start_buffers()
+        if warm_start is not None:
+            buffers, match = warm_start
+            catalog = CompactCatalog.from_buffers(buffers)
+            # Loaded from the same file, but the ids are this database's
+            if match == 'version' or catalog.remap_ids(dict(Disease.objects.values_list('disease_code', 'id'))):
+                return catalog
+
+        path = getattr(settings, 'CATALOG_SNAPSHOT_PATH', None)
+        if not path:
+            return CompactCatalog(Disease.objects.values_list(*CATALOG_COLUMNS).order_by('name'))
+        # One transaction, so the rows are those of the recorded version
+        with transaction.atomic():
+            version = catalog_version()
+            catalog = CompactCatalog(Disease.objects.values_list(*CATALOG_COLUMNS).order_by('name'))
+        if len(catalog):
+            self.write_snapshot(path, catalog, version)
+        return catalog
+
+    def write_snapshot(self, path, catalog, version):
+        """
+        Best-effort rewrite of a stale snapshot from a freshly built
+        catalog; the symptom index built for it then starts from its buffers
+        """
+        from .index import build_index_state
+
+        index_buffers = build_index_state(catalog).buffers()
+        try:
+            write_snapshot(path, {**catalog.buffers(), **index_buffers}, version)
+        except OSError as exc:
+            logger.warning('Could not rewrite the catalog snapshot %s: %s', path, exc)
+        catalog.index_buffers = index_buffers
+
+    def current(self):
+        """The built catalog, or None; never queries the database"""
+        return self._state
+
+    def get(self):
+        state = self._state
+        if state is None:
+            with self._lock:
+                state = self._state
+                if state is None:
+                    state = self._state = self.build()
+        return state
+
+    @use_primary()
+    def apply_changes(self, disease_ids):
+        """Patch a built catalog in place, reading only disease_ids"""
+        with self._lock:
+            state = self._state
+            if state is None:
+                return
+            # Read under the lock so concurrent patches apply in commit order
+            rows = Disease.objects.filter(pk__in=disease_ids).values_list(*CATALOG_COLUMNS)
+            state.apply_rows(disease_ids, rows)
+            if state.needs_compaction():
+                self._state = CompactCatalog(state.rows())
+
+    def records(self, disease_ids):
+        return self.get().records(disease_ids)
+
+
+compact_catalog = CatalogStore()
+
+
+def catalog_metrics():
+    """Prometheus lines with the bytes held by the catalog, when built"""
+    state = compact_catalog._state
+    if state is None:
+        return []
+    lines = [
+        '# HELP diseases_catalog_bytes Memory held by the compact catalog, by buffer.',
+        '# TYPE diseases_catalog_bytes gauge',
+    ]
+    for component, size in state.footprint().items():
+        lines.append(f'diseases_catalog_bytes{{component="{component}"}} {size}')
+    lines.append(f'diseases_catalog_diseases {len(state)}')
+    return lines
+
+
+metrics_registry.add_collector(catalog_metrics)
@@ -0,0 +1,218 @@
+"""
+Catalog change feed.
+
+Every write to Disease bumps the single CatalogVersion row and logs the
+changed ids under the new version in CatalogChange, in the same
+transaction. Once it commits, the writing process patches its compact
+catalog for those rows only; the symptom indexes derive from it. Other processes notice the new
+version when CatalogSyncMiddleware polls, at most every
+CATALOG_SYNC_INTERVAL seconds, and apply the logged ids the same way.
+
+Queryset deletes (including the admin's "delete selected") are logged as
+one version; other writes touching many rows at once should run inside
+batched_changes() for the same effect.
+
+A process more than CATALOG_CHANGE_RETENTION versions behind, or facing
+more than CATALOG_DELTA_MAX_ROWS changed rows, drops its indexes and
+rebuilds them on next use instead.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .caching import invalidate_catalog_version
+from .catalog import compact_catalog
+from .db import use_primary
+from .fuzzy import fuzzy_index
+from .index import symptom_index
+from .models import CatalogChange, CatalogVersion
+from .parallel import parallel_engine
+from .result_cache import clear_result_caches
+from .scoring import invalidate_scoring_engines, sparse_engine
+from .stats import invalidate_stats
+from .suggest import suggest_index
+
+_pending_changes = ContextVar('diseases_pending_changes', default=None)
+
+
+def delta_max_rows():
+    return getattr(settings, 'CATALOG_DELTA_MAX_ROWS', 1000)
+
+
+def catalog_changed(disease_ids=None, **kwargs):
+    """
+    Bring every derived view of the Disease table up to date.
+
+    With disease_ids the built compact catalog is patched for those rows and
+    the symptom indexes follow its change log on next use; without, or for
+    too many rows, everything is dropped and rebuilt from the database.
+    """
+    if disease_ids is None or None in disease_ids or len(disease_ids) > delta_max_rows():
+        invalidate_scoring_engines()
+        suggest_index.invalidate()
+        compact_catalog.invalidate()
+    else:
+        # The symptom indexes and engines derive from the catalog and follow it
+        compact_catalog.apply_changes(disease_ids)
+    invalidate_stats()
+    invalidate_catalog_version()
+    clear_result_caches()
+
+
+def derived_data_built():
+    """Whether any in-memory view of the catalog is loaded in this process"""
+    return any(
+        derived.is_built
+        for derived in [symptom_index, fuzzy_index, suggest_index, sparse_engine, parallel_engine, compact_catalog]
+    )
+
+
+def current_version():
+    return CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+@contextmanager
+def batched_changes():
+    """
+    Collect the disease ids recorded within the block and log them as one
+    catalog version on exit; yields the set so bulk writers can add to it.
+    """
+    changed = set()
+    token = _pending_changes.set(changed)
+    try:
+        yield changed
+    finally:
+        _pending_changes.reset(token)
+    if changed:
+        record_changes(changed)
+
+
+def record_changes(disease_ids):
+    """Log changed (saved or deleted) disease ids; applied in process on commit"""
+    pending = _pending_changes.get()
+    if pending is not None:
+        pending.update(disease_ids)
+        return
+
+    disease_ids = set(disease_ids)
+    # Past the delta limit readers rebuild anyway, so log a single marker row
+    logged_ids = [None] if len(disease_ids) > delta_max_rows() else sorted(disease_ids)
+    retention = getattr(settings, 'CATALOG_CHANGE_RETENTION', 1000)
+    with transaction.atomic():
+        now = timezone.now()
+        # Any change after a load means the table no longer matches its source file
+        if not CatalogVersion.objects.filter(pk=1).update(
+            version=F('version') + 1, updated_at=now, source_hash=''
+        ):
+            CatalogVersion.objects.create(pk=1, version=1, updated_at=now)
+        version = current_version()
+        CatalogChange.objects.bulk_create(
+            [CatalogChange(version=version, disease_id=disease_id) for disease_id in logged_ids],
+            batch_size=500
+        )
+        CatalogChange.objects.filter(version__lte=version - retention).delete()
+    transaction.on_commit(partial(catalog_feed.committed, version, logged_ids))
+
+
+def record_source(source_hash):
+    """
+    Mark the table as exactly the rows of the source file with this digest,
+    see snapshot.source_digest(); call after the load's changes are logged.
+    """
+    if not CatalogVersion.objects.filter(pk=1).update(source_hash=source_hash):
+        CatalogVersion.objects.create(pk=1, version=0, updated_at=timezone.now(), source_hash=source_hash)
+
+
+class CatalogFeed:
+    """Tracks the catalog version this process's derived data reflects"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self._next_poll = 0.0
+
+    def interval(self):
+        return getattr(settings, 'CATALOG_SYNC_INTERVAL', 1.0)
+
+    def due(self):
+        return time.monotonic() >= self._next_poll
+
+    def committed(self, version, disease_ids):
+        """Apply a change committed by this process"""
+        with self._lock:
+            catalog_changed(disease_ids=disease_ids)
+            if self.version == version - 1:
+                self.version = version
+
+    @use_primary()
+    def poll(self):
+        """Apply the changes logged since the last poll, by any process"""
+        with self._lock:
+            if not self.due():
+                return
+            self._next_poll = time.monotonic() + self.interval()
+            current = current_version()
+            if current == self.version:
+                return
+
+            if self.version is None and not derived_data_built():
+                # First poll: nothing built yet reflects an older version, and
+                # the warm-start snapshot must survive until first use
+                self.version = current
+                return
+
+            retention = getattr(settings, 'CATALOG_CHANGE_RETENTION', 1000)
+            if self.version is None or not 0 < current - self.version <= retention:
+                # Built before the first poll, log pruned past our version,
+                # or the table was reset
+                catalog_changed()
+            else:
+                catalog_changed(disease_ids=set(
+                    CatalogChange.objects.filter(
+                        version__gt=self.version, version__lte=current
+                    ).values_list('disease_id', flat=True)
+                ))
+            self.version = current
+
+
+catalog_feed = CatalogFeed()
+
+
+class CatalogSyncMiddleware:
+    """
+    Poll the change feed before handling a request, at most every
+    CATALOG_SYNC_INTERVAL seconds; removed from the chain when it is None.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if catalog_feed.interval() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets Django 4.1 call this instance as a coroutine function
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if catalog_feed.due():
+            catalog_feed.poll()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if catalog_feed.due():
+            await sync_to_async(catalog_feed.poll)()
+        return await self.get_response(request)
@@ -0,0 +1,166 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+While one request computes the result for a key, identical requests of the
+same process wait for it instead of scoring or querying the catalog again.
+Sync callers (WSGI threads, or the thread pool ASGI runs sync views in) wait
+on a threading.Event; coroutines await a future resolved on their own loop,
+so both kinds can share one computation.
+
+A waiter that is not answered within REQUEST_COALESCING_TIMEOUT seconds, or
+whose leader was cancelled, computes the result itself. Exceptions raised
+by the leader are raised in every waiter, as the same input would have
+failed the same way.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+
+from .instrumentation import metrics_registry
+
+
+def coalescing_enabled():
+    return getattr(settings, 'REQUEST_COALESCING', True)
+
+
+class _Call:
+    """One in-flight computation and the coroutines waiting on it"""
+
+    __slots__ = ['done', 'result', 'error', 'abandoned', 'waiters']
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+        self.waiters = []
+
+
+def _resolve(future):
+    # Cancelled by wait_for() when the waiter timed out
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """Coalesces calls sharing a key; counts leaders, coalesced waiters and fallbacks"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.counts = {'leader': 0, 'coalesced': 0, 'fallback': 0}
+        _flights.append(self)
+
+    def timeout(self):
+        return getattr(settings, 'REQUEST_COALESCING_TIMEOUT', 10)
+
+    def _join(self, key):
+        """Return (call, is_leader) for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.counts['leader'] += 1
+                return call, True
+            return call, False
+
+    def _count(self, result):
+        with self._lock:
+            self.counts[result] += 1
+
+    def _finish(self, key, call, result=None, error=None, abandoned=False):
+        call.result, call.error, call.abandoned = result, error, abandoned
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            waiters, call.waiters = call.waiters, []
+            call.done.set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _outcome(self, call):
+        self._count('coalesced')
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, func):
+        """Return func(), or the result of an identical call already in flight"""
+        if not coalescing_enabled():
+            return func()
+        call, leader = self._join(key)
+        if leader:
+            try:
+                result = func()
+            except Exception as exc:
+                self._finish(key, call, error=exc)
+                raise
+            except BaseException:
+                self._finish(key, call, abandoned=True)
+                raise
+            self._finish(key, call, result=result)
+            return result
+
+        if not call.done.wait(self.timeout()) or call.abandoned:
+            self._count('fallback')
+            return func()
+        return self._outcome(call)
+
+    async def ado(self, key, coroutine_function):
+        """Async do(): await coroutine_function(), or an identical call already in flight"""
+        if not coalescing_enabled():
+            return await coroutine_function()
+        call, leader = self._join(key)
+        if leader:
+            try:
+                result = await coroutine_function()
+            except Exception as exc:
+                self._finish(key, call, error=exc)
+                raise
+            except BaseException:
+                # Cancelled, e.g. the client went away; waiters compute on their own
+                self._finish(key, call, abandoned=True)
+                raise
+            self._finish(key, call, result=result)
+            return result
+
+        future = None
+        with self._lock:
+            if not call.done.is_set():
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                call.waiters.append((loop, future))
+        if future is not None:
+            try:
+                await asyncio.wait_for(future, self.timeout())
+            except asyncio.TimeoutError:
+                self._count('fallback')
+                return await coroutine_function()
+        if call.abandoned:
+            self._count('fallback')
+            return await coroutine_function()
+        return self._outcome(call)
+
+
+_flights = []
+
+symptom_checker_flight = SingleFlight('symptom_checker')
+disease_list_flight = SingleFlight('disease_list')
+
+
+def coalescing_metrics():
+    """Prometheus lines with the request counts of every SingleFlight"""
+    lines = [
+        '# HELP diseases_coalesced_requests_total Requests by single-flight role: '
+        'computed (leader), shared a result (coalesced) or computed after waiting (fallback).',
+        '# TYPE diseases_coalesced_requests_total counter',
+    ]
+    for flight in _flights:
+        for result, count in flight.counts.items():
+            lines.append(f'diseases_coalesced_requests_total{{flight="{flight.name}",result="{result}"}} {count}')
+    return lines
+
+
+metrics_registry.add_collector(coalescing_metrics)
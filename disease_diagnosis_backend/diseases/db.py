@@ -0,0 +1,82 @@
+"""
+Database connection tuning and read-replica routing.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_use_primary = ContextVar('diseases_use_primary', default=False)
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Apply SQLITE_PRAGMAS, and WAL when SQLITE_WAL is on, to every new SQLite
+    connection; connected to connection_created
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    # The journal mode is a property of the file: set by writers only, and
+    # never on in-memory (test) databases
+    if (
+        getattr(settings, 'SQLITE_WAL', False)
+        and 'mode=ro' not in str(connection.settings_dict['NAME'])
+        and not connection.is_in_memory_db()
+    ):
+        pragmas['journal_mode'] = 'wal'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def use_primary():
+    """Route diseases reads to the primary database within the block (or decorated function)"""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Send reads of the diseases app to the 'replica' database when one is
+    configured; writes always go to 'default'.
+
+    Reads stay on the primary inside a transaction on it (so load_diseases
+    and admin edits see their own writes) and within use_primary(), which
+    the in-process indexes, stats and catalog version use so a lagging
+    replica never ends up cached.
+    """
+
+    def _is_diseases_model(self, model):
+        return model._meta.app_label == 'diseases'
+
+    def db_for_read(self, model, **hints):
+        if not self._is_diseases_model(model) or REPLICA_DB_ALIAS not in settings.DATABASES:
+            return None
+        if _use_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if self._is_diseases_model(model):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is maintained by replication (or is the primary file, read-only)
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -0,0 +1,74 @@
+"""
+Plain-dict fast paths for the hot read shapes.
+
+Each function builds exactly what the matching DRF serializer in
+serializers.py returns (same keys, order and value formatting) from a
+values() row, without per-field serializer machinery. The DRF serializers
+stay the reference implementation; benchmark_serializers checks both
+render to identical bytes.
+"""
+from django.utils import timezone
+
+from .serializers import DiseaseListSerializer
+
+DISEASE_LIST_FIELDS = DiseaseListSerializer.Meta.fields
+
+# Columns to select() for each shape
+DISEASE_COLUMNS = [
+    'id', 'name', 'symptoms', 'treatments', 'disease_code', 'contagious',
+    'chronic', 'symptoms_list', 'treatments_list', 'created_at', 'updated_at'
+]
+SYMPTOM_CHECKER_COLUMNS = ['id', 'name', 'disease_code', 'contagious', 'chronic', 'symptoms_list']
+
+
+def serialize_datetime(value):
+    """Match rest_framework.fields.DateTimeField with the default ISO 8601 format"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def disease_data(row):
+    """DiseaseSerializer shape from a values(*DISEASE_COLUMNS) row"""
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'symptoms': row['symptoms'],
+        'treatments': row['treatments'],
+        'disease_code': row['disease_code'],
+        'contagious': row['contagious'],
+        'chronic': row['chronic'],
+        'symptoms_list': row['symptoms_list'],
+        'treatments_list': row['treatments_list'],
+        'created_at': serialize_datetime(row['created_at']),
+        'updated_at': serialize_datetime(row['updated_at']),
+    }
+
+
+def symptom_checker_result_data(row, match_score, match_percentage, matched_symptoms=None, score=None):
+    """
+    SymptomCheckerResultSerializer shape from a values(*SYMPTOM_CHECKER_COLUMNS)
+    row, with the BM25 score when given, or FuzzySymptomCheckerResultSerializer
+    shape when matched_symptoms is given.
+    """
+    data = {
+        'id': row['id'],
+        'name': row['name'],
+        'disease_code': row['disease_code'],
+        'contagious': row['contagious'],
+        'chronic': row['chronic'],
+        'match_score': match_score,
+        'match_percentage': match_percentage,
+    }
+    if score is not None:
+        data['score'] = score
+    data['symptoms_list'] = row['symptoms_list']
+    if matched_symptoms is not None:
+        data['matched_symptoms'] = matched_symptoms
+    return data
+
@@ -0,0 +1,182 @@
+import re
+from array import array
+
+from django.conf import settings
+
+from .index import SymptomIndex, normalize_symptom, symptom_index
+
+_NON_ALNUM_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def trigram_key(text):
+    """Lowercased letters and digits of a phrase, the text its trigrams are taken from"""
+    return _NON_ALNUM_RE.sub('', text.lower())
+
+
+def trigrams(text):
+    """
+    Return the set of character trigrams of a symptom phrase.
+
+    Spacing and punctuation are ignored so "head ache" and "headache" share
+    every trigram; the padding favours matching word starts like pg_trgm.
+    """
+    key = trigram_key(text)
+    if not key:
+        return set()
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndexState:
+    """
+    Trigram postings over the terms of one symptom index state, and the
+    terms too short to share a trigram with every input containing them
+    """
+
+    __slots__ = ['index', 'trigram_postings', 'trigram_counts', 'short_terms']
+
+    def __init__(self, index):
+        self.index = index
+        self.trigram_postings = {}
+        self.trigram_counts = array('I')
+        self.short_terms = []
+        self.sync()
+
+    def is_synced(self):
+        return len(self.trigram_counts) == len(self.index.terms)
+
+    def sync(self):
+        """Index the terms added to the symptom index since the last call"""
+        terms = self.index.terms
+        for term_id in range(len(self.trigram_counts), len(terms)):
+            grams = trigrams(terms[term_id])
+            self.trigram_counts.append(len(grams))
+            if len(trigram_key(terms[term_id])) < 3:
+                self.short_terms.append(term_id)
+            for gram in grams:
+                self.trigram_postings.setdefault(gram, []).append(term_id)
+
+
+class FuzzySymptomIndex(SymptomIndex):
+    """
+    Typo-tolerant variant of SymptomIndex.
+
+    The distinct terms of the symptom index are indexed by character
+    trigram, following that index as it is patched or rebuilt. An input term
+    is compared only with terms sharing at least one trigram, and matches
+    them when one contains the other or when their trigram (Jaccard)
+    similarity reaches the threshold. Results also report which catalog
+    symptom each input term matched.
+    """
+
+    def source(self):
+        return symptom_index._get_state()
+
+    def current_source(self):
+        return symptom_index.current()
+
+    def build(self, index):
+        return FuzzyIndexState(index)
+
+    def default_threshold(self):
+        return getattr(settings, 'SYMPTOM_FUZZY_THRESHOLD', 0.3)
+
+    def similar_phrases(self, input_symptom, threshold=None, state=None):
+        """
+        Return (phrase, similarity) pairs matching the input symptom, best first.
+
+        Substring matches are reported with a similarity of 1.0.
+        """
+        if threshold is None:
+            threshold = self.default_threshold()
+        if state is None:
+            state = self._get_state()
+
+        terms = state.index.terms
+        return [
+            (terms[term_id], similarity)
+            for term_id, similarity in self.similar_terms(input_symptom, threshold, state)
+        ]
+
+    def similar_terms(self, input_symptom, threshold, state):
+        """Like similar_phrases(), with term ids of the index state"""
+        terms = state.index.terms
+        term = normalize_symptom(input_symptom)
+        grams = trigrams(term)
+
+        # Count shared trigrams for every term reachable through the postings
+        shared = {}
+        for gram in grams:
+            for term_id in state.trigram_postings.get(gram, ()):
+                shared[term_id] = shared.get(term_id, 0) + 1
+
+        # A phrase or input of fewer than 3 letters and digits need not share
+        # a trigram with what contains it, so those are checked directly
+        if len(trigram_key(term)) < 3:
+            candidates = range(len(state.trigram_counts))
+        else:
+            candidates = shared.keys() | set(state.short_terms)
+
+        matches = []
+        for term_id in candidates:
+            phrase = terms[term_id]
+            if term in phrase or phrase in term:
+                similarity = 1.0
+            else:
+                common = shared.get(term_id, 0)
+                if not common:
+                    continue
+                similarity = common / (len(grams) + state.trigram_counts[term_id] - common)
+                if similarity < threshold:
+                    continue
+            matches.append((term_id, similarity))
+
+        matches.sort(key=lambda x: (-x[1], terms[x[0]]))
+        return matches
+
+    def match(self, input_symptoms, limit=10, threshold=None):
+        """
+        Score diseases against the input symptoms with fuzzy matching.
+
+        Returns ranked (disease_id, match_score, match_percentage,
+        matched_symptoms) tuples, where matched_symptoms maps each input
+        term to the best catalog symptom it matched for that disease.
+        """
+        if not input_symptoms:
+            return []
+
+        state = self._get_state()
+        index = state.index
+        generation = index.generation
+        if threshold is None:
+            threshold = self.default_threshold()
+
+        scores = {}
+        matched_symptoms = {}
+        for input_symptom in input_symptoms:
+            matched = set()
+            for term_id, _ in self.similar_terms(input_symptom, threshold, state):
+                for position in index.positions(term_id, generation):
+                    if position not in matched:
+                        # Terms come best first, so keep the first one per disease
+                        matched.add(position)
+                        disease_id = index.catalog.ids[position]
+                        matched_symptoms.setdefault(disease_id, {})[input_symptom] = index.terms[term_id]
+            for position in matched:
+                scores[position] = scores.get(position, 0) + 1
+
+        return [
+            (disease_id, match_score, match_percentage, matched_symptoms[disease_id])
+            for disease_id, match_score, match_percentage
+            in self.rank(index, scores, len(input_symptoms), limit)
+        ]
+
+    def match_many(self, queries, threshold=None):
+        """Score a list of (input_symptoms, limit) queries"""
+        return [
+            self.match(input_symptoms, limit=limit, threshold=threshold)
+            for input_symptoms, limit in queries
+        ]
+
+
+fuzzy_index = FuzzySymptomIndex()
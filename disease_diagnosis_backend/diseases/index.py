@@ -0,0 +1,367 @@
+import heapq
+import math
+import threading
+from array import array
+
+from django.conf import settings
+
+from .catalog import StringTable, compact_catalog
+
+
+def normalize_symptom(symptom):
+    """Return the canonical form used to compare symptom phrases"""
+    return symptom.strip().lower()
+
+
+class IndexState:
+    """
+    Inverted index over one CompactCatalog.
+
+    Catalog vocabulary phrases are folded into distinct normalized terms,
+    each with the catalog slots of the diseases listing it and the number
+    of those that are current. sync() follows the catalog's change log:
+    added slots are appended to their postings and retired ones only
+    leave the counts, as queries pinned to the state's generation skip
+    slots that are not visible to them. Results carry disease ids.
+
+    A state restored from a warm-start snapshot reads its postings from
+    the mapped file; a posting is copied when a slot is first added to it.
+    """
+
+    __slots__ = [
+        'catalog', 'terms', 'term_ids', 'phrase_terms', 'postings', 'doc_counts', 'generation', 'bm25',
+    ]
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.terms = []
+        self.term_ids = {}
+        self.phrase_terms = array('I')
+        self.postings = []
+        self.doc_counts = array('I')
+        self.generation = catalog.generation
+        # (generation, IDFs, length norms), see bm25_weights()
+        self.bm25 = None
+
+    def add_phrases(self):
+        """Map the vocabulary phrases interned since the last call to terms"""
+        vocabulary = self.catalog.vocabulary
+        for phrase_id in range(len(self.phrase_terms), len(vocabulary)):
+            term = normalize_symptom(vocabulary[phrase_id])
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                term_id = self.term_ids[term] = len(self.terms)
+                self.postings.append(array('I'))
+                self.doc_counts.append(0)
+                # Appended last, as readers find terms through this list
+                self.terms.append(term)
+            self.phrase_terms.append(term_id)
+
+    def add(self, position):
+        phrase_ids = self.catalog.phrase_ids(position)
+        if phrase_ids and max(phrase_ids) >= len(self.phrase_terms):
+            self.add_phrases()
+        for phrase_id in phrase_ids:
+            term_id = self.phrase_terms[phrase_id]
+            posting = self.postings[term_id]
+            # Slots only grow, so a repeated phrase is the last entry
+            if not posting or posting[-1] != position:
+                if isinstance(posting, memoryview):
+                    posting = self.postings[term_id] = array('I', posting)
+                posting.append(position)
+                self.doc_counts[term_id] += 1
+
+    def remove(self, position):
+        for term_id in {self.phrase_terms[phrase_id] for phrase_id in self.catalog.phrase_ids(position)}:
+            self.doc_counts[term_id] -= 1
+
+    def is_synced(self):
+        return self.generation == self.catalog.generation
+
+    def sync(self):
+        """Apply the catalog changes made since the state's generation"""
+        catalog = self.catalog
+        for generation, retired, added in catalog.changes[self.generation:catalog.generation]:
+            for position in added:
+                self.add(position)
+            for position in retired:
+                self.remove(position)
+            self.generation = generation
+
+    def buffers(self):
+        """{name: bytes or array} of a state built over an unpatched catalog, as stored by the warm-start snapshot"""
+        offsets = array('I', [0])
+        positions = array('I')
+        for posting in self.postings:
+            positions.extend(posting)
+            offsets.append(len(positions))
+        terms_data, terms_ends = StringTable(self.terms).buffers()
+        return {
+            'index.terms.data': terms_data,
+            'index.terms.ends': terms_ends,
+            'index.phrase_terms': self.phrase_terms,
+            'index.posting_offsets': offsets,
+            'index.posting_positions': positions,
+            'index.doc_counts': self.doc_counts,
+        }
+
+    @classmethod
+    def from_buffers(cls, catalog, buffers):
+        """
+        Restore the state of buffers() over an unpatched catalog; postings
+        stay views of the buffers, the smaller arrays are copied.
+        """
+        state = cls(catalog)
+        state.generation = 0
+        terms = StringTable.from_buffers(buffers['index.terms.data'], buffers['index.terms.ends'])
+        state.terms = [terms[term_id] for term_id in range(len(terms))]
+        state.term_ids = {term: term_id for term_id, term in enumerate(state.terms)}
+        state.phrase_terms = array('I', buffers['index.phrase_terms'])
+        state.doc_counts = array('I', buffers['index.doc_counts'])
+        offsets = buffers['index.posting_offsets']
+        positions = memoryview(buffers['index.posting_positions'])
+        state.postings = [positions[offsets[term_id]:offsets[term_id + 1]] for term_id in range(len(state.terms))]
+        return state
+
+    def positions(self, term_id, generation):
+        """Slots of the current diseases listing a term, as of generation"""
+        catalog = self.catalog
+        if not catalog.generation:
+            return self.postings[term_id]
+        return [position for position in self.postings[term_id] if catalog.visible(position, generation)]
+
+    def bm25_weights(self):
+        """
+        (per-term IDF, per-slot length norm) arrays for ranking='idf',
+        computed on first use after each build or sync and kept until the
+        next one.
+        """
+        weights = self.bm25
+        generation = self.generation
+        if weights is None or weights[0] != generation:
+            weights = self.bm25 = (generation, self.idfs(), self.length_norms())
+        return weights[1], weights[2]
+
+    def idfs(self):
+        """
+        BM25 inverse document frequency of every term. Blank phrases, left
+        by stray commas, match every input and carry no information.
+        """
+        disease_count = len(self.catalog)
+        return array('d', [
+            math.log(1 + (disease_count - matches + 0.5) / (matches + 0.5)) if term else 0.0
+            for term, matches in zip(self.terms, self.doc_counts)
+        ])
+
+    def length_norms(self):
+        """
+        BM25 length norm of every slot. A disease lists a phrase at most
+        once, so the term frequency is always 1 and the norm depends on the
+        symptom count alone.
+        """
+        k1 = getattr(settings, 'SYMPTOM_BM25_K1', 1.2)
+        b = getattr(settings, 'SYMPTOM_BM25_B', 0.75)
+        catalog = self.catalog
+        average_length = catalog.symptom_total / max(len(catalog), 1) or 1
+        offsets = catalog.symptom_offsets
+        return array('d', [
+            (k1 + 1) / (1 + k1 * (1 - b + b * (offsets[position + 1] - offsets[position]) / average_length))
+            for position in range(len(offsets) - 1)
+        ])
+
+
+def build_index_state(catalog):
+    """
+    Build an IndexState from the interned vocabulary and symptom arrays of
+    a CompactCatalog, or from its warm-start index buffers
+    """
+    if catalog.index_buffers is not None:
+        state = IndexState.from_buffers(catalog, catalog.index_buffers)
+        state.sync()
+        return state
+    state = IndexState(catalog)
+    state.add_phrases()
+    generation = state.generation
+    for position in range(len(catalog.ids)):
+        if catalog.visible(position, generation):
+            state.add(position)
+    return state
+
+
+class SymptomIndex:
+    """
+    Process-wide inverted index of normalized symptom phrases to diseases.
+
+    The index is built lazily from the shared compact catalog, patched
+    when that catalog is and rebuilt when it is replaced. It reproduces the
+    substring semantics of Disease.symptom_match_score, so results match a
+    full scan while only the candidate diseases are scored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (source, state) the state was built from
+        self._state = None
+
+    def invalidate(self):
+        """Drop the index so it is rebuilt on next use"""
+        with self._lock:
+            self._state = None
+
+    @property
+    def is_built(self):
+        """Whether the index is loaded and current, so matching will not query the database"""
+        return self.current() is not None
+
+    def ensure_built(self):
+        """Build the index now unless loaded; call where the database may be queried"""
+        self._get_state()
+
+    def source(self):
+        """What the state is built from: the compact catalog"""
+        return compact_catalog.get()
+
+    def current_source(self):
+        """The built source, or None; never queries the database"""
+        return compact_catalog.current()
+
+    def current(self):
+        """The state if built from the current source, or None; never queries the database"""
+        built = self._state
+        source = self.current_source()
+        if built is not None and source is not None and built[0] is source:
+            return built[1]
+        return None
+
+    def build(self, catalog):
+        return build_index_state(catalog)
+
+    def _get_state(self):
+        source = self.source()
+        built = self._state
+        if built is None or built[0] is not source or not built[1].is_synced():
+            with self._lock:
+                built = self._state
+                if built is None or built[0] is not source:
+                    built = self._state = (source, self.build(source))
+                built[1].sync()
+        return built[1]
+
+    def matching_terms(self, input_symptom, state):
+        """Ids of the terms matching the input symptom, either one containing the other"""
+        term = normalize_symptom(input_symptom)
+        return [term_id for term_id, phrase in enumerate(state.terms) if term in phrase or phrase in term]
+
+    def candidates(self, input_symptom, state=None, generation=None):
+        """Return catalog slots of diseases with a symptom matching the input symptom"""
+        if state is None:
+            state = self._get_state()
+        if generation is None:
+            generation = state.generation
+        matched = set()
+        for term_id in self.matching_terms(input_symptom, state):
+            matched.update(state.positions(term_id, generation))
+        return matched
+
+    def match(self, input_symptoms, limit=10, state=None):
+        """
+        Score diseases against the input symptoms.
+
+        Returns a ranked list of (disease_id, match_score, match_percentage)
+        tuples ordered exactly like the original full-table scan. A state
+        other than the built one (e.g. a catalog shard) may be passed in.
+        """
+        if not input_symptoms:
+            return []
+
+        if state is None:
+            state = self._get_state()
+        generation = state.generation
+
+        scores = {}
+        for input_symptom in input_symptoms:
+            for position in self.candidates(input_symptom, state, generation):
+                scores[position] = scores.get(position, 0) + 1
+
+        return self.rank(state, scores, len(input_symptoms), limit)
+
+    def rank(self, state, scores, input_count, limit):
+        """Turn a slot -> match_score mapping into ranked result tuples"""
+        catalog = state.catalog
+
+        results = []
+        for position, match_score in scores.items():
+            total_symptoms = catalog.symptom_count(position)
+            match_percentage = (match_score / max(input_count, total_symptoms)) * 100
+            results.append((position, match_score, round(match_percentage, 2)))
+
+        # Sort by match score (descending), then by match percentage, then by name
+        results = top_results(results, lambda x: (-x[1], -x[2]), catalog, limit)
+        return [(catalog.ids[position], match_score, percentage) for position, match_score, percentage in results]
+
+    def match_idf(self, input_symptoms, limit=10, state=None):
+        """
+        Score diseases like match(), ranked by BM25 relevance instead.
+
+        Each input symptom adds the highest IDF among the disease's matching
+        phrases, and the sum is scaled by the disease's length norm, so rare
+        symptoms outweigh generic ones like "pain". Returns
+        (disease_id, match_score, match_percentage, None, score) tuples; the
+        None stands in for the matched symptoms of fuzzy results.
+        """
+        if not input_symptoms:
+            return []
+
+        if state is None:
+            state = self._get_state()
+        generation = state.generation
+
+        idfs, length_norms = state.bm25_weights()
+        scores = {}
+        weights = {}
+        for input_symptom in input_symptoms:
+            best = {}
+            for term_id in self.matching_terms(input_symptom, state):
+                if term_id >= len(idfs):
+                    # Added by a later sync, so only in slots this query cannot see
+                    continue
+                weight = idfs[term_id]
+                for position in state.positions(term_id, generation):
+                    if weight > best.get(position, -1.0):
+                        best[position] = weight
+            for position, weight in best.items():
+                scores[position] = scores.get(position, 0) + 1
+                weights[position] = weights.get(position, 0.0) + weight
+
+        catalog = state.catalog
+        input_count = len(input_symptoms)
+        results = []
+        for position, match_score in scores.items():
+            total_symptoms = catalog.symptom_count(position)
+            match_percentage = (match_score / max(input_count, total_symptoms)) * 100
+            score = weights[position] * length_norms[position]
+            results.append((position, match_score, round(match_percentage, 2), None, round(score, 4)))
+
+        results = top_results(results, lambda x: (-x[4], -x[1], -x[2]), catalog, limit)
+        return [(catalog.ids[position], *result) for position, *result in results]
+
+    def match_many(self, queries, state=None, ranking='match'):
+        """Score a list of (input_symptoms, limit) queries; ranking='idf' uses match_idf()"""
+        match = self.match_idf if ranking == 'idf' else self.match
+        return [match(input_symptoms, limit=limit, state=state) for input_symptoms, limit in queries]
+
+
+def top_results(results, key, catalog, limit):
+    """
+    Sort (slot, ...) results by key, then by disease name, keeping the first
+    limit. Names are only read for the results that can make the cut.
+    """
+    if limit is not None and len(results) > limit:
+        cutoff = heapq.nsmallest(limit, map(key, results))[-1]
+        results = [result for result in results if key(result) <= cutoff]
+    names = catalog.names
+    results.sort(key=lambda result: (*key(result), names[result[0]]))
+    return results if limit is None else results[:limit]
+
+
+symptom_index = SymptomIndex()
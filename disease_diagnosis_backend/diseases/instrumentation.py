@@ -0,0 +1,273 @@
+"""
+Opt-in request profiling.
+
+With REQUEST_PROFILING enabled, ProfilingMiddleware records per request the
+time spent in named phases (see phase()), the number and duration of SQL
+queries and the total latency. Each response gets a Server-Timing header
+and the figures are aggregated per route into metrics_registry, served in
+Prometheus text format by /api/metrics/. Metrics are per process.
+
+When disabled the middleware removes itself from the chain
+(MiddlewareNotUsed), no query wrapper is installed and phase() only reads
+a context variable.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_profile = ContextVar('diseases_request_profile', default=None)
+
+
+class RequestProfile:
+    """Timings collected while one request is handled"""
+
+    __slots__ = ['phases', 'sql_count', 'sql_seconds', 'view_finished']
+
+    def __init__(self):
+        self.phases = {}
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.view_finished = None
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self, total):
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [f'db;dur={self.sql_seconds * 1000:.2f};desc="{self.sql_count} queries"']
+        entries += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.phases.items()]
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+class _Phase:
+    __slots__ = ['profile', 'name', 'started']
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoPhase:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name):
+    """Context manager timing a named phase of the current request, if profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        return _NO_PHASE
+    return _Phase(profile, name)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries of profiled requests"""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_count += 1
+        profile.sql_seconds += time.perf_counter() - started
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    """Add record_query to a connection; connected to connection_created"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Process-wide request metrics per route, rendered in Prometheus text format"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.collectors = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def add_collector(self, collector):
+        """Register a callable returning extra exposition lines for render()"""
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._requests = {}
+            self._latency = {}
+            self._queries = {}
+            self._phases = {}
+
+    def observe(self, route, method, status, seconds, profile):
+        with self._lock:
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            # Per-bucket counts, then sum and count; cumulated when rendered
+            latency = self._latency.setdefault((route, method), [0] * (len(self.buckets) + 3))
+            latency[bisect_left(self.buckets, seconds)] += 1
+            latency[-2] += seconds
+            latency[-1] += 1
+
+            queries = self._queries.setdefault(route, [0, 0.0])
+            queries[0] += profile.sql_count
+            queries[1] += profile.sql_seconds
+
+            for name, phase_seconds in profile.phases.items():
+                phase_totals = self._phases.setdefault((route, name), [0.0, 0])
+                phase_totals[0] += phase_seconds
+                phase_totals[1] += 1
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP diseases_http_requests_total Requests handled, by route, method and status.',
+                '# TYPE diseases_http_requests_total counter',
+            ]
+            for (route, method, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'diseases_http_requests_total{{route="{_escape(route)}",method="{method}",'
+                    f'status="{status}"}} {count}'
+                )
+
+            lines += [
+                '# HELP diseases_http_request_duration_seconds Request latency, by route and method.',
+                '# TYPE diseases_http_request_duration_seconds histogram',
+            ]
+            for (route, method), latency in sorted(self._latency.items()):
+                labels = f'route="{_escape(route)}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), latency):
+                    cumulative += count
+                    lines.append(f'diseases_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'diseases_http_request_duration_seconds_sum{{{labels}}} {latency[-2]}')
+                lines.append(f'diseases_http_request_duration_seconds_count{{{labels}}} {latency[-1]}')
+
+            lines += [
+                '# HELP diseases_db_queries_total SQL queries executed, by route.',
+                '# TYPE diseases_db_queries_total counter',
+            ]
+            for route, (count, _) in sorted(self._queries.items()):
+                lines.append(f'diseases_db_queries_total{{route="{_escape(route)}"}} {count}')
+            lines += [
+                '# HELP diseases_db_query_seconds_total Time spent in SQL queries, by route.',
+                '# TYPE diseases_db_query_seconds_total counter',
+            ]
+            for route, (_, seconds) in sorted(self._queries.items()):
+                lines.append(f'diseases_db_query_seconds_total{{route="{_escape(route)}"}} {seconds}')
+
+            lines += [
+                '# HELP diseases_phase_duration_seconds Time spent in instrumented phases, by route.',
+                '# TYPE diseases_phase_duration_seconds summary',
+            ]
+            for (route, name), (seconds, count) in sorted(self._phases.items()):
+                labels = f'route="{_escape(route)}",phase="{name}"'
+                lines.append(f'diseases_phase_duration_seconds_sum{{{labels}}} {seconds}')
+                lines.append(f'diseases_phase_duration_seconds_count{{{labels}}} {count}')
+
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+
+def profiling_enabled():
+    return getattr(settings, 'REQUEST_PROFILING', False)
+
+
+class ProfilingMiddleware:
+    """
+    Profile each request and report it as Server-Timing and in metrics_registry.
+
+    Removed from the middleware chain unless REQUEST_PROFILING is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets Django 4.1 call this instance as a coroutine function
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection=connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook returns
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.view_finished = time.perf_counter()
+        return response
+
+    def finish(self, request, response, profile, started):
+        finished = time.perf_counter()
+        if profile.view_finished is not None:
+            profile.add('render', finished - profile.view_finished)
+        total = finished - started
+
+        response['Server-Timing'] = profile.server_timing(total)
+        route = getattr(request.resolver_match, 'route', None) or 'unmatched'
+        metrics_registry.observe(route, request.method, response.status_code, total, profile)
+        return response
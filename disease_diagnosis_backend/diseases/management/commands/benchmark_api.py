@@ -0,0 +1,186 @@
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from diseases.models import Disease, Symptom
+from diseases.changefeed import catalog_changed
+from diseases.synthetic import generate_catalog, read_source_rows
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the symptom checker, list search, detail, stats and the CSV '
+        'loader on synthetic catalogs, in a throwaway test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000],
+            help='Catalog sizes to generate and benchmark, e.g. 10000 100000 1000000'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Timed requests per endpoint and catalog size'
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=os.path.join(settings.BASE_DIR.parent, 'Diseases_Symptoms.csv'),
+            help='CSV file the synthetic catalogs are derived from'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='benchmark-results.json',
+            help='Where to write the JSON results'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for catalogs and queries')
+
+    def handle(self, *args, **options):
+        source_rows = read_source_rows(options['source'])
+        if not source_rows:
+            raise CommandError(f'No diseases found in {options["source"]}')
+
+        results = {
+            'commit': self.git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'scoring_engine': getattr(settings, 'SYMPTOM_SCORING_ENGINE', 'index'),
+            'requests': options['requests'],
+            'sizes': {},
+        }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Measure the views themselves, not replays from the response or result caches
+            with tempfile.TemporaryDirectory() as tmp, override_settings(DISEASE_RESPONSE_CACHE_TIMEOUT=0, SYMPTOM_CHECKER_CACHE=None):
+                for size in sorted(options['sizes']):
+                    csv_file = os.path.join(tmp, f'diseases-{size}.csv')
+                    generate_catalog(source_rows, size, csv_file, seed=options['seed'])
+                    results['sizes'][str(size)] = self.benchmark_size(
+                        size, csv_file, max(1, options['requests']), random.Random(options['seed'])
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def benchmark_size(self, size, csv_file, requests, rng):
+        self.stdout.write(f'Catalog of {size} diseases')
+        call_command('flush', interactive=False, verbosity=0)
+        cache.clear()
+        catalog_changed()
+
+        result = {
+            'load': self.time_load(csv_file),
+            # Second load of the same file exercises the unchanged-row diff
+            'reload': self.time_load(csv_file),
+        }
+        for phase in ['load', 'reload']:
+            self.stdout.write(
+                f'  {phase:<16} {result[phase]["seconds"]:10.2f} s  '
+                f'{result[phase]["rows_per_second"]:12,.0f} rows/s'
+            )
+
+        ids = list(Disease.objects.values_list('id', flat=True))
+        phrases = list(Symptom.objects.values_list('name', flat=True))
+        words = sorted({word for phrase in phrases for word in phrase.split() if len(word) > 3})
+        client = Client()
+
+        # The first symptom check builds the scoring engine
+        started = time.perf_counter()
+        client.post('/api/symptom-checker/', {'symptoms': ['fever']}, content_type='application/json')
+        result['engine_build_seconds'] = round(time.perf_counter() - started, 3)
+        self.stdout.write(f'  {"engine build":<16} {result["engine_build_seconds"]:10.2f} s')
+
+        endpoints = {
+            'symptom_checker': lambda: client.post(
+                '/api/symptom-checker/',
+                {'symptoms': rng.sample(phrases, min(len(phrases), rng.randint(1, 4)))},
+                content_type='application/json'
+            ),
+            'list_search': lambda: client.get('/api/diseases/', {
+                'search': rng.choice(words),
+                'contagious': rng.choice(['true', 'false']),
+            }),
+            'detail': lambda: client.get(f'/api/diseases/{rng.choice(ids)}/'),
+            'stats': lambda: client.get('/api/stats/'),
+        }
+        result['endpoints'] = {}
+        for name, request in endpoints.items():
+            measured = result['endpoints'][name] = self.measure(name, request, requests)
+            self.stdout.write(
+                f'  {name:<16} p50 {measured["p50_ms"]:9.2f} ms  p99 {measured["p99_ms"]:9.2f} ms  '
+                f'{measured["throughput_rps"]:10,.0f} req/s'
+            )
+        return result
+
+    def time_load(self, csv_file):
+        started = time.perf_counter()
+        call_command('load_diseases', csv_file=csv_file, stdout=io.StringIO())
+        seconds = time.perf_counter() - started
+
+        count = Disease.objects.count()
+        if not count:
+            raise CommandError(f'load_diseases loaded nothing from {csv_file}')
+        return {'seconds': round(seconds, 3), 'rows': count, 'rows_per_second': round(count / seconds)}
+
+    def measure(self, name, request, requests):
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            sent = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - sent)
+            if response.status_code != 200:
+                raise CommandError(f'{name} returned {response.status_code}')
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': requests,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'mean_ms': round(sum(latencies) / requests * 1000, 3),
+            'throughput_rps': round(requests / elapsed, 1),
+        }
+
+    def git_commit(self):
+        try:
+            completed = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True
+            )
+        except OSError:
+            return None
+        return completed.stdout.strip() or None
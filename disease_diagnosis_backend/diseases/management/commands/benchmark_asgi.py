@@ -0,0 +1,92 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from diseases.models import Disease
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the sync views through the WSGI handler against their async '
+        'variants through the ASGI handler, in process, and report requests/s'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Requests per endpoint and handler'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Requests in flight at once (threads for WSGI, tasks for ASGI)'
+        )
+
+    def handle(self, *args, **options):
+        total = max(1, options['requests'])
+        concurrency = max(1, options['concurrency'])
+        disease = Disease.objects.order_by('id').first()
+        if disease is None:
+            raise CommandError('No diseases loaded. Run load_diseases first.')
+
+        checker = {'symptoms': ['fever', 'cough', 'headache']}
+        endpoints = [
+            ('list', 'diseases/?search=fever', None),
+            ('detail', f'diseases/{disease.pk}/', None),
+            ('symptom-checker', 'symptom-checker/', checker),
+            ('stats', 'stats/', None),
+            ('health', 'health/', None),
+        ]
+        self.stdout.write(f'{total} requests per endpoint, concurrency {concurrency}')
+
+        # Measure the views themselves, not replays from the response or result caches
+        with override_settings(DISEASE_RESPONSE_CACHE_TIMEOUT=0, SYMPTOM_CHECKER_CACHE=None):
+            for name, path, data in endpoints:
+                wsgi_rps = self.run_wsgi(f'/api/{path}', data, total, concurrency)
+                asgi_rps = asyncio.run(self.run_asgi(f'/api/async/{path}', data, total, concurrency))
+                self.stdout.write(
+                    f'  {name:<16} wsgi {wsgi_rps:10,.0f} req/s   '
+                    f'asgi {asgi_rps:10,.0f} req/s  {asgi_rps / wsgi_rps:5.2f}x'
+                )
+
+    def run_wsgi(self, path, data, total, concurrency):
+        def send(_):
+            # Client is not thread-safe, so each request gets its own
+            client = Client()
+            if data is None:
+                response = client.get(path)
+            else:
+                response = client.post(path, data, content_type='application/json')
+            self.check_response(path, response)
+
+        send(None)  # Warm up indexes and caches
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(send, range(total)))
+        return total / (time.perf_counter() - started)
+
+    async def run_asgi(self, path, data, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send():
+            async with semaphore:
+                if data is None:
+                    response = await client.get(path)
+                else:
+                    response = await client.post(path, data, content_type='application/json')
+            self.check_response(path, response)
+
+        await send()  # Warm up indexes and caches
+        started = time.perf_counter()
+        await asyncio.gather(*(send() for _ in range(total)))
+        return total / (time.perf_counter() - started)
+
+    def check_response(self, path, response):
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code}')
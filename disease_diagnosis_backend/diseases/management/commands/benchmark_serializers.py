@@ -0,0 +1,93 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from diseases.fast_serializers import (
+    DISEASE_COLUMNS, DISEASE_LIST_FIELDS, SYMPTOM_CHECKER_COLUMNS,
+    disease_data, symptom_checker_result_data
+)
+from diseases.models import Disease
+from diseases.renderers import ORJSONRenderer, orjson
+from diseases.serializers import (
+    DiseaseListSerializer, DiseaseSerializer, SymptomCheckerResultSerializer
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF and fast-path serialization throughput on the loaded disease catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Number of timed passes over the catalog per variant'
+        )
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        if not Disease.objects.exists():
+            raise CommandError('No diseases loaded. Run load_diseases first.')
+
+        renderers = [('json', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', ORJSONRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING('orjson is not installed, skipping ORJSONRenderer'))
+
+        shapes = [
+            ('list', self.drf_list, self.fast_list),
+            ('detail', self.drf_detail, self.fast_detail),
+            ('symptom-checker', self.drf_checker, self.fast_checker),
+        ]
+        row_count = Disease.objects.count()
+        self.stdout.write(f'Serializing {row_count} diseases, {repeat} passes per variant')
+
+        for shape, drf_variant, fast_variant in shapes:
+            reference = JSONRenderer().render(drf_variant())
+            baseline = None
+            for variant_name, variant in [('drf', drf_variant), ('fast', fast_variant)]:
+                for renderer_name, renderer in renderers:
+                    if renderer.render(variant()) != reference:
+                        raise CommandError(f'{shape}: {variant_name}+{renderer_name} output differs from DRF')
+
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        renderer.render(variant())
+                    elapsed = time.perf_counter() - started
+
+                    rows_per_second = row_count * repeat / elapsed
+                    if baseline is None:
+                        baseline = rows_per_second
+                    self.stdout.write(
+                        f'  {shape:<16} {variant_name:<5} {renderer_name:<7} '
+                        f'{rows_per_second:12,.0f} rows/s  {rows_per_second / baseline:5.1f}x'
+                    )
+
+        self.stdout.write(self.style.SUCCESS('All variants rendered byte-identical output'))
+
+    # Each variant fetches and serializes the whole catalog, as the views do
+
+    def drf_list(self):
+        return DiseaseListSerializer(Disease.objects.only(*DISEASE_LIST_FIELDS), many=True).data
+
+    def fast_list(self):
+        return list(Disease.objects.values(*DISEASE_LIST_FIELDS))
+
+    def drf_detail(self):
+        return DiseaseSerializer(Disease.objects.all(), many=True).data
+
+    def fast_detail(self):
+        return [disease_data(row) for row in Disease.objects.values(*DISEASE_COLUMNS)]
+
+    def drf_checker(self):
+        diseases = list(Disease.objects.all())
+        for disease in diseases:
+            disease.match_score = 1
+            disease.match_percentage = 33.33
+        return SymptomCheckerResultSerializer(diseases, many=True).data
+
+    def fast_checker(self):
+        return [
+            symptom_checker_result_data(row, 1, 33.33)
+            for row in Disease.objects.values(*SYMPTOM_CHECKER_COLUMNS)
+        ]
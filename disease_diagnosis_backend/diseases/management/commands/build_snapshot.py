@@ -0,0 +1,50 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from diseases.catalog import CATALOG_COLUMNS, CompactCatalog
+from diseases.index import build_index_state
+from diseases.models import Disease
+from diseases.snapshot import catalog_version, snapshot_is_current, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write the warm-start snapshot of the compact catalog and symptom index from the loaded diseases'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=getattr(settings, 'CATALOG_SNAPSHOT_PATH', None),
+            help='Snapshot file to write (defaults to CATALOG_SNAPSHOT_PATH)'
+        )
+        parser.add_argument(
+            '--if-stale',
+            action='store_true',
+            help='Only rebuild when the snapshot is missing, unreadable or does not serve the loaded catalog'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if not output:
+            raise CommandError('No --output given and CATALOG_SNAPSHOT_PATH is not set.')
+
+        if options['if_stale'] and snapshot_is_current(output):
+            self.stdout.write(f'Snapshot {output} is current, nothing to do')
+            return
+
+        started = time.perf_counter()
+        # One transaction, so the rows are those of the recorded version
+        with transaction.atomic():
+            version = catalog_version()
+            catalog = CompactCatalog(Disease.objects.values_list(*CATALOG_COLUMNS).order_by('name'))
+        if not len(catalog):
+            raise CommandError('No diseases loaded. Run load_diseases first.')
+
+        write_snapshot(output, {**catalog.buffers(), **build_index_state(catalog).buffers()}, version)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote snapshot of {len(catalog)} diseases and {len(catalog.vocabulary)} symptom phrases '
+            f'to {output} ({os.path.getsize(output):,} bytes) in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from diseases.catalog import CATALOG_COLUMNS, CompactCatalog
+from diseases.models import Disease
+from diseases.synthetic import generate_rows, read_source_rows
+
+# values() rows measured to estimate the dict-per-row footprint
+SAMPLE_SIZE = 1000
+
+
+def row_nbytes(row):
+    """Deep size of a values(*CATALOG_COLUMNS) dict row"""
+    size = sys.getsizeof(row)
+    for value in row.values():
+        size += sys.getsizeof(value)
+        if isinstance(value, list):
+            size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class Command(BaseCommand):
+    help = 'Report the memory footprint of the compact catalog, projected to a larger catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=0,
+            help='Measure a synthetic catalog of this many diseases instead of the loaded one'
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=os.path.join(settings.BASE_DIR.parent, 'Diseases_Symptoms.csv'),
+            help='CSV file synthetic diseases are derived from'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for --size')
+        parser.add_argument(
+            '--project',
+            type=int,
+            default=1000000,
+            help='Catalog size to extrapolate the footprint to'
+        )
+
+    def handle(self, *args, **options):
+        if options['size']:
+            rows = self.synthetic_rows(options)
+        else:
+            rows = list(Disease.objects.values_list(*CATALOG_COLUMNS).order_by('name'))
+        if not rows:
+            raise CommandError('No diseases loaded. Run load_diseases first or pass --size.')
+
+        started = time.perf_counter()
+        catalog = CompactCatalog(rows)
+        elapsed = time.perf_counter() - started
+
+        footprint = catalog.footprint()
+        count = len(catalog)
+        self.stdout.write(
+            f'Compact catalog of {count} diseases, {len(catalog.vocabulary)} distinct symptoms, '
+            f'built in {elapsed:.2f}s'
+        )
+        for component, size in footprint.items():
+            self.stdout.write(f'  {component:<12} {size:>14,} bytes  {size / count:10.1f} per disease')
+
+        sample = [dict(zip(CATALOG_COLUMNS, row)) for row in rows[:SAMPLE_SIZE]]
+        dict_per_disease = sum(row_nbytes(row) for row in sample) / len(sample)
+        compact_per_disease = footprint['total'] / count
+        project = options['project']
+        self.stdout.write(
+            f'values() dict rows: ~{dict_per_disease:,.0f} bytes per disease '
+            f'({dict_per_disease / compact_per_disease:.1f}x the compact catalog)'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Projected for {project:,} diseases: {compact_per_disease * project / 2**20:,.1f} MiB compact, '
+            f'{dict_per_disease * project / 2**20:,.1f} MiB as dict rows'
+        ))
+
+    def synthetic_rows(self, options):
+        source_rows = read_source_rows(options['source'])
+        if not source_rows:
+            raise CommandError(f'No diseases found in {options["source"]}')
+
+        def split(text):
+            return [item.strip() for item in text.split(',')] if text else []
+
+        def flag(text):
+            return text.strip().lower() in ['true', '1', 'yes']
+
+        rows = [
+            (i + 1, row['Name'], row['Disease_Code'], flag(row['Contagious']), flag(row['Chronic']),
+             split(row['Symptoms']))
+            for i, row in enumerate(generate_rows(source_rows, options['size'], options['seed']))
+        ]
+        rows.sort(key=lambda row: row[1])
+        return rows
@@ -0,0 +1,27 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from diseases.synthetic import generate_catalog, read_source_rows
+
+
+class Command(BaseCommand):
+    help = 'Write a synthetic disease CSV scaled up from Diseases_Symptoms.csv'
+
+    def add_arguments(self, parser):
+        parser.add_argument('size', type=int, help='Number of diseases to generate')
+        parser.add_argument('output', type=str, help='Path of the CSV file to write')
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=os.path.join(settings.BASE_DIR.parent, 'Diseases_Symptoms.csv'),
+            help='CSV file the synthetic diseases are derived from'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        source_rows = read_source_rows(options['source'])
+        if not source_rows:
+            raise CommandError(f'No diseases found in {options["source"]}')
+
+        generate_catalog(source_rows, options['size'], options['output'], seed=options['seed'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["size"]} diseases to {options["output"]}'))
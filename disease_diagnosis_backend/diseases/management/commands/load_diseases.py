@@ -1,8 +1,17 @@
 import csv
 import os
-from django.core.management.base import BaseCommand
-from django.conf import settings
-from diseases.models import Disease
+import time
+from contextlib import contextmanager
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from diseases.changefeed import batched_changes, record_source
+from diseases.models import Disease, Symptom, Treatment
+from diseases.snapshot import source_digest
+from diseases.terms import prune_orphan_terms, sync_disease_terms
+
+DISEASE_FIELDS = ['name', 'symptoms', 'treatments', 'contagious', 'chronic']
 
 
 class Command(BaseCommand):
@@ -15,78 +24,191 @@ class Command(BaseCommand):
             default='Diseases_Symptoms.csv',
             help='Path to the CSV file containing diseases data'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of CSV rows diffed and written per batch'
+        )
+        parser.add_argument(
+            '--keep-missing',
+            action='store_true',
+            help='Do not delete diseases that are no longer present in the CSV file'
+        )
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
-        
+        batch_size = max(1, options['batch_size'])
+
         # Try to find the CSV file in the project root
         if not os.path.isabs(csv_file):
             # Look in the parent directory of the Django project
             project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
             csv_file = os.path.join(project_root, csv_file)
-        
+
         if not os.path.exists(csv_file):
-            self.stdout.write(
-                self.style.ERROR(f'CSV file not found: {csv_file}')
-            )
-            return
+            raise CommandError(f'CSV file not found: {csv_file}')
 
         self.stdout.write(f'Loading diseases from: {csv_file}')
-        
-        # Clear existing data
-        Disease.objects.all().delete()
-        self.stdout.write('Cleared existing disease data')
-        
-        loaded_count = 0
-        skipped_count = 0
-        
+        started = time.perf_counter()
+        self.timings = {name: 0.0 for name in ['diff', 'delete', 'update', 'insert', 'terms']}
+        self.counts = {name: 0 for name in ['inserted', 'updated', 'deleted', 'unchanged', 'skipped']}
+        self.name_conflicts = 0
+
         try:
-            with open(csv_file, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    # Skip empty rows
-                    if not row.get('Name') or not row.get('Disease_Code'):
-                        skipped_count += 1
-                        continue
-                    
-                    # Convert string boolean values
-                    contagious = row.get('Contagious', 'False').strip().lower() in ['true', '1', 'yes']
-                    chronic = row.get('Chronic', 'False').strip().lower() in ['true', '1', 'yes']
-                    
-                    try:
-                        disease, created = Disease.objects.get_or_create(
-                            disease_code=row['Disease_Code'].strip(),
-                            defaults={
-                                'name': row['Name'].strip(),
-                                'symptoms': row.get('Symptoms', '').strip(),
-                                'treatments': row.get('Treatments', '').strip(),
-                                'contagious': contagious,
-                                'chronic': chronic,
-                            }
-                        )
-                        
-                        if created:
-                            loaded_count += 1
-                            if loaded_count % 50 == 0:
-                                self.stdout.write(f'Loaded {loaded_count} diseases...')
-                        else:
-                            skipped_count += 1
-                            
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.WARNING(f'Error loading disease {row.get("Name", "Unknown")}: {e}')
-                        )
-                        skipped_count += 1
-                        
+            with transaction.atomic():
+                # All changes are logged as one catalog version
+                with batched_changes() as changed_ids:
+                    # First pass: only the codes, so stale diseases are deleted
+                    # before any update or insert may reuse their names
+                    with self.phase('delete'):
+                        if not options['keep_missing']:
+                            self.delete_missing({code for code, _ in self.read_rows(csv_file)}, batch_size)
+
+                    # Second pass: diff and write one batch of rows at a time
+                    rows = self.read_rows(csv_file, report=True)
+                    for batch in iter(lambda: list(islice(rows, batch_size)), []):
+                        changed_ids.update(self.apply_batch(batch, batch_size))
+
+                    with self.phase('terms'):
+                        prune_orphan_terms()
+
+                # Only then does the table hold exactly the file's rows, which
+                # lets snapshots built from the same file match it
+                if not options['keep_missing'] and not self.name_conflicts:
+                    record_source(source_digest(csv_file))
         except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error reading CSV file: {e}')
-            )
-            return
-        
+            raise CommandError(f'Error loading CSV file, no changes were applied: {e}') from e
+
+        for name, seconds in self.timings.items():
+            self.stdout.write(f'  {name:<8} {seconds * 1000:10.1f} ms')
+        counts = self.counts
+        self.stdout.write(
+            f'Inserted {counts["inserted"]}, updated {counts["updated"]}, deleted {counts["deleted"]}, '
+            f'unchanged {counts["unchanged"]} diseases'
+        )
+        self.stdout.write(
+            f'Normalized {Symptom.objects.count()} symptoms and {Treatment.objects.count()} treatments'
+        )
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully loaded {loaded_count} diseases. Skipped {skipped_count} entries.'
+                f'Successfully loaded {counts["inserted"] + counts["updated"] + counts["unchanged"]} diseases '
+                f'in {time.perf_counter() - started:.2f}s. Skipped {counts["skipped"]} entries.'
             )
         )
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - started
+
+    def read_rows(self, csv_file, report=False):
+        """
+        Stream (disease_code, field values) pairs from the CSV file, skipping
+        empty and duplicate rows; with report, warn about and count them.
+        """
+        seen_codes = set()
+        seen_names = set()
+
+        with open(csv_file, 'r', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                # Skip empty rows
+                if not row.get('Name') or not row.get('Disease_Code'):
+                    if report:
+                        self.counts['skipped'] += 1
+                    continue
+
+                code = row['Disease_Code'].strip()
+                values = {
+                    'name': row['Name'].strip(),
+                    'symptoms': (row.get('Symptoms') or '').strip(),
+                    'treatments': (row.get('Treatments') or '').strip(),
+                    # Convert string boolean values
+                    'contagious': (row.get('Contagious') or 'False').strip().lower() in ['true', '1', 'yes'],
+                    'chronic': (row.get('Chronic') or 'False').strip().lower() in ['true', '1', 'yes'],
+                }
+
+                # Codes and names are unique; the first occurrence wins
+                if code in seen_codes or values['name'] in seen_names:
+                    if report:
+                        self.skip(f'Skipping duplicate disease {values["name"]} ({code})')
+                    continue
+                seen_codes.add(code)
+                seen_names.add(values['name'])
+                yield code, values
+
+    def skip(self, message):
+        self.stdout.write(self.style.WARNING(message))
+        self.counts['skipped'] += 1
+
+    def delete_missing(self, csv_codes, batch_size):
+        """Delete the diseases whose code is not in the CSV file"""
+        stale_ids = [
+            disease_id
+            for disease_id, code in Disease.objects.values_list('id', 'disease_code').iterator()
+            if code not in csv_codes
+        ]
+        for start in range(0, len(stale_ids), batch_size):
+            Disease.objects.filter(pk__in=stale_ids[start:start + batch_size]).delete()
+        self.counts['deleted'] = len(stale_ids)
+
+    def apply_batch(self, batch, batch_size):
+        """
+        Diff one batch of CSV rows against the database and write the
+        inserts and updates; returns the ids of the changed diseases.
+        """
+        with self.phase('diff'):
+            existing = {
+                row['disease_code']: row
+                for row in Disease.objects.filter(
+                    disease_code__in=[code for code, _ in batch]
+                ).values('id', 'disease_code', *DISEASE_FIELDS)
+            }
+            # Names held by other diseases would fail the unique constraint
+            # and abort the whole load, so those rows are skipped instead
+            name_codes = dict(
+                Disease.objects.filter(
+                    name__in=[values['name'] for _, values in batch]
+                ).values_list('name', 'disease_code')
+            )
+            now = timezone.now()
+            to_create = []
+            to_update = []
+            for code, values in batch:
+                current = existing.get(code)
+                holder = name_codes.get(values['name'], code)
+                if holder != code:
+                    self.skip(f'Skipping {values["name"]} ({code}): name already used by {holder}')
+                    self.name_conflicts += 1
+                    continue
+                if current is None:
+                    disease = Disease(disease_code=code, **values)
+                elif any(current[field] != value for field, value in values.items()):
+                    disease = Disease(id=current['id'], disease_code=code, updated_at=now, **values)
+                else:
+                    self.counts['unchanged'] += 1
+                    continue
+
+                # bulk_create/bulk_update skip save(), so derive stored columns here
+                disease.refresh_derived_fields()
+                (to_create if current is None else to_update).append(disease)
+
+        with self.phase('update'):
+            Disease.objects.bulk_update(
+                to_update, DISEASE_FIELDS + Disease.DERIVED_FIELDS + ['updated_at'], batch_size=batch_size
+            )
+        with self.phase('insert'):
+            Disease.objects.bulk_create(to_create, batch_size=batch_size)
+        self.counts['updated'] += len(to_update)
+        self.counts['inserted'] += len(to_create)
+
+        # bulk_create/bulk_update bypass signals, so sync derived data here
+        with self.phase('terms'):
+            diseases = list(
+                Disease.objects.filter(disease_code__in=[d.disease_code for d in to_create + to_update])
+            )
+            sync_disease_terms(diseases)
+        return [disease.pk for disease in diseases]
@@ -0,0 +1,124 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _canonical_terms(text):
+    terms = []
+    for term in (text or '').split(','):
+        term = term.strip().lower()[:255]
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def _backfill(apps, source_field, term_model_name, link_model_name, link_field):
+    Disease = apps.get_model('diseases', 'Disease')
+    Term = apps.get_model('diseases', term_model_name)
+    Link = apps.get_model('diseases', link_model_name)
+
+    per_disease = {
+        disease_id: _canonical_terms(text)
+        for disease_id, text in Disease.objects.values_list('id', source_field)
+    }
+    names = sorted({name for terms in per_disease.values() for name in terms})
+    Term.objects.bulk_create([Term(name=name) for name in names], batch_size=500)
+    term_ids = dict(Term.objects.values_list('name', 'id'))
+
+    Link.objects.bulk_create([
+        Link(disease_id=disease_id, position=position, **{f'{link_field}_id': term_ids[name]})
+        for disease_id, terms in per_disease.items()
+        for position, name in enumerate(terms)
+    ], batch_size=500)
+
+
+def backfill_terms(apps, schema_editor):
+    _backfill(apps, 'symptoms', 'Symptom', 'DiseaseSymptom', 'symptom')
+    _backfill(apps, 'treatments', 'Treatment', 'DiseaseTreatment', 'treatment')
+
+
+def clear_terms(apps, schema_editor):
+    for model_name in ['DiseaseSymptom', 'DiseaseTreatment', 'Symptom', 'Treatment']:
+        apps.get_model('diseases', model_name).objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Symptom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Treatment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DiseaseTreatment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('disease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disease_treatments', to='diseases.disease')),
+                ('treatment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disease_treatments', to='diseases.treatment')),
+            ],
+            options={
+                'ordering': ['disease', 'position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DiseaseSymptom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('disease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disease_symptoms', to='diseases.disease')),
+                ('symptom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disease_symptoms', to='diseases.symptom')),
+            ],
+            options={
+                'ordering': ['disease', 'position'],
+            },
+        ),
+        migrations.AddField(
+            model_name='disease',
+            name='symptom_terms',
+            field=models.ManyToManyField(blank=True, related_name='diseases', through='diseases.DiseaseSymptom', to='diseases.symptom'),
+        ),
+        migrations.AddField(
+            model_name='disease',
+            name='treatment_terms',
+            field=models.ManyToManyField(blank=True, related_name='diseases', through='diseases.DiseaseTreatment', to='diseases.treatment'),
+        ),
+        migrations.AddIndex(
+            model_name='diseasetreatment',
+            index=models.Index(fields=['treatment', 'disease'], name='diseases_di_treatme_277f41_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='diseasetreatment',
+            constraint=models.UniqueConstraint(fields=('disease', 'treatment'), name='unique_disease_treatment'),
+        ),
+        migrations.AddIndex(
+            model_name='diseasesymptom',
+            index=models.Index(fields=['symptom', 'disease'], name='diseases_di_symptom_6a5d35_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='diseasesymptom',
+            constraint=models.UniqueConstraint(fields=('disease', 'symptom'), name='unique_disease_symptom'),
+        ),
+        migrations.RunPython(backfill_terms, clear_terms),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:12
+
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE diseases_disease_fts USING fts5(
+        name, symptoms, disease_code,
+        content='diseases_disease', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER diseases_disease_fts_ai AFTER INSERT ON diseases_disease BEGIN
+        INSERT INTO diseases_disease_fts(rowid, name, symptoms, disease_code)
+        VALUES (new.id, new.name, new.symptoms, new.disease_code);
+    END
+    """,
+    """
+    CREATE TRIGGER diseases_disease_fts_ad AFTER DELETE ON diseases_disease BEGIN
+        INSERT INTO diseases_disease_fts(diseases_disease_fts, rowid, name, symptoms, disease_code)
+        VALUES ('delete', old.id, old.name, old.symptoms, old.disease_code);
+    END
+    """,
+    """
+    CREATE TRIGGER diseases_disease_fts_au AFTER UPDATE ON diseases_disease BEGIN
+        INSERT INTO diseases_disease_fts(diseases_disease_fts, rowid, name, symptoms, disease_code)
+        VALUES ('delete', old.id, old.name, old.symptoms, old.disease_code);
+        INSERT INTO diseases_disease_fts(rowid, name, symptoms, disease_code)
+        VALUES (new.id, new.name, new.symptoms, new.disease_code);
+    END
+    """,
+    "INSERT INTO diseases_disease_fts(diseases_disease_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    'DROP TRIGGER IF EXISTS diseases_disease_fts_au',
+    'DROP TRIGGER IF EXISTS diseases_disease_fts_ad',
+    'DROP TRIGGER IF EXISTS diseases_disease_fts_ai',
+    'DROP TABLE IF EXISTS diseases_disease_fts',
+]
+
+POSTGRES_FORWARDS = [
+    """
+    CREATE FUNCTION diseases_disease_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.disease_code, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.symptoms, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER diseases_disease_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, disease_code, symptoms ON diseases_disease
+    FOR EACH ROW EXECUTE FUNCTION diseases_disease_search_vector()
+    """,
+    'UPDATE diseases_disease SET name = name',
+]
+
+POSTGRES_BACKWARDS = [
+    'DROP TRIGGER IF EXISTS diseases_disease_search_vector_update ON diseases_disease',
+    'DROP FUNCTION IF EXISTS diseases_disease_search_vector()',
+]
+
+SEARCH_VECTOR_INDEX = GinIndex(fields=['search_vector'], name='diseases_di_search_vector_gin')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_FORWARDS:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_FORWARDS:
+            schema_editor.execute(statement)
+        schema_editor.add_index(apps.get_model('diseases', 'Disease'), SEARCH_VECTOR_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_BACKWARDS:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('diseases', 'Disease'), SEARCH_VECTOR_INDEX)
+        for statement in POSTGRES_BACKWARDS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0002_normalized_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='disease',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
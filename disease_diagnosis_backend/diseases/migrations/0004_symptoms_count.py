@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+def backfill_symptoms_count(apps, schema_editor):
+    Disease = apps.get_model('diseases', 'Disease')
+    diseases = list(Disease.objects.only('id', 'symptoms'))
+    for disease in diseases:
+        disease.symptoms_count = len(disease.symptoms.split(',')) if disease.symptoms else 0
+    Disease.objects.bulk_update(diseases, ['symptoms_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='disease',
+            name='symptoms_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_symptoms_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+def split_list(text):
+    return [item.strip() for item in text.split(',')] if text else []
+
+
+def backfill_parsed_lists(apps, schema_editor):
+    Disease = apps.get_model('diseases', 'Disease')
+    diseases = list(Disease.objects.only('id', 'symptoms', 'treatments'))
+    for disease in diseases:
+        disease.symptoms_list = split_list(disease.symptoms)
+        disease.treatments_list = split_list(disease.treatments)
+    Disease.objects.bulk_update(diseases, ['symptoms_list', 'treatments_list'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0004_symptoms_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='disease',
+            name='symptoms_list',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='disease',
+            name='treatments_list',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.RunPython(backfill_parsed_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:05
+
+import sqlite3
+
+from django.db import migrations
+
+# The trigram tokenizer ships with SQLite 3.34+
+TRIGRAM_SQLITE_VERSION = (3, 34, 0)
+
+DROP_FTS = [
+    'DROP TRIGGER IF EXISTS diseases_disease_fts_au',
+    'DROP TRIGGER IF EXISTS diseases_disease_fts_ad',
+    'DROP TRIGGER IF EXISTS diseases_disease_fts_ai',
+    'DROP TABLE IF EXISTS diseases_disease_fts',
+]
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER diseases_disease_fts_ai AFTER INSERT ON diseases_disease BEGIN
+        INSERT INTO diseases_disease_fts(rowid, name, symptoms, disease_code)
+        VALUES (new.id, new.name, new.symptoms, new.disease_code);
+    END
+    """,
+    """
+    CREATE TRIGGER diseases_disease_fts_ad AFTER DELETE ON diseases_disease BEGIN
+        INSERT INTO diseases_disease_fts(diseases_disease_fts, rowid, name, symptoms, disease_code)
+        VALUES ('delete', old.id, old.name, old.symptoms, old.disease_code);
+    END
+    """,
+    """
+    CREATE TRIGGER diseases_disease_fts_au AFTER UPDATE ON diseases_disease BEGIN
+        INSERT INTO diseases_disease_fts(diseases_disease_fts, rowid, name, symptoms, disease_code)
+        VALUES ('delete', old.id, old.name, old.symptoms, old.disease_code);
+        INSERT INTO diseases_disease_fts(rowid, name, symptoms, disease_code)
+        VALUES (new.id, new.name, new.symptoms, new.disease_code);
+    END
+    """,
+]
+
+
+def create_fts_table(schema_editor, tokenize):
+    schema_editor.execute(
+        f"""
+        CREATE VIRTUAL TABLE diseases_disease_fts USING fts5(
+            name, symptoms, disease_code,
+            content='diseases_disease', content_rowid='id', tokenize='{tokenize}'
+        )
+        """
+    )
+    for statement in TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute("INSERT INTO diseases_disease_fts(diseases_disease_fts) VALUES ('rebuild')")
+
+
+def use_trigram_tokenizer(apps, schema_editor):
+    """
+    Re-create the FTS5 table with the trigram tokenizer so searches keep
+    substring semantics ('ache' finds headache). Without trigram support the
+    table is dropped and search falls back to the contains backend.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_FTS:
+        schema_editor.execute(statement)
+    if sqlite3.sqlite_version_info >= TRIGRAM_SQLITE_VERSION:
+        create_fts_table(schema_editor, 'trigram')
+
+
+def use_word_tokenizer(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_FTS:
+        schema_editor.execute(statement)
+    create_fts_table(schema_editor, 'unicode61')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0006_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_trigram_tokenizer, use_word_tokenizer),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:40
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def stamp_current_version(apps, schema_editor):
+    CatalogVersion = apps.get_model('diseases', 'CatalogVersion')
+    Disease = apps.get_model('diseases', 'Disease')
+    last_modified = Disease.objects.aggregate(last_modified=Max('updated_at'))['last_modified']
+    CatalogVersion.objects.update_or_create(
+        pk=1, defaults={'updated_at': last_modified or timezone.now()}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0007_trigram_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(stamp_current_version, migrations.RunPython.noop),
+    ]
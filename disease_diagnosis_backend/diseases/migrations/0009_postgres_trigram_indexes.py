@@ -0,0 +1,44 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:20
+
+from django.db import migrations
+
+# pg_trgm indexes for the substring filters PostgresSearchBackend applies
+# through ContainsSearchBackend: icontains compares UPPER(column), and
+# symptom terms are stored lowercase and matched with contains.
+POSTGRES_FORWARDS = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX diseases_di_name_trgm ON diseases_disease USING gin ((UPPER(name)) gin_trgm_ops)',
+    'CREATE INDEX diseases_di_code_trgm ON diseases_disease USING gin ((UPPER(disease_code)) gin_trgm_ops)',
+    'CREATE INDEX diseases_di_symptoms_trgm ON diseases_disease USING gin ((UPPER(symptoms)) gin_trgm_ops)',
+    'CREATE INDEX diseases_sy_name_trgm ON diseases_symptom USING gin (name gin_trgm_ops)',
+]
+
+POSTGRES_BACKWARDS = [
+    'DROP INDEX IF EXISTS diseases_sy_name_trgm',
+    'DROP INDEX IF EXISTS diseases_di_symptoms_trgm',
+    'DROP INDEX IF EXISTS diseases_di_code_trgm',
+    'DROP INDEX IF EXISTS diseases_di_name_trgm',
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_FORWARDS:
+            schema_editor.execute(statement)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_BACKWARDS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0008_catalog_version_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
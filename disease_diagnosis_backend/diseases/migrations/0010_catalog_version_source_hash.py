@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diseases', '0009_postgres_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='source_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
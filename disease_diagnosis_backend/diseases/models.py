@@ -1,6 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.postgres.search import SearchVectorField
-from django.contrib.postgres.indexes import GinIndex
+
+
+class DiseaseQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the rows and log them as one catalog version, not one per row"""
+        from .changefeed import batched_changes
+
+        with transaction.atomic(using=self.db), batched_changes():
+            return super().delete()
 
 
 class Disease(models.Model):
@@ -10,8 +18,23 @@ class Disease(models.Model):
     disease_code = models.CharField(max_length=10, unique=True, db_index=True)
     contagious = models.BooleanField(default=False)
     chronic = models.BooleanField(default=False)
+    # Denormalized len(get_symptoms_list()) so list pages never load symptoms
+    symptoms_count = models.PositiveIntegerField(default=0, editable=False)
+    # Parsed get_symptoms_list()/get_treatments_list(), so reads never split text
+    symptoms_list = models.JSONField(default=list, editable=False)
+    treatments_list = models.JSONField(default=list, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on PostgreSQL, unused elsewhere
+    search_vector = SearchVectorField(null=True, editable=False)
+    symptom_terms = models.ManyToManyField(
+        'Symptom', through='DiseaseSymptom', related_name='diseases', blank=True
+    )
+    treatment_terms = models.ManyToManyField(
+        'Treatment', through='DiseaseTreatment', related_name='diseases', blank=True
+    )
+
+    objects = DiseaseQuerySet.as_manager()
 
     class Meta:
         ordering = ['name']
@@ -25,6 +48,22 @@ class Disease(models.Model):
     def __str__(self):
         return f"{self.name} ({self.disease_code})"
 
+    # Columns derived from symptoms/treatments by refresh_derived_fields()
+    DERIVED_FIELDS = ['symptoms_count', 'symptoms_list', 'treatments_list']
+
+    def save(self, *args, **kwargs):
+        self.refresh_derived_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'symptoms', 'treatments'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(self.DERIVED_FIELDS)
+        super().save(*args, **kwargs)
+
+    def refresh_derived_fields(self):
+        """Recompute DERIVED_FIELDS; bulk writers must call this themselves"""
+        self.symptoms_list = self.get_symptoms_list()
+        self.treatments_list = self.get_treatments_list()
+        self.symptoms_count = len(self.symptoms_list)
+
     def get_symptoms_list(self):
         """Return symptoms as a list, split by comma"""
         if self.symptoms:
@@ -39,10 +78,10 @@ class Disease(models.Model):
 
     def symptom_match_score(self, input_symptoms):
         """Calculate how many input symptoms match this disease's symptoms"""
-        if not self.symptoms or not input_symptoms:
+        if not self.symptoms_list or not input_symptoms:
             return 0
 
-        disease_symptoms = [s.strip().lower() for s in self.symptoms.split(',')]
+        disease_symptoms = [s.lower() for s in self.symptoms_list]
         input_symptoms_lower = [s.strip().lower() for s in input_symptoms]
 
         matches = 0
@@ -53,3 +92,71 @@ class Disease(models.Model):
                     break
 
         return matches
+
+
+class Symptom(models.Model):
+    """Canonical (stripped, lowercased) symptom phrase shared across diseases"""
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Treatment(models.Model):
+    """Canonical (stripped, lowercased) treatment phrase shared across diseases"""
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class DiseaseSymptom(models.Model):
+    disease = models.ForeignKey(Disease, on_delete=models.CASCADE, related_name='disease_symptoms')
+    symptom = models.ForeignKey(Symptom, on_delete=models.CASCADE, related_name='disease_symptoms')
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['disease', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['disease', 'symptom'], name='unique_disease_symptom'),
+        ]
+        indexes = [
+            models.Index(fields=['symptom', 'disease']),
+        ]
+
+
+class DiseaseTreatment(models.Model):
+    disease = models.ForeignKey(Disease, on_delete=models.CASCADE, related_name='disease_treatments')
+    treatment = models.ForeignKey(Treatment, on_delete=models.CASCADE, related_name='disease_treatments')
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['disease', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['disease', 'treatment'], name='unique_disease_treatment'),
+        ]
+        indexes = [
+            models.Index(fields=['treatment', 'disease']),
+        ]
+
+
+class CatalogVersion(models.Model):
+    """Single row counting committed catalog changes, see diseases.changefeed"""
+    version = models.BigIntegerField(default=0)
+    # When the last change was committed; Last-Modified of catalog responses
+    updated_at = models.DateTimeField(null=True)
+    # SHA-256 of the CSV file load_diseases last loaded the whole table from,
+    # cleared by any other change; keys warm-start snapshots across databases
+    source_hash = models.CharField(max_length=64, blank=True, default='')
+
+
+class CatalogChange(models.Model):
+    """Disease saved or deleted in a catalog version; a null disease_id means all of them"""
+    version = models.BigIntegerField(db_index=True)
+    disease_id = models.BigIntegerField(null=True)
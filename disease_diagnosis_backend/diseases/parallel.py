@@ -0,0 +1,203 @@
+import heapq
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from django.conf import settings
+
+from .catalog import CompactCatalog, compact_catalog
+from .index import build_index_state, symptom_index
+from .workers import init_worker
+
+# Index of the shard held by this worker process, set by _init_worker()
+_worker_index = None
+
+
+def _init_worker(rows):
+    global _worker_index
+    _worker_index = build_index_state(CompactCatalog(rows))
+
+
+def _score_shard(queries):
+    """Score queries on this worker's shard; results carry the name to merge on"""
+    catalog = _worker_index.catalog
+    return [
+        [
+            (disease_id, match_score, match_percentage, catalog.names[catalog.position(disease_id)])
+            for disease_id, match_score, match_percentage in results
+        ]
+        for results in symptom_index.match_many(queries, state=_worker_index)
+    ]
+
+
+def _patch_shard(disease_ids, rows):
+    """Apply one catalog change to this worker's shard, see CompactCatalog.apply_rows()"""
+    global _worker_index
+    catalog = _worker_index.catalog
+    catalog.apply_rows(disease_ids, rows)
+    if catalog.needs_compaction():
+        _worker_index = build_index_state(CompactCatalog(catalog.rows()))
+    else:
+        _worker_index.sync()
+
+
+class ParallelState:
+    """One single-process executor per catalog shard, if any, and the catalog generation they hold"""
+
+    __slots__ = ['catalog', 'generation', 'executors']
+
+    def __init__(self, catalog, generation, executors):
+        self.catalog = catalog
+        self.generation = generation
+        self.executors = executors
+
+
+class ParallelSymptomEngine:
+    """
+    Scores symptom queries on worker processes for large catalogs.
+
+    Diseases of the compact catalog are sharded by id, and each shard lives
+    in its own single-process executor, which receives only that shard's
+    rows and builds an IndexState with the same matching semantics as
+    SymptomIndex. A query batch is scored on all shards in parallel and the
+    per-shard top-k lists are merged, so results are identical to the
+    single-process index. Catalog changes are sent to the shards owning the
+    changed rows and patched in place; an executor runs its tasks in order,
+    so later queries see them.
+
+    Catalogs below SYMPTOM_SCORING_PARALLEL_THRESHOLD diseases are scored
+    in process by symptom_index until patches grow them past it, as is any
+    batch submitted while the executors are being replaced or after one
+    lost its worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        """Drop the shards and retire their executors, so both are rebuilt on next use"""
+        with self._lock:
+            state, self._state = self._state, None
+        self.retire(state)
+
+    def retire(self, state):
+        if state is not None and state.executors is not None:
+            for executor in state.executors:
+                executor.shutdown(wait=False)
+
+    @property
+    def is_built(self):
+        """Whether the shards are loaded, so matching will not query the database"""
+        state = self._state
+        return state is not None and state.catalog is compact_catalog.current()
+
+    def ensure_built(self):
+        """Build the shards now unless loaded; call where the database may be queried"""
+        self._get_state()
+
+    def worker_count(self):
+        return getattr(settings, 'SYMPTOM_SCORING_WORKERS', None) or os.cpu_count() or 1
+
+    def threshold(self):
+        return getattr(settings, 'SYMPTOM_SCORING_PARALLEL_THRESHOLD', 50000)
+
+    def start_method(self):
+        return getattr(settings, 'SYMPTOM_SCORING_START_METHOD', None)
+
+    def should_shard(self, catalog):
+        return len(catalog) >= self.threshold() and self.worker_count() >= 2
+
+    def build(self, catalog):
+        """Shard the catalog by id across new executors, one per shard"""
+        generation = catalog.generation
+        if not self.should_shard(catalog):
+            return ParallelState(catalog, generation, None)
+
+        workers = self.worker_count()
+        shards = [[] for _ in range(workers)]
+        for row in catalog.rows():
+            shards[row[0] % workers].append(row)
+        context = multiprocessing.get_context(self.start_method())
+        executors = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=init_worker, initargs=(rows,))
+            for rows in shards
+        ]
+        return ParallelState(catalog, generation, executors)
+
+    def sync(self, state):
+        """Send the catalog changes made since the state's generation to the shards owning the rows"""
+        catalog = state.catalog
+        if state.executors is None:
+            state.generation = catalog.generation
+            return
+        shard_count = len(state.executors)
+        for generation, retired, added in catalog.changes[state.generation:catalog.generation]:
+            patches = {}
+            for position in retired + added:
+                disease_ids, _ = patches.setdefault(catalog.ids[position] % shard_count, (set(), []))
+                disease_ids.add(catalog.ids[position])
+            for position in added:
+                patches[catalog.ids[position] % shard_count][1].append(catalog.row(position))
+            futures = [
+                state.executors[shard].submit(_patch_shard, disease_ids, rows)
+                for shard, (disease_ids, rows) in patches.items()
+            ]
+            for future in futures:
+                future.result()
+            state.generation = generation
+
+    def _get_state(self):
+        catalog = compact_catalog.get()
+        state = self._state
+        if state is None or state.catalog is not catalog or state.generation != catalog.generation:
+            with self._lock:
+                state = self._state
+                if (
+                    state is None or state.catalog is not catalog
+                    # Patches grew the catalog past the threshold
+                    or state.executors is None and self.should_shard(catalog)
+                ):
+                    self.retire(state)
+                    state = self._state = self.build(catalog)
+                try:
+                    self.sync(state)
+                except (BrokenProcessPool, RuntimeError):
+                    # A shard missed the change; score in process until rebuilt
+                    self._state = None
+                    self.retire(state)
+                    state = ParallelState(catalog, catalog.generation, None)
+        return state
+
+    def match(self, input_symptoms, limit=10):
+        """Same result tuples as SymptomIndex.match"""
+        return self.match_many([(input_symptoms, limit)])[0]
+
+    def match_many(self, queries):
+        """Score a list of (input_symptoms, limit) queries on every shard and merge"""
+        state = self._get_state()
+        if state.executors is None:
+            return symptom_index.match_many(queries)
+
+        try:
+            futures = [executor.submit(_score_shard, queries) for executor in state.executors]
+            shard_results = [future.result() for future in futures]
+        except (BrokenProcessPool, RuntimeError):
+            # Executors retired by invalidate() or lost a worker; finish in process
+            return symptom_index.match_many(queries)
+
+        results = []
+        for query_index, (_, limit) in enumerate(queries):
+            # Each shard list is already sorted like SymptomIndex.rank
+            merged = heapq.merge(
+                *(shard[query_index] for shard in shard_results),
+                key=lambda x: (-x[1], -x[2], x[3])
+            )
+            results.append([result[:3] for result in islice(merged, limit)])
+        return results
+
+
+parallel_engine = ParallelSymptomEngine()
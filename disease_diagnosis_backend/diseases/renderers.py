@@ -0,0 +1,28 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for rest_framework.renderers.JSONRenderer using orjson.
+
+    Produces the same compact UTF-8 output as JSONRenderer with the default
+    COMPACT_JSON/UNICODE_JSON settings; types orjson does not know (Decimal,
+    lazy strings, ...) fall back to DRF's JSONEncoder. Without orjson
+    (requirements-optional.txt) it renders with JSONRenderer itself.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        ret = orjson.dumps(data, default=self._encoder.default)
+        # Escape the JavaScript line terminators the way JSONRenderer does
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
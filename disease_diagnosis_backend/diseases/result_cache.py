@@ -0,0 +1,172 @@
+"""
+Symptom-checker result cache.
+
+Caches the engine matches, (disease_id, score, percentage) tuples, of a
+(symptoms, top_k) query under its canonical form: symptoms stripped, lowercased and sorted, so order and
+case do not matter. Repeated symptoms are kept with their multiplicity
+because each one adds to the match score. Keys include the catalog version
+and scoring engine, so any Disease write makes old entries unreachable.
+
+A hit skips scoring; the matches are serialized on read from the compact
+catalog, so entries stay a few tuples rather than whole payloads. Fuzzy
+queries are not cached because their results echo the input spelling.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from .caching import get_catalog_version
+from .index import normalize_symptom
+from .instrumentation import metrics_registry
+
+RESULT_CACHE_BACKENDS = {
+    'local': 'diseases.result_cache.LocalResultCache',
+    'django': 'diseases.result_cache.DjangoResultCache',
+}
+
+RESULT_CACHE_KEY_PREFIX = 'diseases:checker'
+
+
+def canonical_query(input_symptoms):
+    """Order-insensitive form of the input: sorted (symptom, repeat count) pairs"""
+    return tuple(sorted(Counter(normalize_symptom(symptom) for symptom in input_symptoms).items()))
+
+
+class ResultCache:
+    """Base class: key construction and hit/miss counters"""
+
+    def __init__(self):
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def timeout(self):
+        return getattr(settings, 'SYMPTOM_CHECKER_CACHE_TIMEOUT', 300)
+
+    def make_keys(self, queries, ranking='match'):
+        """Cache key of each (input_symptoms, top_k) query"""
+        version, _ = get_catalog_version()
+        engine = getattr(settings, 'SYMPTOM_SCORING_ENGINE', 'index')
+        return [
+            hashlib.md5(
+                repr((version, engine, ranking, limit, canonical_query(input_symptoms))).encode()
+            ).hexdigest()
+            for input_symptoms, limit in queries
+        ]
+
+    def get_many(self, keys):
+        found = self._get_many(keys)
+        with self._counter_lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, mapping):
+        raise NotImplementedError
+
+    def _get_many(self, keys):
+        raise NotImplementedError
+
+
+class LocalResultCache(ResultCache):
+    """Per-process LRU with a TTL, bounded by SYMPTOM_CHECKER_CACHE_SIZE entries"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, mapping):
+        expires_at = time.monotonic() + self.timeout()
+        max_entries = getattr(settings, 'SYMPTOM_CHECKER_CACHE_SIZE', 10000)
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoResultCache(ResultCache):
+    """Shared across processes through the SYMPTOM_CHECKER_CACHE_ALIAS cache"""
+
+    def _cache(self):
+        return caches[getattr(settings, 'SYMPTOM_CHECKER_CACHE_ALIAS', 'default')]
+
+    def _get_many(self, keys):
+        prefixed = self._cache().get_many([f'{RESULT_CACHE_KEY_PREFIX}:{key}' for key in keys])
+        return {key[len(RESULT_CACHE_KEY_PREFIX) + 1:]: value for key, value in prefixed.items()}
+
+    def set_many(self, mapping):
+        self._cache().set_many(
+            {f'{RESULT_CACHE_KEY_PREFIX}:{key}': value for key, value in mapping.items()},
+            self.timeout()
+        )
+
+    def clear(self):
+        # Entries of older catalog versions expire on their own
+        pass
+
+
+_result_caches = {}
+_result_caches_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Return the cache selected by SYMPTOM_CHECKER_CACHE: 'local' (default),
+    'django', a dotted path to a ResultCache class, or None when disabled.
+    """
+    name = getattr(settings, 'SYMPTOM_CHECKER_CACHE', 'local')
+    if not name:
+        return None
+    with _result_caches_lock:
+        if name not in _result_caches:
+            _result_caches[name] = import_string(RESULT_CACHE_BACKENDS.get(name, name))()
+        return _result_caches[name]
+
+
+def clear_result_caches():
+    """Drop local entries; called on catalog changes to free memory early"""
+    for result_cache in list(_result_caches.values()):
+        result_cache.clear()
+
+
+def result_cache_metrics():
+    """Prometheus lines with the hit/miss counters of every cache in use"""
+    lines = [
+        '# HELP diseases_symptom_checker_cache_requests_total Symptom-checker result cache lookups.',
+        '# TYPE diseases_symptom_checker_cache_requests_total counter',
+    ]
+    for name, result_cache in sorted(_result_caches.items()):
+        lines.append(f'diseases_symptom_checker_cache_requests_total{{cache="{name}",result="hit"}} {result_cache.hits}')
+        lines.append(f'diseases_symptom_checker_cache_requests_total{{cache="{name}",result="miss"}} {result_cache.misses}')
+    return lines
+
+
+metrics_registry.add_collector(result_cache_metrics)
@@ -0,0 +1,227 @@
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .fuzzy import fuzzy_index
+from .index import normalize_symptom, symptom_index
+from .parallel import parallel_engine
+
+SCORING_ENGINES = {
+    'index': 'diseases.index.symptom_index',
+    'sparse': 'diseases.scoring.sparse_engine',
+    'parallel': 'diseases.parallel.parallel_engine',
+}
+
+# Distinct input terms whose matching vocabulary columns are memoized per build
+TERM_CACHE_SIZE = 10000
+
+
+class SparseCatalog:
+    """Disease x symptom-phrase incidence matrix plus per-row metadata"""
+
+    __slots__ = ['matrix', 'vocabulary', 'disease_ids', 'symptom_counts', 'name_ranks', 'term_cache']
+
+    def __init__(self, matrix, vocabulary, disease_ids, symptom_counts, name_ranks):
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.disease_ids = disease_ids
+        self.symptom_counts = symptom_counts
+        self.name_ranks = name_ranks
+        self.term_cache = {}
+
+
+class SparseSymptomEngine:
+    """
+    Vectorized scorer over a sparse disease x symptom-phrase matrix.
+
+    Rows are catalog slots and columns are the distinct normalized symptom
+    terms, both taken from the symptom index state, so the matrix is
+    rebuilt whenever that index changes. Each input term is resolved to
+    the phrase columns it matches (same substring rule as
+    Disease.symptom_match_score), so a whole batch is scored with two
+    sparse products and ranked with argpartition. Requires numpy and scipy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        """Drop the matrix so it is rebuilt on next use"""
+        with self._lock:
+            self._state = None
+
+    @property
+    def is_built(self):
+        """Whether the matrix is loaded and current, so matching will not query the database"""
+        built = self._state
+        index = symptom_index.current()
+        return built is not None and built[0] is index and built[1] == index.generation
+
+    def ensure_built(self):
+        """Build the matrix now unless loaded; call where the database may be queried"""
+        self._get_state()
+
+    def build(self, index, generation):
+        """Build the incidence matrix from the postings of a symptom index state"""
+        np, sparse = _import_numpy_scipy()
+
+        catalog = index.catalog
+        slot_count = len(catalog.ids)
+        postings = [index.positions(term_id, generation) for term_id in range(len(index.terms))]
+        rows = np.concatenate(
+            [np.asarray(positions, dtype=np.int64) for positions in postings] or [np.empty(0, dtype=np.int64)]
+        )
+        cols = np.repeat(np.arange(len(postings)), [len(positions) for positions in postings])
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(slot_count, len(postings)),
+        )
+        # Ties are ranked by name; slots appended while building are not in the matrix
+        name_order = [position for position in catalog.name_order() if position < slot_count]
+        name_ranks = np.zeros(slot_count, dtype=np.int64)
+        name_ranks[name_order] = np.arange(len(name_order))
+        return SparseCatalog(
+            matrix,
+            np.array(index.terms[:len(postings)], dtype=str),
+            np.array(catalog.ids[:slot_count], dtype=np.int64),
+            np.diff(np.array(catalog.symptom_offsets[:slot_count + 1], dtype=np.int64)),
+            name_ranks,
+        )
+
+    def _get_state(self):
+        index = symptom_index._get_state()
+        generation = index.generation
+        built = self._state
+        if built is None or built[0] is not index or built[1] != generation:
+            with self._lock:
+                built = self._state
+                if built is None or built[0] is not index or built[1] != generation:
+                    built = self._state = (index, generation, self.build(index, generation))
+        return built[2]
+
+    def _term_columns(self, state, input_symptom):
+        np, _ = _import_numpy_scipy()
+        term = normalize_symptom(input_symptom)
+        columns = state.term_cache.get(term)
+        if columns is None:
+            vocabulary = state.vocabulary
+            hits = (np.char.find(vocabulary, term) >= 0) | (np.char.find(term, vocabulary) >= 0)
+            columns = np.flatnonzero(hits)
+            if len(state.term_cache) >= TERM_CACHE_SIZE:
+                state.term_cache.clear()
+            state.term_cache[term] = columns
+        return columns
+
+    def match(self, input_symptoms, limit=10):
+        """Score one symptom list, see SymptomIndex.match for the result format"""
+        return self.match_many([(input_symptoms, limit)])[0]
+
+    def match_many(self, queries):
+        """Score a list of (input_symptoms, limit) queries in one pass"""
+        np, sparse = _import_numpy_scipy()
+        state = self._get_state()
+        if not queries:
+            return []
+
+        # Query matrix: one column per input term, one row per vocabulary phrase,
+        # and a grouping matrix summing the terms of each query
+        term_rows = []
+        term_cols = []
+        group_rows = []
+        group_cols = []
+        term_index = 0
+        for query_index, (input_symptoms, _) in enumerate(queries):
+            for input_symptom in input_symptoms:
+                columns = self._term_columns(state, input_symptom)
+                term_rows.append(columns)
+                term_cols.append(np.full(len(columns), term_index))
+                group_rows.append(term_index)
+                group_cols.append(query_index)
+                term_index += 1
+
+        term_rows = np.concatenate(term_rows) if term_rows else np.empty(0, dtype=np.int64)
+        term_cols = np.concatenate(term_cols) if term_cols else np.empty(0, dtype=np.int64)
+        terms = sparse.csc_matrix(
+            (np.ones(len(term_rows), dtype=np.int32), (term_rows, term_cols)),
+            shape=(state.matrix.shape[1], term_index),
+        )
+        groups = sparse.csr_matrix(
+            (np.ones(term_index, dtype=np.int32), (group_rows, group_cols)),
+            shape=(term_index, len(queries)),
+        )
+
+        # A term matches a disease if any of its phrase columns does
+        hits = state.matrix @ terms
+        hits.data[:] = 1
+        scores = (hits @ groups).tocsc()
+
+        results = []
+        for query_index, (input_symptoms, limit) in enumerate(queries):
+            start, end = scores.indptr[query_index], scores.indptr[query_index + 1]
+            results.append(self._rank(
+                state, scores.indices[start:end], scores.data[start:end], len(input_symptoms), limit
+            ))
+        return results
+
+    def _rank(self, state, rows, match_scores, input_count, limit):
+        np, _ = _import_numpy_scipy()
+        if not len(rows):
+            return []
+
+        percentages = np.round(
+            match_scores / np.maximum(input_count, state.symptom_counts[rows]) * 100, 2
+        )
+
+        # Keep only the top-k candidates (and anything tied with the k-th)
+        if limit is not None and len(rows) > limit:
+            keys = match_scores.astype(np.int64) * 100000 + np.rint(percentages * 100).astype(np.int64)
+            top = np.argpartition(-keys, limit - 1)[:limit]
+            keep = keys >= keys[top].min()
+            rows, match_scores, percentages = rows[keep], match_scores[keep], percentages[keep]
+
+        # Sort by match score (descending), then by match percentage, then by name
+        order = np.lexsort((state.name_ranks[rows], -percentages, -match_scores))
+        if limit is not None:
+            order = order[:limit]
+
+        results = []
+        for i in order:
+            match_score = int(match_scores[i])
+            total_symptoms = int(state.symptom_counts[rows[i]])
+            match_percentage = (match_score / max(input_count, total_symptoms)) * 100
+            results.append((int(state.disease_ids[rows[i]]), match_score, round(match_percentage, 2)))
+        return results
+
+
+def _import_numpy_scipy():
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError as exc:
+        raise ImproperlyConfigured(
+            "The 'sparse' symptom scoring engine requires numpy and scipy."
+        ) from exc
+    return numpy, sparse
+
+
+sparse_engine = SparseSymptomEngine()
+
+
+def get_scoring_engine():
+    """
+    Return the engine selected by SYMPTOM_SCORING_ENGINE: 'index' (default),
+    'sparse', 'parallel' or a dotted path to an engine instance.
+    """
+    name = getattr(settings, 'SYMPTOM_SCORING_ENGINE', 'index')
+    return import_string(SCORING_ENGINES.get(name, name))
+
+
+def invalidate_scoring_engines():
+    """Invalidate every built-in scoring engine"""
+    symptom_index.invalidate()
+    fuzzy_index.invalidate()
+    sparse_engine.invalidate()
+    parallel_engine.invalidate()
@@ -0,0 +1,188 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, router
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Disease
+from .terms import diseases_with_symptom
+
+FTS_TABLE = 'diseases_disease_fts'
+
+SEARCH_BACKENDS = {
+    'contains': 'diseases.search.ContainsSearchBackend',
+    'sqlite_fts': 'diseases.search.SQLiteFTSSearchBackend',
+    'postgres': 'diseases.search.PostgresSearchBackend',
+}
+
+# Triggers keeping the FTS5 table in sync. SQLite drops them whenever Django
+# rebuilds diseases_disease during a migration, so they are re-installed after
+# every migrate run by ensure_sqlite_fts_triggers().
+SQLITE_FTS_TRIGGERS = {
+    'diseases_disease_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS diseases_disease_fts_ai AFTER INSERT ON diseases_disease BEGIN
+            INSERT INTO diseases_disease_fts(rowid, name, symptoms, disease_code)
+            VALUES (new.id, new.name, new.symptoms, new.disease_code);
+        END
+    """,
+    'diseases_disease_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS diseases_disease_fts_ad AFTER DELETE ON diseases_disease BEGIN
+            INSERT INTO diseases_disease_fts(diseases_disease_fts, rowid, name, symptoms, disease_code)
+            VALUES ('delete', old.id, old.name, old.symptoms, old.disease_code);
+        END
+    """,
+    'diseases_disease_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS diseases_disease_fts_au AFTER UPDATE ON diseases_disease BEGIN
+            INSERT INTO diseases_disease_fts(diseases_disease_fts, rowid, name, symptoms, disease_code)
+            VALUES ('delete', old.id, old.name, old.symptoms, old.disease_code);
+            INSERT INTO diseases_disease_fts(rowid, name, symptoms, disease_code)
+            VALUES (new.id, new.name, new.symptoms, new.disease_code);
+        END
+    """,
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_tokens(term):
+    """Split a search term into lowercase word tokens safe for FTS queries"""
+    return _TOKEN_RE.findall(term.lower())
+
+
+class ContainsSearchBackend:
+    """
+    Unranked substring search, available on every database.
+
+    Symptoms are matched through the normalized Symptom vocabulary, except
+    for terms spanning a comma, which no single symptom contains; those
+    are matched against the raw symptoms text like the FTS backend does.
+    """
+
+    def search(self, queryset, term):
+        if ',' in term:
+            symptoms = Q(symptoms__icontains=term)
+        else:
+            symptoms = Q(pk__in=diseases_with_symptom(term))
+        return queryset.filter(
+            Q(name__icontains=term) |
+            symptoms |
+            Q(disease_code__icontains=term)
+        ).order_by('name')
+
+
+class SQLiteFTSSearchBackend:
+    """
+    Ranked search over the FTS5 table created in migration 0003.
+
+    The table is an external-content index of Disease kept in sync by
+    triggers, so bulk loader writes are covered as well as model saves.
+    Its trigram tokenizer (migration 0007) matches the whole term as a
+    substring of any column, the same hits as ContainsSearchBackend, and
+    ranks them with bm25. Terms shorter than a trigram fall back to
+    ContainsSearchBackend.
+    """
+
+    # bm25 column weights for name, symptoms and disease_code
+    weights = (10.0, 1.0, 5.0)
+
+    def search(self, queryset, term):
+        term = term.strip()
+        if len(term) < 3:
+            return ContainsSearchBackend().search(queryset, term)
+
+        match = '"{}"'.format(term.replace('"', '""'))
+        table = queryset.model._meta.db_table
+        rank = 'bm25({}, {})'.format(FTS_TABLE, ', '.join(str(w) for w in self.weights))
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT {rank} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+                [match],
+            )
+        ).order_by('search_rank', 'name')
+
+
+class PostgresSearchBackend:
+    """
+    Substring search ranked by Disease.search_vector.
+
+    Hits are the ContainsSearchBackend ones, so partial words inside a
+    symptom or code still match; the pg_trgm indexes of migration 0009
+    serve those substring filters for terms of 3 or more characters.
+    Prefix matches on the vector rank first.
+    """
+
+    config = 'english'
+
+    def search(self, queryset, term):
+        tokens = search_tokens(term)
+        queryset = ContainsSearchBackend().search(queryset, term)
+        if not tokens:
+            return queryset
+
+        query = SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokens),
+            config=self.config,
+            search_type='raw',
+        )
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', 'name')
+
+
+# Backend name picked by 'auto', per database alias
+_detected_backends = {}
+
+
+def detect_search_backend(using):
+    """Name of the best search backend the database behind the alias supports"""
+    db = connections[using]
+    name = {'sqlite': 'sqlite_fts', 'postgresql': 'postgres'}.get(db.vendor, 'contains')
+    if name == 'sqlite_fts' and FTS_TABLE not in db.introspection.table_names():
+        name = 'contains'
+    return name
+
+
+def get_search_backend(using=None):
+    """
+    Return the configured search backend for the database alias, by
+    default the one Disease reads are routed to.
+
+    DISEASE_SEARCH_BACKEND may be 'auto' (pick by database vendor, detected
+    once per alias), one of the SEARCH_BACKENDS keys or a dotted path to a
+    backend class.
+    """
+    name = getattr(settings, 'DISEASE_SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        using = using or router.db_for_read(Disease)
+        name = _detected_backends.get(using)
+        if name is None:
+            name = _detected_backends[using] = detect_search_backend(using)
+    return import_string(SEARCH_BACKENDS.get(name, name))()
+
+
+def ensure_sqlite_fts_triggers(using='default', **kwargs):
+    """
+    Re-create missing FTS5 sync triggers and rebuild the index if any were
+    missing. Connected to post_migrate.
+    """
+    # The schema may have changed, so detect the backends again
+    _detected_backends.clear()
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{FTS_TABLE}%'],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in existing or set(SQLITE_FTS_TRIGGERS) <= existing:
+            return
+        for trigger_sql in SQLITE_FTS_TRIGGERS.values():
+            cursor.execute(trigger_sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
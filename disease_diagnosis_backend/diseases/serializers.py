@@ -1,11 +1,9 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Disease
 
 
 class DiseaseSerializer(serializers.ModelSerializer):
-    symptoms_list = serializers.SerializerMethodField()
-    treatments_list = serializers.SerializerMethodField()
-    
     class Meta:
         model = Disease
         fields = [
@@ -13,29 +11,42 @@ class DiseaseSerializer(serializers.ModelSerializer):
             'contagious', 'chronic', 'symptoms_list', 'treatments_list',
             'created_at', 'updated_at'
         ]
-    
-    def get_symptoms_list(self, obj):
-        return obj.get_symptoms_list()
-    
-    def get_treatments_list(self, obj):
-        return obj.get_treatments_list()
 
 
 class DiseaseListSerializer(serializers.ModelSerializer):
     """Simplified serializer for disease list view"""
-    symptoms_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Disease
         fields = [
             'id', 'name', 'disease_code', 'contagious', 'chronic', 'symptoms_count'
         ]
-    
-    def get_symptoms_count(self, obj):
-        return len(obj.get_symptoms_list())
 
 
-class SymptomCheckerSerializer(serializers.Serializer):
+class FuzzyMatchOptionsSerializer(serializers.Serializer):
+    fuzzy = serializers.BooleanField(
+        default=False,
+        help_text="Match misspelled symptoms using trigram similarity"
+    )
+    similarity_threshold = serializers.FloatField(
+        min_value=0.0,
+        max_value=1.0,
+        required=False,
+        help_text="Minimum trigram similarity for fuzzy matches"
+    )
+    ranking = serializers.ChoiceField(
+        choices=['match', 'idf'],
+        default='match',
+        help_text="'match' ranks by matched symptom count, 'idf' by BM25 relevance"
+    )
+
+    def validate(self, attrs):
+        if attrs.get('fuzzy') and attrs.get('ranking') == 'idf':
+            raise serializers.ValidationError({'ranking': ['idf ranking is not available for fuzzy matching.']})
+        return attrs
+
+
+class SymptomCheckerSerializer(FuzzyMatchOptionsSerializer):
     symptoms = serializers.ListField(
         child=serializers.CharField(max_length=200),
         min_length=1,
@@ -43,17 +54,62 @@ class SymptomCheckerSerializer(serializers.Serializer):
     )
 
 
+class SymptomCheckerBatchItemSerializer(serializers.Serializer):
+    symptoms = serializers.ListField(
+        child=serializers.CharField(max_length=200),
+        min_length=1,
+        help_text="List of symptoms to check"
+    )
+    top_k = serializers.IntegerField(
+        min_value=1,
+        max_value=100,
+        default=10,
+        help_text="Maximum number of ranked matches to return"
+    )
+
+
+class SymptomCheckerBatchSerializer(FuzzyMatchOptionsSerializer):
+    queries = SymptomCheckerBatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_queries(self, value):
+        max_size = getattr(settings, 'SYMPTOM_CHECKER_BATCH_MAX_SIZE', 5000)
+        if len(value) > max_size:
+            raise serializers.ValidationError(f'Ensure this field has no more than {max_size} elements.')
+        return value
+
+
+class SymptomSuggestQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(
+        max_length=200,
+        required=False,
+        allow_blank=True,
+        default='',
+        help_text="Symptom prefix typed so far"
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=50,
+        default=10,
+        help_text="Maximum number of suggestions to return"
+    )
+
+
 class SymptomCheckerResultSerializer(serializers.ModelSerializer):
     match_score = serializers.IntegerField()
     match_percentage = serializers.FloatField()
-    symptoms_list = serializers.SerializerMethodField()
+    # BM25 relevance, only present with ranking=idf
+    score = serializers.FloatField(required=False)
     
     class Meta:
         model = Disease
         fields = [
             'id', 'name', 'disease_code', 'contagious', 'chronic',
-            'match_score', 'match_percentage', 'symptoms_list'
+            'match_score', 'match_percentage', 'score', 'symptoms_list'
         ]
-    
-    def get_symptoms_list(self, obj):
-        return obj.get_symptoms_list()
+
+
+class FuzzySymptomCheckerResultSerializer(SymptomCheckerResultSerializer):
+    matched_symptoms = serializers.DictField(child=serializers.CharField())
+
+    class Meta(SymptomCheckerResultSerializer.Meta):
+        fields = SymptomCheckerResultSerializer.Meta.fields + ['matched_symptoms']
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .changefeed import record_changes
+from .models import Disease
+from .terms import sync_disease_terms
+
+
+@receiver(post_save, sender=Disease)
+def sync_normalized_terms(sender, instance, raw=False, **kwargs):
+    """Keep the Symptom/Treatment link tables in step with the text columns"""
+    if not raw:
+        sync_disease_terms([instance])
+
+
+@receiver(post_save, sender=Disease)
+@receiver(post_delete, sender=Disease)
+def record_catalog_change(sender, instance, **kwargs):
+    """Log the change in the catalog change feed; derived data follows on commit"""
+    record_changes([instance.pk])
@@ -0,0 +1,220 @@
+"""
+Warm-start snapshot of the compact catalog and its symptom index.
+
+build_snapshot writes every buffer of the CompactCatalog (ids, names,
+codes, the interned symptom vocabulary and its CSR arrays, flags and the
+id lookup) and of the IndexState built over it (terms, postings and
+their counts) to a binary file at build time. Processes then memory-map
+it instead of reading and re-parsing every disease row and re-indexing
+every phrase: the catalog's columns and the index postings are views of
+the mapping until their first change copies them.
+
+Layout: a little-endian header, then one section per buffer, each a
+name, an array typecode ('' for raw bytes) and a length followed by the
+native-endian data, padded to 8 bytes so every column is aligned. The
+file is replaced atomically, so opening it only checks that every
+section lies within it rather than checksumming the payload.
+
+The header records the format version and the CatalogVersion of the
+database the catalog was read from: its version, updated_at and, when
+load_diseases last loaded the whole table from a CSV file, that file's
+SHA-256. A snapshot read at the same version uses its ids as they are.
+One whose source hash matches also serves any other database loaded from
+the same file, such as a fresh instance of the Vercel deployment, and
+its ids are remapped by disease code as the database assigned them.
+A stale snapshot is rewritten by the first process that builds its
+catalog from the database.
+"""
+import calendar
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+
+from django.conf import settings
+
+from .models import CatalogVersion
+
+SNAPSHOT_MAGIC = b'DXSN'
+SNAPSHOT_FORMAT_VERSION = 4
+
+# magic, format version, catalog version, catalog updated_at (microseconds),
+# source file SHA-256 (zeros for none), section count
+HEADER = struct.Struct('<4sIQq32sI')
+# buffer name, array typecode, data length; a multiple of 8 bytes
+SECTION = struct.Struct('<36s4sQ')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def source_digest(path):
+    """Hex SHA-256 of a source file, as recorded by load_diseases"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def catalog_version():
+    """
+    (version, updated_at in microseconds, source hash) of the database's
+    CatalogVersion, (0, 0, '') without one
+    """
+    row = CatalogVersion.objects.filter(pk=1).values_list('version', 'updated_at', 'source_hash').first()
+    if row is None:
+        return 0, 0, ''
+    version, updated_at, source_hash = row
+    if updated_at is None:
+        return version, 0, source_hash
+    return version, calendar.timegm(updated_at.utctimetuple()) * 1000000 + updated_at.microsecond, source_hash
+
+
+def version_match(snapshot_version, version):
+    """
+    How a snapshot read at snapshot_version serves a database at version:
+    'version' when read at that same version, 'source' when both were
+    loaded from the same file, so only the ids may differ, else None
+    """
+    if snapshot_version == version:
+        return 'version'
+    if snapshot_version[2] and snapshot_version[2] == version[2]:
+        return 'source'
+    return None
+
+
+def write_snapshot(path, buffers, version):
+    """
+    Write a snapshot atomically.
+
+    buffers maps each buffer name to an array, bytes-like object or
+    memoryview, see CompactCatalog.buffers() and IndexState.buffers();
+    version is the catalog_version() they were read at.
+    """
+    catalog_version, updated_at, source_hash = version
+    header = HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, catalog_version, updated_at,
+        bytes.fromhex(source_hash) if source_hash else b'', len(buffers)
+    )
+
+    # A temporary file of its own, so concurrent writers never interleave
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(header)
+            for name, buffer in buffers.items():
+                view = memoryview(buffer)
+                typecode = '' if view.format == 'B' else view.format
+                file.write(SECTION.pack(name.encode(), typecode.encode(), view.nbytes))
+                file.write(view)
+                file.write(b'\0' * (-view.nbytes % 8))
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class CatalogSnapshot:
+    """
+    Read-only mapping of a snapshot file.
+
+    buffers() returns zero-copy views of the sections. Views handed to a
+    catalog keep the mapping alive until the catalog copies its columns or
+    is dropped, and the mapping is unmapped with the last of them; close()
+    the snapshot, or use it as a context manager, when no views are kept.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            self._read_sections()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_sections(self):
+        view = self._view(0, len(self._map))
+        try:
+            magic, version, catalog_version, updated_at, source_hash, section_count = HEADER.unpack_from(view)
+        except struct.error as exc:
+            raise SnapshotError('Truncated snapshot header') from exc
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f'Unsupported snapshot format {magic!r} v{version}')
+        source_hash = '' if source_hash == bytes(32) else source_hash.hex()
+        self.catalog_version = (catalog_version, updated_at, source_hash)
+
+        self.sections = {}
+        offset = HEADER.size
+        for _ in range(section_count):
+            try:
+                name, typecode, length = SECTION.unpack_from(view, offset)
+            except struct.error as exc:
+                raise SnapshotError('Truncated snapshot section') from exc
+            offset += SECTION.size
+            if offset + length > len(view):
+                raise SnapshotError('Truncated snapshot section')
+            self.sections[name.rstrip(b'\0').decode()] = (typecode.rstrip(b'\0').decode(), offset, length)
+            offset += length + (-length % 8)
+
+    def _view(self, start, end, typecode=''):
+        view = memoryview(self._map)[start:end]
+        self._views.append(view)
+        if typecode:
+            view = view.cast(typecode)
+            self._views.append(view)
+        return view
+
+    def buffers(self):
+        """{name: memoryview} of every section, cast to its typecode"""
+        return {
+            name: self._view(offset, offset + length, typecode)
+            for name, (typecode, offset, length) in self.sections.items()
+        }
+
+    def close(self):
+        """Release every view handed out and unmap the file"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def snapshot_is_current(path):
+    """Whether path holds a readable snapshot of the current format that serves the database, see version_match()"""
+    try:
+        with CatalogSnapshot(path) as snapshot:
+            return version_match(snapshot.catalog_version, catalog_version()) is not None
+    except (OSError, ValueError, SnapshotError):
+        return False
+
+
+def warm_start_buffers():
+    """
+    Return (buffers mapped from CATALOG_SNAPSHOT_PATH, version_match()),
+    or None when no snapshot is configured, it cannot be read or it does
+    not serve the database's current catalog. Costs one query.
+    """
+    path = getattr(settings, 'CATALOG_SNAPSHOT_PATH', None)
+    if not path:
+        return None
+    try:
+        snapshot = CatalogSnapshot(path)
+    except (OSError, ValueError, SnapshotError):
+        return None
+    match = version_match(snapshot.catalog_version, catalog_version())
+    if match is None:
+        snapshot.close()
+        return None
+    return snapshot.buffers(), match
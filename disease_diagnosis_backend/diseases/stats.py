@@ -0,0 +1,47 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .db import use_primary
+from .models import Disease
+
+STATS_CACHE_KEY = 'diseases:stats'
+
+
+@use_primary()
+def compute_stats():
+    """Compute the catalog statistics with a single aggregate query"""
+    counts = Disease.objects.aggregate(
+        total=Count('id'),
+        contagious=Count('id', filter=Q(contagious=True)),
+        chronic=Count('id', filter=Q(chronic=True)),
+    )
+    return {
+        'total_diseases': counts['total'],
+        'contagious_diseases': counts['contagious'],
+        'chronic_diseases': counts['chronic'],
+        'non_contagious_diseases': counts['total'] - counts['contagious'],
+        'non_chronic_diseases': counts['total'] - counts['chronic'],
+    }
+
+
+def get_stats():
+    """Return the cached statistics snapshot, computing it on a miss"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_stats()
+        cache.set(STATS_CACHE_KEY, stats, getattr(settings, 'DISEASE_STATS_CACHE_TIMEOUT', 60))
+    return stats
+
+
+async def aget_stats():
+    """Async get_stats(); a cache hit never leaves the event loop"""
+    stats = await cache.aget(STATS_CACHE_KEY)
+    if stats is None:
+        stats = await sync_to_async(get_stats)()
+    return stats
+
+
+def invalidate_stats():
+    cache.delete(STATS_CACHE_KEY)
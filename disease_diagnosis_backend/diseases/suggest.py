@@ -0,0 +1,92 @@
+import heapq
+from bisect import bisect_left, insort
+
+from .index import SymptomIndex, normalize_symptom, symptom_index
+
+# Prefixes up to this length span many phrases, so their answers are memoized
+MEMOIZED_PREFIX_LENGTH = 3
+
+
+class SuggestIndexState:
+    """
+    Sorted (word-start key, term id) entries over the terms of one symptom
+    index state; answers are memoized per index generation
+    """
+
+    __slots__ = ['index', 'entries', 'term_count', 'generation', 'memo']
+
+    def __init__(self, index):
+        self.index = index
+        self.entries = []
+        self.term_count = 0
+        self.generation = None
+        self.sync()
+
+    def is_synced(self):
+        return self.generation == self.index.generation and self.term_count == len(self.index.terms)
+
+    def sync(self):
+        """Key the terms added to the symptom index since the last call"""
+        terms = self.index.terms
+        # Every word start of a phrase is a key, so "skin" finds "itchy skin"
+        added = [
+            (' '.join(words[i:]), term_id)
+            for term_id in range(self.term_count, len(terms))
+            for words in [terms[term_id].split()]
+            for i in range(len(words))
+        ]
+        if self.term_count:
+            for entry in added:
+                insort(self.entries, entry)
+        else:
+            self.entries = sorted(added)
+        self.term_count = len(terms)
+        if self.generation != self.index.generation:
+            self.memo = {}
+            self.generation = self.index.generation
+
+
+class SymptomSuggestIndex(SymptomIndex):
+    """
+    Prefix lookup over canonical symptom phrases for autocomplete.
+
+    The terms of the symptom index are kept in a sorted array keyed by each
+    word start, so a prefix is a contiguous slice found with two binary
+    searches. Suggestions are ranked by how many current diseases list the
+    phrase.
+    """
+
+    def source(self):
+        return symptom_index._get_state()
+
+    def current_source(self):
+        return symptom_index.current()
+
+    def build(self, index):
+        return SuggestIndexState(index)
+
+    def suggest(self, prefix, limit=10):
+        """Return up to limit (phrase, disease_count) pairs for the prefix"""
+        state = self._get_state()
+        memo = state.memo
+        prefix = ' '.join(normalize_symptom(prefix).split())
+
+        memo_key = (prefix, limit)
+        if len(prefix) <= MEMOIZED_PREFIX_LENGTH and memo_key in memo:
+            return memo[memo_key]
+
+        entries = state.entries
+        start = bisect_left(entries, (prefix,))
+        end = bisect_left(entries, (prefix + '\uffff',), lo=start)
+        terms = state.index.terms
+        counts = state.index.doc_counts
+        term_ids = {term_id for _, term_id in entries[start:end] if counts[term_id]}
+        results = heapq.nsmallest(limit, term_ids, key=lambda term_id: (-counts[term_id], terms[term_id]))
+        results = [(terms[term_id], counts[term_id]) for term_id in results]
+
+        if len(prefix) <= MEMOIZED_PREFIX_LENGTH:
+            memo[memo_key] = results
+        return results
+
+
+suggest_index = SymptomSuggestIndex()
@@ -0,0 +1,63 @@
+"""
+Synthetic disease catalogs for benchmarking.
+
+Scales a source CSV in the Diseases_Symptoms.csv format to any number of
+rows. Every generated disease copies a source row under a unique name and
+code and borrows a few symptoms from other rows, so the symptom vocabulary
+and posting lists grow with the catalog the way real data would.
+"""
+import csv
+import random
+
+CSV_FIELDS = ['Name', 'Symptoms', 'Treatments', 'Disease_Code', 'Contagious', 'Chronic']
+
+
+def read_source_rows(csv_file):
+    """Source rows with a name and code, first occurrence of each name/code only"""
+    rows = []
+    seen = set()
+    with open(csv_file, 'r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            name = (row.get('Name') or '').strip()
+            code = (row.get('Disease_Code') or '').strip()
+            if not name or not code or name in seen or code in seen:
+                continue
+            seen.update([name, code])
+            rows.append(row)
+    return rows
+
+
+def generate_rows(source_rows, size, seed=0):
+    """Yield size synthetic CSV rows derived from source_rows"""
+    rng = random.Random(seed)
+    phrases = [
+        phrase.strip()
+        for row in source_rows
+        for phrase in (row.get('Symptoms') or '').split(',')
+        if phrase.strip()
+    ]
+
+    for i in range(size):
+        source = source_rows[i % len(source_rows)]
+        generation = i // len(source_rows)
+        symptoms = [s.strip() for s in (source.get('Symptoms') or '').split(',') if s.strip()]
+        if generation:
+            symptoms += rng.sample(phrases, min(len(phrases), rng.randint(1, 3)))
+
+        yield {
+            'Name': f"{source['Name'].strip()} {generation}" if generation else source['Name'].strip(),
+            'Symptoms': ', '.join(dict.fromkeys(symptoms)),
+            'Treatments': source.get('Treatments') or '',
+            # Disease_Code is at most 10 characters
+            'Disease_Code': f'S{i:09d}',
+            'Contagious': source.get('Contagious') or 'False',
+            'Chronic': source.get('Chronic') or 'False',
+        }
+
+
+def generate_catalog(source_rows, size, output_file, seed=0):
+    """Write size synthetic diseases derived from source_rows to output_file"""
+    with open(output_file, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(generate_rows(source_rows, size, seed))
@@ -0,0 +1,76 @@
+from .models import DiseaseSymptom, DiseaseTreatment, Symptom, Treatment
+
+TERM_MAX_LENGTH = 255
+
+
+def canonical_terms(text):
+    """Split comma-separated text into unique canonical terms, keeping order"""
+    if not text:
+        return []
+    terms = []
+    seen = set()
+    for term in text.split(','):
+        term = term.strip().lower()[:TERM_MAX_LENGTH]
+        if term and term not in seen:
+            seen.add(term)
+            terms.append(term)
+    return terms
+
+
+def _resolve_terms(model, names):
+    """Return a name -> id mapping, creating any missing terms in bulk"""
+    existing = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [model(name=name) for name in names if name not in existing]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+    return existing
+
+
+def _sync(diseases, source_field, term_model, link_model, link_field):
+    per_disease = {disease.pk: canonical_terms(getattr(disease, source_field)) for disease in diseases}
+    names = {name for terms in per_disease.values() for name in terms}
+    term_ids = _resolve_terms(term_model, names) if names else {}
+
+    link_model.objects.filter(disease_id__in=per_disease.keys()).delete()
+    links = [
+        link_model(disease_id=disease_id, position=position, **{f'{link_field}_id': term_ids[name]})
+        for disease_id, terms in per_disease.items()
+        for position, name in enumerate(terms)
+    ]
+    link_model.objects.bulk_create(links, batch_size=500)
+
+
+def sync_disease_terms(diseases):
+    """
+    Rebuild the normalized symptom and treatment links for the given diseases
+    from their comma-separated text columns.
+    """
+    diseases = [disease for disease in diseases if disease.pk is not None]
+    if not diseases:
+        return
+    _sync(diseases, 'symptoms', Symptom, DiseaseSymptom, 'symptom')
+    _sync(diseases, 'treatments', Treatment, DiseaseTreatment, 'treatment')
+
+
+def prune_orphan_terms():
+    """Delete symptom and treatment terms no longer linked to any disease"""
+    Symptom.objects.filter(disease_symptoms__isnull=True).delete()
+    Treatment.objects.filter(disease_treatments__isnull=True).delete()
+
+
+def diseases_with_symptom(term, exact=False):
+    """
+    Return a queryset of disease ids having a symptom equal to the term or,
+    unless exact, containing it.
+
+    Matching symptom ids are resolved against the Symptom vocabulary first,
+    through its unique name index for exact terms; substrings scan only the
+    distinct symptom names. The links are then read through the
+    (symptom, disease) index instead of joining every link row to its name.
+    """
+    term = term.strip().lower()
+    symptoms = Symptom.objects.filter(name=term) if exact else Symptom.objects.filter(name__contains=term)
+    return DiseaseSymptom.objects.filter(
+        symptom_id__in=symptoms.values('id')
+    ).order_by().values('disease_id')
@@ -1,3 +1,1360 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from rest_framework.fields import DateTimeField
+from rest_framework.renderers import JSONRenderer
+
+from .caching import invalidate_catalog_version
+from .catalog import CompactCatalog, compact_catalog
+from .changefeed import batched_changes, catalog_changed, catalog_feed, current_version
+from .coalescing import SingleFlight
+from .fast_serializers import SYMPTOM_CHECKER_COLUMNS, serialize_datetime, symptom_checker_result_data
+from .fuzzy import fuzzy_index
+from .index import symptom_index
+from .instrumentation import metrics_registry
+from .models import CatalogChange, CatalogVersion, Disease, DiseaseSymptom, DiseaseTreatment, Symptom
+from .parallel import _score_shard, parallel_engine
+from .renderers import ORJSONRenderer
+from .scoring import sparse_engine
+from .serializers import DiseaseSerializer, SymptomCheckerResultSerializer
+from .suggest import suggest_index
+from .synthetic import generate_rows
+from .terms import diseases_with_symptom
+from .views import symptom_checker_results
+from . import renderers, snapshot
+from .result_cache import clear_result_caches, get_result_cache
+from .search import ContainsSearchBackend, SQLiteFTSSearchBackend, get_search_backend
+
+HAS_NUMPY = all(importlib.util.find_spec(name) for name in ['numpy', 'scipy'])
+
+
+def full_scan(input_symptoms, limit=10):
+    """Reference ranking: the original per-row symptom_match_score loop"""
+    results = []
+    for disease in Disease.objects.all():
+        match_score = disease.symptom_match_score(input_symptoms)
+        if match_score > 0:
+            total_symptoms = len(disease.get_symptoms_list())
+            match_percentage = (match_score / max(len(input_symptoms), total_symptoms)) * 100
+            results.append((disease.id, match_score, round(match_percentage, 2)))
+    results.sort(key=lambda x: (-x[1], -x[2]))
+    return results[:limit]
+
+
+class ScoringEngineParityTest(TestCase):
+    queries = [
+        ['fever'],
+        ['Fever', 'cough'],
+        ['headache', 'nausea', 'fever'],
+        ['itchy skin on the hands'],
+        ['pain'],
+        ['skin'],
+        ['fever', 'fever'],
+        ['unknown symptom'],
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = [
+            ('Common Cold', 'Fever, cough, sore throat, runny nose'),
+            ('Influenza', 'fever, Cough, headache, muscle pain, fatigue'),
+            ('Migraine', 'Headache, nausea, sensitivity to light'),
+            ('Eczema', 'Itchy skin, rash, dry skin'),
+            ('Scabies', 'itchy skin'),
+            ('Back Pain', 'pain, stiffness'),
+            ('Gastritis', 'Nausea, abdominal pain, , bloating'),
+            ('Asymptomatic', ''),
+            ('Typhoid', 'fever, fever, headache'),
+        ]
+        for code, (name, symptoms) in enumerate(rows):
+            Disease.objects.create(name=name, symptoms=symptoms, disease_code=f'T{code:03d}')
+
+    def assert_parity(self, engine):
+        compact_catalog.invalidate()
+        engine.invalidate()
+        for query in self.queries:
+            for limit in [1, 3, 10]:
+                with self.subTest(query=query, limit=limit):
+                    self.assertEqual(engine.match(query, limit=limit), full_scan(query, limit))
+        self.assertEqual(
+            engine.match_many([(query, 10) for query in self.queries]),
+            [full_scan(query) for query in self.queries]
+        )
+
+    def test_index_engine_matches_full_scan(self):
+        self.assert_parity(symptom_index)
+
+    @override_settings(SYMPTOM_SCORING_WORKERS=3, SYMPTOM_SCORING_PARALLEL_THRESHOLD=0)
+    def test_parallel_engine_matches_full_scan(self):
+        self.addCleanup(parallel_engine.invalidate)
+        self.assert_parity(parallel_engine)
+        self.assertEqual(len(parallel_engine._get_state().executors), 3)
+
+    @override_settings(SYMPTOM_SCORING_WORKERS=3, SYMPTOM_SCORING_PARALLEL_THRESHOLD=0)
+    def test_parallel_engine_patches_shards(self):
+        self.addCleanup(parallel_engine.invalidate)
+        compact_catalog.invalidate()
+        parallel_engine.invalidate()
+        executors = parallel_engine._get_state().executors
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.create(name='Hay Fever', symptoms='sneezing, fever', disease_code='T999')
+            migraine = Disease.objects.get(name='Migraine')
+            migraine.name = 'Cluster Headache'
+            migraine.save()
+            Disease.objects.filter(name='Typhoid').delete()
+
+        self.assertEqual(parallel_engine._get_state().executors, executors)
+        for query in self.queries + [['sneezing']]:
+            with self.subTest(query=query):
+                self.assertEqual(parallel_engine.match(query), full_scan(query))
+
+    @override_settings(
+        SYMPTOM_SCORING_WORKERS=2, SYMPTOM_SCORING_PARALLEL_THRESHOLD=0, SYMPTOM_SCORING_START_METHOD='spawn'
+    )
+    def test_parallel_engine_spawns_workers(self):
+        self.addCleanup(parallel_engine.invalidate)
+        self.assert_parity(parallel_engine)
+        # Scored on the workers, not by the in-process fallback
+        for executor in parallel_engine._get_state().executors:
+            self.assertEqual(executor.submit(_score_shard, [(['fever'], 10)]).result()[0][0][1], 1)
+
+    @override_settings(SYMPTOM_SCORING_WORKERS=2, SYMPTOM_SCORING_PARALLEL_THRESHOLD=10)
+    def test_parallel_engine_shards_once_past_threshold(self):
+        self.addCleanup(parallel_engine.invalidate)
+        compact_catalog.invalidate()
+        parallel_engine.invalidate()
+        self.assertIsNone(parallel_engine._get_state().executors)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.create(name='Hay Fever', symptoms='sneezing, fever', disease_code='T999')
+        self.assertEqual(len(parallel_engine._get_state().executors), 2)
+        for query in self.queries + [['sneezing']]:
+            with self.subTest(query=query):
+                self.assertEqual(parallel_engine.match(query), full_scan(query))
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy and scipy are required for the sparse engine')
+    def test_sparse_engine_matches_full_scan(self):
+        self.assert_parity(sparse_engine)
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy and scipy are required for the sparse engine')
+    def test_sparse_engine_rebuilds_after_change(self):
+        sparse_engine.invalidate()
+        self.assertEqual(sparse_engine.match(['sneezing']), full_scan(['sneezing']))
+        with self.captureOnCommitCallbacks(execute=True):
+            disease = Disease.objects.create(name='Hay Fever', symptoms='sneezing', disease_code='T999')
+        self.assertEqual(sparse_engine.match(['sneezing'])[0], (disease.id, 1, 100.0))
+        self.assertEqual(sparse_engine.match(['sneezing']), full_scan(['sneezing']))
+
+
+@unittest.skipUnless(HAS_NUMPY, 'numpy and scipy are required for the sparse engine')
+class SparseEngineParityTest(TestCase):
+    """Sparse engine against SymptomIndex.match on a catalog with many ties"""
+
+    @classmethod
+    def setUpTestData(cls):
+        source_rows = [
+            {'Name': name, 'Symptoms': symptoms, 'Disease_Code': f'T{code:03d}'}
+            for code, (name, symptoms) in enumerate([
+                ('Common Cold', 'Fever, cough, sore throat, runny nose'),
+                ('Influenza', 'fever, Cough, headache, muscle pain, fatigue'),
+                ('Migraine', 'Headache, nausea, sensitivity to light'),
+                ('Eczema', 'Itchy skin, rash, dry skin'),
+                ('Back Pain', 'pain, stiffness'),
+                ('Gastritis', 'Nausea, abdominal pain, bloating'),
+            ])
+        ]
+        for row in generate_rows(source_rows, 240, seed=1):
+            Disease.objects.create(name=row['Name'], symptoms=row['Symptoms'], disease_code=row['Disease_Code'])
+
+    def setUp(self):
+        catalog_changed()
+
+    def assert_parity(self):
+        queries = [
+            [], ['fever'], ['PAIN'], ['skin', 'rash'], ['headache', 'nausea', 'fever'],
+            ['itchy skin on the hands'], ['fever', 'fever'], ['unknown symptom'], ['a'],
+        ]
+        for limit in [1, 5, 10, 1000]:
+            with self.subTest(limit=limit):
+                batch = [(query, limit) for query in queries]
+                self.assertEqual(sparse_engine.match_many(batch), symptom_index.match_many(batch))
+
+    def test_matches_index_engine(self):
+        self.assert_parity()
+
+    def test_matches_index_engine_after_patches(self):
+        self.assert_parity()
+        catalog = compact_catalog.current()
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.create(name='Aaa Fever', symptoms='fever, cough', disease_code='T999')
+            Disease.objects.filter(name__startswith='Influenza').delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            migraine = Disease.objects.get(name='Migraine 2')
+            migraine.name = 'Zzz Migraine'
+            migraine.symptoms = 'fever, rash'
+            migraine.save()
+        # Patched in place rather than rebuilt
+        self.assertIs(compact_catalog.current(), catalog)
+        self.assert_parity()
+
+
+class DerivedFieldsTest(TestCase):
+    def test_lists_follow_text_columns(self):
+        disease = Disease.objects.create(
+            name='Influenza', symptoms=' Fever,cough , , ', treatments='Rest', disease_code='T001'
+        )
+        row = Disease.objects.values(*Disease.DERIVED_FIELDS).get(pk=disease.pk)
+        self.assertEqual(row, {'symptoms_count': 4, 'symptoms_list': ['Fever', 'cough', '', ''], 'treatments_list': ['Rest']})
+
+        disease.symptoms = 'headache'
+        disease.treatments = ''
+        disease.save(update_fields=['symptoms', 'treatments'])
+        row = Disease.objects.values(*Disease.DERIVED_FIELDS).get(pk=disease.pk)
+        self.assertEqual(row, {'symptoms_count': 1, 'symptoms_list': ['headache'], 'treatments_list': []})
+
+    def test_score_uses_stored_list(self):
+        disease = Disease.objects.create(name='Migraine', symptoms='Headache, nausea', disease_code='T001')
+        disease = Disease.objects.defer('symptoms').get(pk=disease.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(disease.symptom_match_score(['HEADACHE', 'light']), 1)
+
+
+class StatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_is_one_query_and_cached(self):
+        Disease.objects.create(name='Influenza', symptoms='fever', disease_code='T001', contagious=True)
+        Disease.objects.create(name='Migraine', symptoms='headache', disease_code='T002', chronic=True)
+        # The catalog version behind the validators, then a single aggregate
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/stats/')
+        self.assertEqual(response.json(), {
+            'total_diseases': 2, 'contagious_diseases': 1, 'chronic_diseases': 1,
+            'non_contagious_diseases': 1, 'non_chronic_diseases': 1,
+        })
+        with mock.patch.object(catalog_feed, 'due', return_value=False), self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/health/').json()['total_diseases'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.filter(name='Migraine').delete()
+        self.assertEqual(self.client.get('/api/health/').json()['total_diseases'], 1)
+
+    def test_probes(self):
+        # Between the change feed's periodic polls
+        with mock.patch.object(catalog_feed, 'due', return_value=False), self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/health/live/').json(), {'status': 'alive'})
+        response = self.client.get('/api/health/ready/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'not ready', 'total_diseases': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.create(name='Influenza', symptoms='fever', disease_code='T001')
+        response = self.client.get('/api/health/ready/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ready', 'total_diseases': 1})
+
+
+class NormalizedTermsTest(TestCase):
+    def links(self, disease):
+        return list(disease.disease_symptoms.values_list('symptom__name', 'position'))
+
+    def test_signals_keep_links_in_step(self):
+        flu = Disease.objects.create(
+            name='Influenza', symptoms='Fever, cough, fever, , Headache', treatments='Rest, fluids',
+            disease_code='D001'
+        )
+        self.assertEqual(self.links(flu), [('fever', 0), ('cough', 1), ('headache', 2)])
+        self.assertEqual(
+            list(flu.disease_treatments.values_list('treatment__name', flat=True)), ['rest', 'fluids']
+        )
+
+        migraine = Disease.objects.create(name='Migraine', symptoms='headache, NAUSEA', disease_code='D002')
+        self.assertEqual(Symptom.objects.filter(name='headache').count(), 1)
+        self.assertEqual(self.links(migraine), [('headache', 0), ('nausea', 1)])
+
+        flu.symptoms = 'cough, chills'
+        flu.treatments = ''
+        flu.save()
+        self.assertEqual(self.links(flu), [('cough', 0), ('chills', 1)])
+        self.assertFalse(flu.disease_treatments.exists())
+
+        flu.delete()
+        self.assertFalse(DiseaseSymptom.objects.filter(disease_id=flu.pk).exists())
+        self.assertFalse(DiseaseTreatment.objects.filter(disease_id=flu.pk).exists())
+        self.assertEqual(DiseaseSymptom.objects.count(), 2)
+
+    def test_diseases_with_symptom(self):
+        flu = Disease.objects.create(name='Influenza', symptoms='fever, headache', disease_code='D001')
+        migraine = Disease.objects.create(name='Migraine', symptoms='Headache', disease_code='D002')
+        cold = Disease.objects.create(name='Common Cold', symptoms='mild fever', disease_code='D003')
+
+        def ids(term, **kwargs):
+            return sorted(row['disease_id'] for row in diseases_with_symptom(term, **kwargs))
+
+        self.assertEqual(ids(' ACHE '), sorted([flu.pk, migraine.pk]))
+        self.assertEqual(ids('fever'), sorted([flu.pk, cold.pk]))
+        self.assertEqual(ids('Fever', exact=True), [flu.pk])
+        self.assertEqual(ids('ache', exact=True), [])
+        self.assertEqual(ids('rash'), [])
+
+
+class LoadDiseasesTest(TestCase):
+    header = 'Name,Symptoms,Treatments,Disease_Code,Contagious,Chronic\n'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.csv_file = os.path.join(directory, 'diseases.csv')
+
+    def load(self, *rows, **options):
+        with open(self.csv_file, 'w') as file:
+            file.write(self.header + ''.join(f'{row}\n' for row in rows))
+        out = io.StringIO()
+        call_command('load_diseases', csv_file=self.csv_file, batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_incremental_reload(self):
+        output = self.load(
+            'Influenza,"Fever, cough",Rest,D001,True,False',
+            'Migraine,Headache,,D002,False,True',
+            'Eczema,Itchy skin,,D003,False,True',
+        )
+        self.assertIn('Inserted 3, updated 0, deleted 0, unchanged 0 diseases', output)
+        migraine = Disease.objects.get(disease_code='D002')
+        self.assertEqual(migraine.symptoms_list, ['Headache'])
+
+        output = self.load(
+            'Influenza,"Fever, cough, fatigue",Rest,D001,True,False',
+            'Migraine,Headache,,D002,False,True',
+            'Hay Fever,Sneezing,,D004,False,False',
+        )
+        self.assertIn('Inserted 1, updated 1, deleted 1, unchanged 1 diseases', output)
+        self.assertEqual(
+            Disease.objects.get(disease_code='D001').symptoms_list, ['Fever', 'cough', 'fatigue']
+        )
+        self.assertEqual(Disease.objects.get(disease_code='D002').updated_at, migraine.updated_at)
+        self.assertFalse(Disease.objects.filter(disease_code='D003').exists())
+        self.assertEqual(
+            list(DiseaseSymptom.objects.filter(disease__disease_code='D004').values_list('symptom__name', flat=True)),
+            ['sneezing']
+        )
+
+        output = self.load('Influenza,Fever,Rest,D001,True,False', keep_missing=True)
+        self.assertIn('deleted 0', output)
+        self.assertEqual(Disease.objects.count(), 3)
+
+    def test_conflicting_rows_are_skipped(self):
+        self.load('Influenza,Fever,,D001,False,False', 'Migraine,Headache,,D002,False,False')
+        output = self.load(
+            'Influenza,Fever,,D001,False,False',
+            'Migraine,Headache,,D002,False,False',
+            'Influenza,Cough,,D003,False,False',
+            'Migraine,Nausea,,D004,False,False',
+            'Hay Fever,Sneezing,,D005,False,False',
+        )
+        self.assertIn('Skipping duplicate disease Influenza (D003)', output)
+        self.assertIn('Inserted 1, updated 0, deleted 0, unchanged 2 diseases', output)
+        self.assertIn('Skipped 2 entries', output)
+
+        # A new code taking the name of an existing disease
+        output = self.load(
+            'Influenza,Fever,,D001,False,False',
+            'Migraine,Headache,,D006,False,False',
+            'Hay Fever,Sneezing,,D005,False,False',
+            keep_missing=True
+        )
+        self.assertIn('Skipping Migraine (D006): name already used by D002', output)
+        self.assertEqual(Disease.objects.get(name='Migraine').disease_code, 'D002')
+
+    def test_errors_fail_the_command(self):
+        with self.assertRaisesMessage(CommandError, 'CSV file not found'):
+            call_command('load_diseases', csv_file='/nonexistent/diseases.csv', stdout=io.StringIO())
+
+        self.load('Influenza,Fever,,D001,False,False')
+        with open(self.csv_file, 'wb') as file:
+            file.write(self.header.encode() + b'Migraine,Headache,,D002,False,False\nEczema,\xff,,D003,False,False\n')
+        with self.assertRaisesMessage(CommandError, 'no changes were applied'):
+            call_command('load_diseases', csv_file=self.csv_file, stdout=io.StringIO())
+        self.assertEqual(list(Disease.objects.values_list('name', flat=True)), ['Influenza'])
+
+
+class SymptomCheckerBatchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ScoringEngineParityTest.setUpTestData.__func__(cls)
+
+    def setUp(self):
+        catalog_changed()
+
+    def post(self, data, path='/api/symptom-checker/batch/'):
+        return self.client.post(path, data, content_type='application/json')
+
+    def test_results_match_single_queries(self):
+        queries = [{'symptoms': ['fever']}, {'symptoms': ['headache', 'nausea'], 'top_k': 1}]
+        response = self.post({'queries': queries})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['results'][0], self.post({'symptoms': ['fever']}, '/api/symptom-checker/').json())
+        self.assertEqual(len(data['results'][1]['results']), 1)
+        self.assertEqual(data['results'][1]['results'][0]['name'], 'Migraine')
+
+    def test_stream_yields_one_line_per_query(self):
+        queries = [{'symptoms': ['fever']}, {'symptoms': ['unknown symptom']}, {'symptoms': ['skin']}]
+        expected = self.post({'queries': queries}).json()['results']
+        response = self.client.post(
+            '/api/symptom-checker/batch/?stream=true', {'queries': queries}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    @override_settings(SYMPTOM_CHECKER_BATCH_MAX_SIZE=2)
+    def test_invalid_batches(self):
+        for data, field in [
+            ({'queries': []}, 'queries'),
+            ({}, 'queries'),
+            ({'queries': [{'symptoms': ['fever']}] * 3}, 'queries'),
+            ({'queries': [{'symptoms': []}]}, 'queries'),
+            ({'queries': [{'symptoms': ['fever'], 'top_k': 0}]}, 'queries'),
+            ({'queries': [{'symptoms': ['fever'], 'top_k': 101}]}, 'queries'),
+            ({'queries': [{'symptoms': ['x' * 201]}]}, 'queries'),
+            ({'queries': [{'symptoms': ['fever']}], 'ranking': 'bm25'}, 'ranking'),
+        ]:
+            with self.subTest(data=data):
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json())
+        self.assertEqual(self.post({'queries': [{'symptoms': ['fever']}] * 2}).status_code, 200)
+
+
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for code in range(45):
+            Disease.objects.create(
+                name=f'Disease {(code * 7) % 45:02d}',
+                symptoms='fever, cough' if code % 2 else 'headache',
+                disease_code=f'P{code:03d}',
+                chronic=code % 3 == 0,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, response):
+        """Rows of a cursor page and every page after it"""
+        rows = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertNotIn('count', data)
+            rows += data['results']
+            if data['next'] is None:
+                return rows
+            response = self.client.get(data['next'])
+
+    def names(self, queryset):
+        return list(queryset.order_by('name').values_list('name', flat=True))
+
+    def test_pages_are_ordered_by_name(self):
+        for params, queryset in [
+            ({}, Disease.objects.all()),
+            ({'chronic': 'true'}, Disease.objects.filter(chronic=True)),
+        ]:
+            with self.subTest(params=params):
+                rows = self.walk(self.client.get('/api/diseases/', {'pagination': 'cursor', **params}))
+                self.assertEqual([row['name'] for row in rows], self.names(queryset))
+        self.assertEqual(rows[0]['symptoms_count'], Disease.objects.get(pk=rows[0]['id']).symptoms_count)
+
+    def test_writes_do_not_shift_later_pages(self):
+        first = self.client.get('/api/diseases/', {'pagination': 'cursor'}).json()
+        self.assertEqual(len(first['results']), 20)
+        later = self.names(Disease.objects.all())[20:]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Sorts into the first page, and removes a row already served
+            Disease.objects.create(name='Disease 00a', symptoms='rash', disease_code='P999')
+            Disease.objects.filter(name='Disease 00').delete()
+
+        rows = self.walk(self.client.get(first['next']))
+        self.assertEqual([row['name'] for row in rows], later)
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cold = Disease.objects.create(
+            name='Common Cold', symptoms='cough, fever', treatments='rest, "fluids"', disease_code='E001'
+        )
+        cls.migraine = Disease.objects.create(
+            name='Migraine', symptoms='Headache, nausea', treatments='', disease_code='E002', chronic=True
+        )
+        Disease.objects.filter(pk=cls.cold.pk).update(
+            updated_at=timezone.now() - timezone.timedelta(days=2)
+        )
+
+    def export(self, params):
+        response = self.client.get('/api/diseases/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def expected(self, *diseases):
+        return [DiseaseSerializer(Disease.objects.get(pk=disease.pk)).data for disease in diseases]
+
+    def test_ndjson_rows_match_detail_serializer(self):
+        response, content = self.export({})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertTrue(content.endswith('\n'))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows, json.loads(json.dumps(self.expected(self.cold, self.migraine))))
+
+    def test_csv_encodes_lists_as_json(self):
+        response, content = self.export({'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment', response['Content-Disposition'])
+        reader = csv.DictReader(io.StringIO(content))
+        rows = list(reader)
+        self.assertEqual(reader.fieldnames, DiseaseSerializer.Meta.fields)
+        self.assertEqual([row['name'] for row in rows], ['Common Cold', 'Migraine'])
+        self.assertEqual(json.loads(rows[0]['treatments_list']), ['rest', '"fluids"'])
+        self.assertEqual(json.loads(rows[1]['treatments_list']), [])
+        self.assertEqual(rows[1]['chronic'], 'True')
+
+    def test_since_limits_to_recent_updates(self):
+        since = (timezone.now() - timezone.timedelta(days=1)).isoformat()
+        _, content = self.export({'since': since})
+        self.assertEqual([json.loads(line)['name'] for line in content.splitlines()], ['Migraine'])
+
+    def test_invalid_parameters(self):
+        for params in [{'format': 'xml'}, {'since': 'yesterday'}]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/diseases/export/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+        self.assertEqual(self.client.post('/api/diseases/export/').status_code, 405)
+
+
+class FastSerializerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cold = Disease.objects.create(
+            name='Common Cold', symptoms='cough, fever', treatments='rest', disease_code='F001'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_matches_drf(self):
+        response = self.client.get(f'/api/diseases/{self.cold.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, JSONRenderer().render(DiseaseSerializer(self.cold).data))
+
+    def test_missing_detail_is_drf_404(self):
+        for pk in [0, self.cold.pk + 1]:
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/diseases/{pk}/')
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': 'Not found.'})
+
+    def test_datetimes_match_drf(self):
+        for value in [None, timezone.now(), timezone.now().replace(microsecond=0)]:
+            with self.subTest(value=value):
+                self.assertEqual(serialize_datetime(value), DateTimeField().to_representation(value))
+
+    def test_results_of_deleted_diseases_are_skipped(self):
+        rows = {self.cold.pk: Disease.objects.values(*SYMPTOM_CHECKER_COLUMNS).get(pk=self.cold.pk)}
+        results = symptom_checker_results([(self.cold.pk + 1, 1, 50.0), (self.cold.pk, 1, 50.0)], rows)
+        self.assertEqual([result['id'] for result in results], [self.cold.pk])
+
+
+class SearchBackendTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.migraine = Disease.objects.create(name='Migraine', symptoms='Headache, nausea', disease_code='N001')
+        cls.headache = Disease.objects.create(name='Tension Headache', symptoms='neck pain', disease_code='N002')
+        cls.cold = Disease.objects.create(name='Common Cold', symptoms='cough, fever', disease_code='C103')
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, backend, term):
+        return [disease.name for disease in backend.search(Disease.objects.all(), term)]
+
+    def test_fts_keeps_substring_semantics(self):
+        fts = SQLiteFTSSearchBackend()
+        for term in ['ache', 'HEADACHE', '103', 'n00', 'ough', 'pain', 'rash', 'x"y', 'ne', 'he,', 'Headache, nau']:
+            with self.subTest(term=term):
+                self.assertEqual(
+                    sorted(self.names(fts, term)), sorted(self.names(ContainsSearchBackend(), term))
+                )
+        # Terms spanning a comma match the symptoms text
+        self.assertEqual(self.names(ContainsSearchBackend(), 'he, NAUSEA'), ['Migraine'])
+        self.assertEqual(self.names(ContainsSearchBackend(), 'h,'), ['Common Cold'])
+        # Name hits outrank symptom hits
+        self.assertEqual(self.names(fts, 'headache'), ['Tension Headache', 'Migraine'])
+
+    def test_fts_follows_writes(self):
+        fts = SQLiteFTSSearchBackend()
+        self.cold.symptoms = 'cough, headache'
+        self.cold.save()
+        self.assertIn('Common Cold', self.names(fts, 'ache'))
+        self.migraine.delete()
+        self.assertNotIn('Migraine', self.names(fts, 'ache'))
+
+    def test_backend_is_detected_per_alias(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSSearchBackend)
+        self.assertIsInstance(get_search_backend('default'), SQLiteFTSSearchBackend)
+        with override_settings(DISEASE_SEARCH_BACKEND='contains'):
+            self.assertIsInstance(get_search_backend(), ContainsSearchBackend)
+
+    def test_ranked_search_ignores_cursor_pagination(self):
+        response = self.client.get('/api/diseases/', {'search': 'headache', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([row['name'] for row in data['results']], ['Tension Headache', 'Migraine'])
+
+
+class FuzzySymptomIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.migraine = Disease.objects.create(
+            name='Migraine', symptoms='Headache, nausea', disease_code='T001'
+        )
+        cls.eczema = Disease.objects.create(
+            name='Eczema', symptoms='Itchy skin, rash', disease_code='T002'
+        )
+
+    def setUp(self):
+        fuzzy_index.invalidate()
+
+    def test_misspelled_symptoms_match(self):
+        for term in ['head ache', 'headach']:
+            with self.subTest(term=term):
+                self.assertEqual(
+                    fuzzy_index.match([term]),
+                    [(self.migraine.id, 1, 50.0, {term: 'headache'})]
+                )
+        self.assertEqual(
+            fuzzy_index.match(['itchy skn', 'rash']),
+            [(self.eczema.id, 2, 100.0, {'itchy skn': 'itchy skin', 'rash': 'rash'})]
+        )
+
+    def test_threshold_is_configurable(self):
+        self.assertEqual(fuzzy_index.match(['itchy skn'], threshold=0.9), [])
+
+    def test_typos(self):
+        for term, phrase in [('nausia', 'nausea'), ('HEAD-ACHE', 'headache'), ('rashh', 'rash')]:
+            with self.subTest(term=term):
+                self.assertEqual(fuzzy_index.similar_phrases(term)[0][0], phrase)
+        self.assertEqual(fuzzy_index.match(['xyz']), [])
+        self.assertEqual(fuzzy_index.match([]), [])
+
+    def test_short_terms_keep_substring_matches(self):
+        self.addCleanup(catalog_changed)
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.create(name='Ulcer', symptoms='ra, pain', disease_code='T003')
+        for term in ['a', 'ea', 'n', 'ra', 'itchy rash', 'y s', ' A ']:
+            with self.subTest(term=term):
+                # Containment alone, as in the exact index
+                self.assertEqual(
+                    [match[:3] for match in fuzzy_index.match([term], limit=None, threshold=1.0)],
+                    symptom_index.match([term], limit=None)
+                )
+
+
+class SymptomSuggestTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rows = [
+            ('Migraine', 'Headache, nausea'),
+            ('Eczema', 'Itchy skin, rash'),
+            ('Influenza', 'fever, cough, headache'),
+            ('Common Cold', 'cough, runny nose'),
+        ]
+        for code, (name, symptoms) in enumerate(rows):
+            Disease.objects.create(name=name, symptoms=symptoms, disease_code=f'T{code:03d}')
+
+    def setUp(self):
+        catalog_changed()
+        self.addCleanup(catalog_changed)
+
+    def suggest(self, params):
+        response = self.client.get('/api/symptoms/suggest/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(result['symptom'], result['disease_count']) for result in response.json()['results']]
+
+    def test_empty_prefix_lists_most_common(self):
+        for params in [{}, {'q': ''}, {'q': '   '}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.suggest({**params, 'limit': 3}), [('cough', 2), ('headache', 2), ('fever', 1)])
+
+    def test_short_prefixes(self):
+        self.assertEqual(self.suggest({'q': 'c'}), [('cough', 2)])
+        self.assertEqual(self.suggest({'q': 'R'}), [('rash', 1), ('runny nose', 1)])
+        self.assertEqual(self.suggest({'q': 'r', 'limit': 1}), [('rash', 1)])
+        # Any word start matches, a word middle does not
+        self.assertEqual(self.suggest({'q': 'n'}), [('nausea', 1), ('runny nose', 1)])
+        self.assertEqual(self.suggest({'q': 'ough'}), [])
+        self.assertEqual(self.suggest({'q': '  Itchy   SK'}), [('itchy skin', 1)])
+
+    def test_typos_do_not_match(self):
+        for prefix in ['hedache', 'caugh', 'itchyskin']:
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self.suggest({'q': prefix}), [])
+
+    def test_deleted_phrases_are_dropped(self):
+        self.assertEqual(self.suggest({'q': 'ru'}), [('runny nose', 1)])
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.filter(name='Common Cold').delete()
+        self.assertEqual(self.suggest({'q': 'ru'}), [])
+        self.assertEqual(self.suggest({'q': 'co'}), [('cough', 1)])
+
+    def test_invalid_parameters(self):
+        for params in [{'limit': 0}, {'limit': 51}, {'limit': 'x'}, {'q': 'x' * 201}]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/symptoms/suggest/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for code in range(25):
+            Disease.objects.create(
+                name=f'Disease {code:02d}',
+                symptoms='fever, cough' if code % 2 else 'headache',
+                treatments='rest, fluids',
+                disease_code=f'A{code:03d}',
+                chronic=code % 3 == 0,
+            )
+
+    def setUp(self):
+        cache.clear()
+        symptom_index.invalidate()
+
+    async def assert_same_response(self, sync_path, async_path, data=None):
+        if data is None:
+            expected = await sync_to_async(self.client.get)(sync_path)
+            response = await self.async_client.get(async_path)
+        else:
+            expected = await sync_to_async(self.client.post)(sync_path, data, content_type='application/json')
+            response = await self.async_client.post(async_path, data, content_type='application/json')
+        self.assertEqual(response.status_code, expected.status_code)
+        # Pagination links point back at the async endpoint
+        content = response.content.decode().replace('/api/async/', '/api/')
+        self.assertEqual(json.loads(content), expected.json())
+
+    async def test_read_endpoints_match_sync_views(self):
+        disease = await Disease.objects.afirst()
+        for path in [
+            'diseases/', 'diseases/?page=', 'diseases/?page=2', 'diseases/?page=last', 'diseases/?page=9',
+            'diseases/?page=x', 'diseases/?page=2&search=fever',
+            'diseases/?chronic=true&search=fever', f'diseases/{disease.pk}/', 'diseases/0/',
+            'stats/', 'health/',
+        ]:
+            with self.subTest(path=path):
+                await self.assert_same_response(f'/api/{path}', f'/api/async/{path}')
+
+    async def test_empty_page_is_first_page(self):
+        response = await self.async_client.get('/api/async/diseases/?page=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Disease 00')
+
+    async def test_symptom_checker_matches_sync_view(self):
+        for data in [{'symptoms': ['fever']}, {'symptoms': ['feever'], 'fuzzy': True}, {'symptoms': []}]:
+            with self.subTest(data=data):
+                await self.assert_same_response('/api/symptom-checker/', '/api/async/symptom-checker/', data)
+
+
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Disease.objects.create(name='Influenza', symptoms='fever, cough', disease_code='T001')
+
+    def setUp(self):
+        cache.clear()
+        clear_result_caches()
+        metrics_registry.reset()
+
+    def test_disabled_by_default(self):
+        response = self.client.post('/api/symptom-checker/', {'symptoms': ['fever']}, content_type='application/json')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+    @override_settings(REQUEST_PROFILING=True)
+    def test_server_timing_and_metrics(self):
+        response = self.client.post('/api/symptom-checker/', {'symptoms': ['fever']}, content_type='application/json')
+        timing = response['Server-Timing']
+        for name in ['db;', 'score;', 'fetch;', 'serialize;', 'render;', 'total;']:
+            self.assertIn(name, timing)
+
+        metrics = self.client.get('/api/metrics/').content.decode()
+        self.assertIn(
+            'diseases_http_requests_total{route="api/symptom-checker/",method="POST",status="200"} 1', metrics
+        )
+        self.assertIn(
+            'diseases_http_request_duration_seconds_count{route="api/symptom-checker/",method="POST"} 1', metrics
+        )
+        self.assertIn('diseases_phase_duration_seconds_count{route="api/symptom-checker/",phase="score"} 1', metrics)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.flu = Disease.objects.create(name='Influenza', symptoms='fever, cough', disease_code='T001')
+        cls.cold = Disease.objects.create(name='Common Cold', symptoms='cough, sneezing', disease_code='T002')
+
+    def setUp(self):
+        cache.clear()
+        # Validators from an hour ago, so a change in this test is visibly later
+        CatalogVersion.objects.filter(pk=1).update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+        invalidate_catalog_version()
+
+    def test_unchanged_catalog_answers_304(self):
+        response = self.client.get('/api/diseases/')
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/diseases/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get('/api/diseases/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get('/api/diseases/?page=1')['ETag'], etag)
+
+    def test_delete_changes_both_validators(self):
+        response = self.client.get('/api/diseases/')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cold.delete()
+
+        response = self.client.get('/api/diseases/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get('/api/diseases/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_is_modified_with_its_row(self):
+        Disease.objects.filter(pk=self.flu.pk).update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+        self.flu.refresh_from_db()
+        path = f'/api/diseases/{self.flu.pk}/'
+        response = self.client.get(path)
+        self.assertEqual(response['Last-Modified'], http_date(self.flu.updated_at.timestamp()))
+
+        with mock.patch.object(catalog_feed, 'due', return_value=False), self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cold.save()
+        response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flu.save()
+        response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(self.flu.updated_at.timestamp()))
+
+    @override_settings(ALLOWED_HOSTS=['a.example', 'b.example'])
+    def test_cache_key_includes_host_and_scheme(self):
+        for code in range(25):
+            Disease.objects.create(name=f'Disease {code:02d}', disease_code=f'P{code:03d}')
+        invalidate_catalog_version()
+        for host in ['a.example', 'b.example']:
+            for secure in [False, True]:
+                with self.subTest(host=host, secure=secure):
+                    response = self.client.get('/api/diseases/', HTTP_HOST=host, secure=secure)
+                    scheme = 'https' if secure else 'http'
+                    self.assertEqual(response.json()['next'], f'{scheme}://{host}/api/diseases/?page=2')
+
+
+class SymptomCheckerResultCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.flu = Disease.objects.create(name='Influenza', symptoms='fever, cough', disease_code='T001')
+        Disease.objects.create(name='Common Cold', symptoms='cough, sneezing', disease_code='T002')
+
+    def setUp(self):
+        cache.clear()
+        catalog_changed()
+
+    def check(self, symptoms):
+        response = self.client.post('/api/symptom-checker/', {'symptoms': symptoms}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_hit_skips_scoring_and_queries(self):
+        results = self.check(['fever', 'cough'])
+        hits = get_result_cache().hits
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check([' Cough', 'FEVER ']), results)
+        self.assertEqual(get_result_cache().hits, hits + 1)
+
+    def test_entries_hold_matches(self):
+        results = self.check(['fever'])
+        [key] = get_result_cache().make_keys([(['fever'], 10)])
+        self.assertEqual(get_result_cache().get_many([key]), {key: [(self.flu.id, 1, 50.0)]})
+        self.assertEqual(results[0]['name'], 'Influenza')
+
+    def test_catalog_change_invalidates(self):
+        self.assertEqual(self.check(['sneezing'])[0]['name'], 'Common Cold')
+        self.flu.symptoms = 'sneezing'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flu.save()
+        self.assertEqual(self.check(['sneezing'])[0]['name'], 'Influenza')
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    data = {
+        'name': 'Grippe \u00e9t\u00e9 \u2028 \u2029', 'price': Decimal('1.50'), 'label': gettext_lazy('Diseases'),
+        'results': [{'id': 1, 'contagious': True, 'match_percentage': 33.33, 'matched': None}],
+    }
+
+    def assert_same_as_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(ORJSONRenderer().render(None), JSONRenderer().render(None))
+
+    @unittest.skipUnless(importlib.util.find_spec('orjson'), 'orjson is not installed')
+    def test_same_bytes_as_json_renderer(self):
+        self.assert_same_as_json_renderer()
+
+    def test_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assert_same_as_json_renderer()
+
+
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        self.flight = SingleFlight('test')
+        self.calls = 0
+        self.release = threading.Event()
+
+    def compute(self):
+        self.calls += 1
+        self.release.wait(5)
+        return ['result']
+
+    def test_threads_share_one_call(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.flight.do('key', self.compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        # Give the waiters time to join before the leader returns
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [['result']] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.counts, {'leader': 1, 'coalesced': 3, 'fallback': 0})
+
+    @override_settings(REQUEST_COALESCING_TIMEOUT=0.01)
+    async def test_coroutines_share_one_call_and_fall_back_on_timeout(self):
+        async def compute():
+            self.calls += 1
+            call = self.calls
+            await asyncio.sleep(0.05 if call == 1 else 0)
+            return call
+
+        results = await asyncio.gather(*(self.flight.ado('key', compute) for _ in range(3)))
+        self.assertEqual(results, [1, 2, 3])
+        self.assertEqual(self.flight.counts, {'leader': 1, 'coalesced': 0, 'fallback': 2})
+
+        with override_settings(REQUEST_COALESCING_TIMEOUT=1):
+            self.calls = 0
+            results = await asyncio.gather(*(self.flight.ado('key', compute) for _ in range(3)))
+        self.assertEqual(results, [1, 1, 1])
+        self.assertEqual(self.flight.counts['coalesced'], 2)
+
+
+class ChangeFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ScoringEngineParityTest.setUpTestData.__func__(cls)
+
+    def setUp(self):
+        catalog_changed()
+        self.addCleanup(catalog_changed)
+
+    def assert_parity(self):
+        for query in ScoringEngineParityTest.queries + [['sneezing'], ['rash']]:
+            self.assertEqual(symptom_index.match(query), full_scan(query))
+
+    def answers(self):
+        queries = ScoringEngineParityTest.queries + [['sneezing'], ['rash'], ['sneezin'], ['feverr']]
+        return (
+            [symptom_index.match(query, limit=None) for query in queries],
+            [symptom_index.match_idf(query, limit=None) for query in queries],
+            [fuzzy_index.match(query, limit=None) for query in queries],
+            [suggest_index.suggest(prefix) for prefix in ['s', 'sn', 'f', 'fev', 'itchy', 'skin', 'r']],
+            [sparse_engine.match(query, limit=None) for query in queries] if HAS_NUMPY else [],
+        )
+
+    def assert_patched(self, catalog, state, generation):
+        """The catalog and index were patched in place and answer like ones rebuilt from the database"""
+        self.assertIs(compact_catalog.current(), catalog)
+        self.assertIs(symptom_index._get_state(), state)
+        self.assertEqual(state.generation, generation)
+        self.assert_parity()
+
+        patched = self.answers()
+        compact_catalog.invalidate()
+        self.assertEqual(patched, self.answers())
+
+    def test_writes_patch_built_indexes(self):
+        self.assert_parity()
+        self.answers()
+        catalog = compact_catalog.get()
+        state = symptom_index._get_state()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.create(name='Hay Fever', symptoms='sneezing, itchy skin', disease_code='T999')
+            eczema = Disease.objects.get(name='Eczema')
+            eczema.symptoms = 'rash'
+            eczema.save()
+            Disease.objects.filter(name='Typhoid').delete()
+
+        self.assertEqual(suggest_index.suggest('sn'), [('sneezing', 1)])
+        self.assert_patched(catalog, state, 3)
+        self.assertEqual(CatalogChange.objects.filter(version=current_version()).count(), 1)
+
+    def test_insert(self):
+        catalog = compact_catalog.get()
+        state = symptom_index._get_state()
+        self.answers()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hay_fever = Disease.objects.create(name='Hay Fever', symptoms='Sneezing, fever', disease_code='T999')
+
+        self.assertEqual(symptom_index.match(['sneezing'])[0], (hay_fever.id, 1, 50.0))
+        self.assertEqual(suggest_index.suggest('fe'), [('fever', 4)])
+        self.assert_patched(catalog, state, 1)
+
+    def test_rename_moves_position(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            hay_fever = Disease.objects.create(name='Hay Fever', symptoms='sneezing', disease_code='T998')
+            pollen = Disease.objects.create(name='Pollen Allergy', symptoms='sneezing', disease_code='T999')
+        catalog = compact_catalog.get()
+        state = symptom_index._get_state()
+        self.assertEqual([match[0] for match in symptom_index.match(['sneezing'], limit=2)], [hay_fever.id, pollen.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pollen.name = 'Allergic Rhinitis'
+            pollen.save()
+
+        # Ties are ranked by the new name
+        self.assertEqual([match[0] for match in symptom_index.match(['sneezing'], limit=2)], [pollen.id, hay_fever.id])
+        self.assertEqual(compact_catalog.records([pollen.id])[pollen.id]['name'], 'Allergic Rhinitis')
+        self.assert_patched(catalog, state, 1)
+
+    def test_delete(self):
+        catalog = compact_catalog.get()
+        state = symptom_index._get_state()
+        self.answers()
+        typhoid_id = Disease.objects.get(name='Typhoid').id
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.filter(pk=typhoid_id).delete()
+
+        self.assertNotIn(typhoid_id, [match[0] for match in symptom_index.match(['fever'], limit=None)])
+        self.assertEqual(compact_catalog.records([typhoid_id]), {})
+        self.assertEqual(len(catalog), Disease.objects.count())
+        self.assert_patched(catalog, state, 1)
+
+    def test_queryset_delete_is_one_change(self):
+        catalog = compact_catalog.get()
+        state = symptom_index._get_state()
+        self.answers()
+        version = current_version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Disease.objects.filter(name__in=['Typhoid', 'Migraine', 'Eczema']).delete()
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(current_version(), version + 1)
+        self.assertEqual(CatalogChange.objects.filter(version=version + 1).count(), 3)
+        self.assert_patched(catalog, state, 1)
+
+    @override_settings(CATALOG_COMPACT_MIN_ROWS=0)
+    def test_compacts_mostly_patched_catalog(self):
+        catalog = compact_catalog.get()
+        with self.captureOnCommitCallbacks(execute=True), batched_changes():
+            for disease in Disease.objects.all():
+                disease.save()
+
+        self.assertIsNot(compact_catalog.get(), catalog)
+        self.assertEqual(compact_catalog.get().generation, 0)
+        self.assert_parity()
+
+    def test_poll_applies_changes_of_other_processes(self):
+        catalog_feed._next_poll = 0
+        catalog_feed.poll()
+        self.assert_parity()
+
+        # Without running on-commit callbacks, as in another process
+        Disease.objects.create(name='Hay Fever', symptoms='sneezing', disease_code='T999')
+        self.assertNotEqual(symptom_index.match(['sneezing']), full_scan(['sneezing']))
+
+        catalog_feed._next_poll = 0
+        catalog_feed.poll()
+        self.assertEqual(catalog_feed.version, current_version())
+        self.assert_parity()
+
+
+class CompactCatalogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ScoringEngineParityTest.setUpTestData.__func__(cls)
+        Disease.objects.filter(name__in=['Influenza', 'Eczema']).update(contagious=True, chronic=True)
+
+    def setUp(self):
+        compact_catalog.invalidate()
+        self.addCleanup(compact_catalog.invalidate)
+
+    def assert_matches_rows(self):
+        rows = list(Disease.objects.values(*SYMPTOM_CHECKER_COLUMNS))
+        records = compact_catalog.records([row['id'] for row in rows] + [0])
+        self.assertEqual(len(records), len(rows))
+        for row in rows:
+            self.assertEqual({column: records[row['id']][column] for column in row}, row)
+
+    def test_records_match_database_rows(self):
+        self.assert_matches_rows()
+        footprint = compact_catalog.get().footprint()
+        self.assertEqual(footprint['total'], sum(footprint.values()) - footprint['total'])
+
+    def test_changes_are_merged(self):
+        self.assert_matches_rows()
+        with self.captureOnCommitCallbacks(execute=True):
+            Disease.objects.create(name='Hay Fever', symptoms='sneezing, Fever', disease_code='T999', chronic=True)
+            Disease.objects.filter(name='Typhoid').delete()
+        self.assertTrue(compact_catalog.is_built)
+        self.assert_matches_rows()
+
+
+class IdfRankingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rows = [
+            ('Flu', 'fever, fatigue, pain'),
+            ('Strain', 'pain, fatigue'),
+            ('Backache', 'pain'),
+            ('Lupus', 'butterfly rash, fatigue, joint pain, fever'),
+        ]
+        for code, (name, symptoms) in enumerate(rows):
+            Disease.objects.create(name=name, symptoms=symptoms, disease_code=f'T{code:03d}')
+
+    def setUp(self):
+        catalog_changed()
+
+    def check(self, url, data):
+        response = self.client.post(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_rare_symptoms_outrank_generic_ones(self):
+        results = self.check('/api/symptom-checker/?ranking=idf', {'symptoms': ['pain', 'rash']})
+        self.assertEqual([result['name'] for result in results], ['Lupus', 'Backache', 'Strain', 'Flu'])
+        scores = [result['score'] for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+        # Same candidates and match scores as the default ranking, which has no score
+        default = self.check('/api/symptom-checker/', {'symptoms': ['pain', 'rash']})
+        self.assertNotIn('score', default[0])
+        self.assertEqual(
+            sorted((r['name'], r['match_score']) for r in default),
+            sorted((r['name'], r['match_score']) for r in results)
+        )
+
+    def test_weights_are_computed_once_per_generation(self):
+        state = symptom_index._get_state()
+        with mock.patch.object(type(state), 'length_norms', wraps=state.length_norms) as length_norms:
+            results = symptom_index.match_idf(['pain', 'rash'])
+            symptom_index.match_idf(['fever'])
+            self.assertEqual(length_norms.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Disease.objects.create(name='Sciatica', symptoms='pain, numbness', disease_code='T999')
+            self.assertIs(symptom_index._get_state(), state)
+            self.assertNotEqual(symptom_index.match_idf(['pain', 'rash']), results)
+            self.assertEqual(length_norms.call_count, 2)
+
+        # Same weights as an index built from scratch
+        patched = symptom_index.match_idf(['pain', 'rash', 'numbness'])
+        catalog_changed()
+        self.assertEqual(symptom_index.match_idf(['pain', 'rash', 'numbness']), patched)
+
+    def test_fast_serializer_matches_drf(self):
+        [match] = symptom_index.match_idf(['rash'], limit=1)
+        disease = Disease.objects.get(pk=match[0])
+        disease.match_score, disease.match_percentage, disease.score = match[1], match[2], match[4]
+        row = Disease.objects.values(*SYMPTOM_CHECKER_COLUMNS).get(pk=match[0])
+        self.assertEqual(
+            json.dumps(symptom_checker_result_data(row, match[1], match[2], None, match[4])),
+            json.dumps(SymptomCheckerResultSerializer(disease).data)
+        )
+
+    def test_not_available_with_fuzzy(self):
+        response = self.client.post(
+            '/api/symptom-checker/', {'symptoms': ['pain'], 'fuzzy': True, 'ranking': 'idf'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogSnapshotTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ScoringEngineParityTest.setUpTestData.__func__(cls)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'catalog.snapshot')
+        call_command('build_snapshot', output=self.path, stdout=io.StringIO())
+
+        compact_catalog.invalidate()
+        self.addCleanup(compact_catalog.invalidate)
+
+    def test_first_build_uses_current_snapshot(self):
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            for query in ScoringEngineParityTest.queries:
+                self.assertEqual(symptom_index.match(query), full_scan(query))
+            self.assertTrue(compact_catalog.current().mapped)
+
+            # Changes are applied on top of the warm-started catalog, after copying it
+            with self.captureOnCommitCallbacks(execute=True):
+                disease = Disease.objects.create(name='Hay Fever', symptoms='sneezing', disease_code='T999')
+            self.assertFalse(compact_catalog.current().mapped)
+            self.assertEqual(symptom_index.match(['sneezing'])[0], (disease.id, 1, 100.0))
+            self.assertEqual(symptom_index.match(['sneezing']), full_scan(['sneezing']))
+
+    def test_first_request_keeps_snapshot(self):
+        version = catalog_feed.version
+        self.addCleanup(setattr, catalog_feed, 'version', version)
+        catalog_changed()
+        catalog_feed.version = None
+        catalog_feed._next_poll = 0
+
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            response = self.client.post('/api/symptom-checker/', {'symptoms': ['fever']}, content_type='application/json')
+            self.assertEqual(
+                [result['id'] for result in response.json()['results']],
+                [disease_id for disease_id, _, _ in full_scan(['fever'])]
+            )
+            self.assertEqual(catalog_feed.version, current_version())
+            self.assertTrue(compact_catalog.current().mapped)
+
+    def test_stale_snapshot_is_rewritten(self):
+        # Without running on-commit callbacks, as in another process
+        Disease.objects.create(name='Hay Fever', symptoms='fever', disease_code='T999')
+        self.assertFalse(snapshot.snapshot_is_current(self.path))
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            self.assertEqual(symptom_index.match(['fever']), full_scan(['fever']))
+            self.assertFalse(compact_catalog.current().mapped)
+            self.assertTrue(snapshot.snapshot_is_current(self.path))
+
+            # The next process maps the rewritten snapshot
+            compact_catalog.invalidate()
+            self.assertEqual(symptom_index.match(['fever']), full_scan(['fever']))
+            self.assertTrue(compact_catalog.current().mapped)
+
+        stdout = io.StringIO()
+        call_command('build_snapshot', output=self.path, if_stale=True, stdout=stdout)
+        self.assertIn('is current', stdout.getvalue())
+        Disease.objects.filter(disease_code='T999').delete()
+        call_command('build_snapshot', output=self.path, if_stale=True, stdout=stdout)
+        self.assertIn('Wrote snapshot of 9 diseases', stdout.getvalue())
+
+    def test_index_starts_from_snapshot(self):
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            state = symptom_index.build(compact_catalog.get())
+            built = symptom_index.build(CompactCatalog(compact_catalog.get().rows()))
+            self.assertEqual(state.terms, built.terms)
+            self.assertEqual([list(posting) for posting in state.postings], [list(posting) for posting in built.postings])
+            self.assertEqual(list(state.doc_counts), list(built.doc_counts))
+            self.assertTrue(all(isinstance(posting, memoryview) for posting in state.postings))
+            for query in ScoringEngineParityTest.queries:
+                self.assertEqual(symptom_index.match(query), full_scan(query))
+                self.assertEqual(symptom_index.match_idf(query), symptom_index.match_idf(query, state=built))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Disease.objects.create(name='Hay Fever', symptoms='fever, sneezing', disease_code='T999')
+            for query in ScoringEngineParityTest.queries + [['sneezing']]:
+                self.assertEqual(symptom_index.match(query), full_scan(query))
+
+    def test_snapshot_serves_database_loaded_from_same_file(self):
+        csv_file = os.path.join(os.path.dirname(self.path), 'diseases.csv')
+        with open(csv_file, 'w') as file:
+            file.write(
+                'Name,Symptoms,Treatments,Disease_Code,Contagious,Chronic\n'
+                'Influenza,"Fever, cough",Rest,D001,True,False\n'
+                'Migraine,"Headache, nausea",,D002,False,True\n'
+                'Common Cold,"Cough, sneezing",Rest,D003,True,False\n'
+            )
+        call_command('load_diseases', csv_file=csv_file, stdout=io.StringIO())
+        self.assertEqual(CatalogVersion.objects.get(pk=1).source_hash, snapshot.source_digest(csv_file))
+        call_command('build_snapshot', output=self.path, stdout=io.StringIO())
+        old_ids = set(Disease.objects.values_list('id', flat=True))
+
+        # A fresh database loaded from the same file assigns other ids
+        Disease.objects.all().delete()
+        call_command('load_diseases', csv_file=csv_file, stdout=io.StringIO())
+        self.assertFalse(old_ids & set(Disease.objects.values_list('id', flat=True)))
+        self.assertTrue(snapshot.snapshot_is_current(self.path))
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            for query in [['fever'], ['cough'], ['headache', 'sneezing']]:
+                self.assertEqual(symptom_index.match(query), full_scan(query))
+            catalog = compact_catalog.current()
+            self.assertTrue(catalog.mapped)
+            disease = Disease.objects.get(disease_code='D002')
+            self.assertEqual(catalog.records([disease.id])[disease.id]['name'], 'Migraine')
+
+        # Edited afterwards, it no longer matches the file
+        disease.save()
+        self.assertEqual(CatalogVersion.objects.get(pk=1).source_hash, '')
+        self.assertFalse(snapshot.snapshot_is_current(self.path))
+
+    def test_truncated_snapshot_is_ignored(self):
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) // 2)
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.CatalogSnapshot(self.path)
+        self.assertFalse(snapshot.snapshot_is_current(self.path))
+
+    def test_close_releases_views(self):
+        with snapshot.CatalogSnapshot(self.path) as mapped:
+            ids = mapped.buffers()['ids']
+            self.assertEqual(list(ids), [row[0] for row in compact_catalog.get().rows()])
+        with self.assertRaises(ValueError):
+            ids[0]
@@ -1,10 +1,22 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('diseases/', views.DiseaseListView.as_view(), name='disease-list'),
+    path('diseases/export/', views.disease_export, name='disease-export'),
     path('diseases/<int:pk>/', views.DiseaseDetailView.as_view(), name='disease-detail'),
     path('symptom-checker/', views.symptom_checker, name='symptom-checker'),
+    path('symptom-checker/batch/', views.symptom_checker_batch, name='symptom-checker-batch'),
+    path('symptoms/suggest/', views.symptom_suggest, name='symptom-suggest'),
     path('stats/', views.disease_stats, name='disease-stats'),
     path('health/', views.health_check, name='health-check'),
+    path('health/live/', views.liveness_check, name='health-live'),
+    path('health/ready/', views.readiness_check, name='health-ready'),
+    path('metrics/', views.metrics, name='metrics'),
+    # Coroutine variants for ASGI deployments, same response shapes
+    path('async/diseases/', async_views.disease_list, name='async-disease-list'),
+    path('async/diseases/<int:pk>/', async_views.disease_detail, name='async-disease-detail'),
+    path('async/symptom-checker/', async_views.symptom_checker, name='async-symptom-checker'),
+    path('async/stats/', async_views.disease_stats, name='async-disease-stats'),
+    path('async/health/', async_views.health_check, name='async-health-check'),
 ]
@@ -1,50 +1,130 @@
+import csv
+import json
+from functools import partial
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
-from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_GET
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.encoders import JSONEncoder
+from .caching import catalog_cached, disease_last_modified
+from .catalog import compact_catalog
+from .coalescing import disease_list_flight, symptom_checker_flight
+from .fast_serializers import (
+    DISEASE_COLUMNS, DISEASE_LIST_FIELDS, SYMPTOM_CHECKER_COLUMNS,
+    disease_data, symptom_checker_result_data
+)
+from .fuzzy import fuzzy_index
+from .index import symptom_index
+from .instrumentation import metrics_registry, phase, profiling_enabled
 from .models import Disease
+from .result_cache import canonical_query, get_result_cache
+from .scoring import get_scoring_engine
+from .search import get_search_backend
+from .stats import get_stats
+from .suggest import suggest_index
 from .serializers import (
     DiseaseSerializer, DiseaseListSerializer,
-    SymptomCheckerSerializer, SymptomCheckerResultSerializer
+    SymptomCheckerSerializer, SymptomCheckerBatchSerializer,
+    SymptomSuggestQuerySerializer
 )
 
+# Number of batch queries whose matched diseases are fetched together
+SYMPTOM_CHECKER_CHUNK_SIZE = 100
+
+# Rows fetched per database round trip by the streaming export
+EXPORT_CHUNK_SIZE = 2000
+
+
+def disease_list_queryset(params):
+    """Filtered, searched and ordered queryset behind the disease list endpoints"""
+    # Only the columns DiseaseListSerializer returns
+    queryset = Disease.objects.only(*DISEASE_LIST_FIELDS)
+
+    # Filter by contagious
+    contagious = params.get('contagious', None)
+    if contagious is not None:
+        contagious_bool = contagious.lower() in ['true', '1', 'yes']
+        queryset = queryset.filter(contagious=contagious_bool)
+
+    # Filter by chronic
+    chronic = params.get('chronic', None)
+    if chronic is not None:
+        chronic_bool = chronic.lower() in ['true', '1', 'yes']
+        queryset = queryset.filter(chronic=chronic_bool)
+
+    # Search functionality, ranked by relevance where the backend supports it
+    search = params.get('search', None)
+    if search:
+        return get_search_backend(queryset.db).search(queryset, search)
+
+    return queryset.order_by('name')
+
+
+class DiseasePageNumberPagination(PageNumberPagination):
+    """DRF page numbers, with an empty ?page= meaning the first page"""
+
+    def get_page_number(self, request, paginator):
+        return super().get_page_number(request, paginator) or 1
+
+
+class DiseaseCursorPagination(CursorPagination):
+    """Keyset pagination on (name, id): no COUNT(*) and no OFFSET scans"""
+    ordering = ('name', 'id')
 
+
+@method_decorator(catalog_cached, name='dispatch')
 class DiseaseListView(generics.ListAPIView):
     """
-    List all diseases with search and filtering capabilities
+    List all diseases with search and filtering capabilities.
+
+    Pass ?pagination=cursor to page with opaque cursors instead of page
+    numbers; cursor pages are ordered by name and omit the total count.
+    Searches are ranked by relevance, which cursors cannot page through, so
+    they always use page numbers.
     """
     serializer_class = DiseaseListSerializer
-    pagination_class = PageNumberPagination
+    pagination_class = DiseasePageNumberPagination
+    cursor_pagination_class = DiseaseCursorPagination
 
-    def get_queryset(self):
-        queryset = Disease.objects.all()
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' and not params.get('search'):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
-        # Search functionality
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(symptoms__icontains=search) |
-                Q(disease_code__icontains=search)
-            )
+    def list(self, request, *args, **kwargs):
+        # Identical concurrent searches share one query
+        if request.query_params.get('search'):
+            return Response(disease_list_flight.do(request.build_absolute_uri(), self.list_data))
+        return Response(self.list_data())
 
-        # Filter by contagious
-        contagious = self.request.query_params.get('contagious', None)
-        if contagious is not None:
-            contagious_bool = contagious.lower() in ['true', '1', 'yes']
-            queryset = queryset.filter(contagious=contagious_bool)
+    def list_data(self):
+        # Fast path: values() rows already have the DiseaseListSerializer shape
+        queryset = self.filter_queryset(self.get_queryset()).values(*DISEASE_LIST_FIELDS)
 
-        # Filter by chronic
-        chronic = self.request.query_params.get('chronic', None)
-        if chronic is not None:
-            chronic_bool = chronic.lower() in ['true', '1', 'yes']
-            queryset = queryset.filter(chronic=chronic_bool)
+        with phase('fetch'):
+            page = self.paginate_queryset(queryset)
+            rows = list(page if page is not None else queryset)
+        if page is not None:
+            return self.get_paginated_response(rows).data
+        return rows
 
-        return queryset.order_by('name')
+    def get_queryset(self):
+        return disease_list_queryset(self.request.query_params)
 
 
+@method_decorator(catalog_cached(last_modified_func=disease_last_modified), name='dispatch')
 class DiseaseDetailView(generics.RetrieveAPIView):
     """
     Retrieve a specific disease by ID
@@ -52,75 +132,333 @@ class DiseaseDetailView(generics.RetrieveAPIView):
     queryset = Disease.objects.all()
     serializer_class = DiseaseSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        # Fast path: build the DiseaseSerializer shape from a values() row
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        with phase('fetch'):
+            row = self.get_queryset().filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values(*DISEASE_COLUMNS).first()
+        if row is None:
+            raise Http404
+        with phase('serialize'):
+            data = disease_data(row)
+        return Response(data)
+
+
+def get_symptom_engine(options):
+    """
+    Return the engine scoring queries with validated FuzzyMatchOptionsSerializer data;
+    BM25 weights live in the inverted index, so ranking=idf always uses it
+    """
+    if options.get('fuzzy'):
+        return fuzzy_index
+    if options.get('ranking') == 'idf':
+        return symptom_index
+    return get_scoring_engine()
+
+
+def get_symptom_matcher(options):
+    """
+    Return the match_many callable for validated FuzzyMatchOptionsSerializer data
+    """
+    if options.get('fuzzy'):
+        return partial(fuzzy_index.match_many, threshold=options.get('similarity_threshold'))
+    if options.get('ranking') == 'idf':
+        return partial(symptom_index.match_many, ranking='idf')
+    return get_scoring_engine().match_many
+
+
+def with_query_options(data, query_params):
+    """Request data with ?ranking= applied unless the body sets it"""
+    if 'ranking' in query_params and isinstance(data, dict) and 'ranking' not in data:
+        return {**data, 'ranking': query_params['ranking']}
+    return data
+
+
+def symptom_checker_responses(queries, options=None):
+    """
+    Yield one symptom-checker payload per (input_symptoms, top_k) query.
+
+    Queries are scored by the shared scoring engine and the matched
+    diseases are fetched in chunks, so a batch costs one small query per
+    chunk rather than a full table load per query. Matches found in the
+    result cache skip scoring.
+    """
+    options = options or {}
+    match_many = get_symptom_matcher(options)
+    result_cache = None if options.get('fuzzy') else get_result_cache()
+
+    for start in range(0, len(queries), SYMPTOM_CHECKER_CHUNK_SIZE):
+        chunk = queries[start:start + SYMPTOM_CHECKER_CHUNK_SIZE]
+
+        if result_cache is not None:
+            keys = result_cache.make_keys(chunk, options.get('ranking', 'match'))
+            cached = result_cache.get_many(keys)
+        else:
+            keys = [None] * len(chunk)
+            cached = {}
+        pending = [query for query, key in zip(chunk, keys) if key not in cached]
+
+        # Score the uncached queries with the configured engine (inverted index by default)
+        with phase('score'):
+            pending_matches = iter(match_many(pending) if pending else [])
+        computed = {}
+        chunk_matches = []
+        for key in keys:
+            matches = cached.get(key)
+            if matches is None:
+                matches = computed[key] = next(pending_matches)
+            chunk_matches.append(matches)
+
+        with phase('fetch'):
+            diseases = fetch_symptom_checker_rows(chunk_matches)
+        with phase('serialize'):
+            payloads = [
+                symptom_checker_payload(input_symptoms, symptom_checker_results(matches, diseases))
+                for (input_symptoms, _), matches in zip(chunk, chunk_matches)
+            ]
+
+        if result_cache is not None and computed:
+            result_cache.set_many(computed)
+        yield from payloads
+
+
+def use_compact_catalog():
+    return getattr(settings, 'SYMPTOM_CHECKER_CATALOG', True)
+
+
+def fetch_symptom_checker_rows(chunk_matches):
+    """
+    Return {id: values(*SYMPTOM_CHECKER_COLUMNS) row} for every disease in a
+    list of match lists, as compact catalog records unless SYMPTOM_CHECKER_CATALOG is off
+    """
+    if use_compact_catalog():
+        return compact_catalog.records({match[0] for matches in chunk_matches for match in matches})
+    return {
+        row['id']: row
+        for row in Disease.objects.filter(
+            pk__in={match[0] for matches in chunk_matches for match in matches}
+        ).values(*SYMPTOM_CHECKER_COLUMNS)
+    }
+
+
+def symptom_checker_results(matches, diseases):
+    """
+    Serialize engine matches with a {id: values(*SYMPTOM_CHECKER_COLUMNS) row or record} mapping
+    """
+    results = []
+    for disease_id, match_score, match_percentage, *details in matches:
+        row = diseases.get(disease_id)
+        if row is None:  # Deleted since the engine was built
+            continue
+        # Same shape as (Fuzzy)SymptomCheckerResultSerializer
+        results.append(symptom_checker_result_data(row, match_score, match_percentage, *details))
+    return results
+
+
+def symptom_checker_key(input_symptoms, limit, options):
+    """Single-flight key of a symptom-checker query"""
+    if options.get('fuzzy'):
+        # Fuzzy results echo the input spelling
+        return ('fuzzy', options.get('similarity_threshold'), limit, tuple(input_symptoms))
+    return (options.get('ranking', 'match'), limit, canonical_query(input_symptoms))
+
+
+def symptom_checker_payload(input_symptoms, results):
+    return {
+        'input_symptoms': input_symptoms,
+        'total_matches': len(results),
+        'results': results
+    }
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def _export_ndjson(rows):
+    encoder = JSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def _export_csv(rows):
+    fields = DiseaseSerializer.Meta.fields
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([
+            json.dumps(row[field]) if isinstance(row[field], list) else row[field]
+            for field in fields
+        ])
+
+
+@require_GET
+def disease_export(request):
+    """
+    Stream the whole catalog in DiseaseSerializer shape.
+
+    ?format=ndjson (default) or csv; list fields are JSON-encoded in CSV.
+    ?since=<ISO datetime> limits the export to diseases updated at or after
+    that time (deletions are not reported). Rows are read with a server-side
+    iterator so memory use does not grow with the catalog.
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return JsonResponse({'format': ['Must be one of: ndjson, csv.']}, status=400)
+
+    queryset = Disease.objects.all()
+    since = request.GET.get('since')
+    if since:
+        since_datetime = parse_datetime(since)
+        if since_datetime is None:
+            return JsonResponse({'since': ['Must be an ISO 8601 datetime.']}, status=400)
+        queryset = queryset.filter(updated_at__gte=since_datetime).order_by('updated_at', 'id')
+    else:
+        queryset = queryset.order_by('id')
+
+    rows = (
+        disease_data(row)
+        for row in queryset.values(*DISEASE_COLUMNS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    if export_format == 'csv':
+        response = StreamingHttpResponse(_export_csv(rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="diseases.csv"'
+        return response
+    return StreamingHttpResponse(_export_ndjson(rows), content_type='application/x-ndjson')
+
 
 @api_view(['POST'])
 def symptom_checker(request):
     """
     Check symptoms against disease database and return ranked matches
     """
-    serializer = SymptomCheckerSerializer(data=request.data)
+    serializer = SymptomCheckerSerializer(data=with_query_options(request.data, request.query_params))
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     input_symptoms = serializer.validated_data['symptoms']
+    options = serializer.validated_data
 
-    # Get all diseases and calculate match scores
-    diseases = Disease.objects.all()
-    results = []
+    # Identical concurrent queries share one scoring run
+    results = symptom_checker_flight.do(
+        symptom_checker_key(input_symptoms, 10, options),
+        lambda: next(symptom_checker_responses([(input_symptoms, 10)], options))['results']
+    )
+    return Response(symptom_checker_payload(input_symptoms, results))
 
-    for disease in diseases:
-        match_score = disease.symptom_match_score(input_symptoms)
-        if match_score > 0:  # Only include diseases with at least one symptom match
-            total_symptoms = len(disease.get_symptoms_list())
-            match_percentage = (match_score / max(len(input_symptoms), total_symptoms)) * 100
 
-            # Add match data to disease object for serialization
-            disease.match_score = match_score
-            disease.match_percentage = round(match_percentage, 2)
-            results.append(disease)
+@api_view(['POST'])
+def symptom_checker_batch(request):
+    """
+    Check many symptom lists in one request.
 
-    # Sort by match score (descending) and then by match percentage
-    results.sort(key=lambda x: (-x.match_score, -x.match_percentage))
+    Returns {"count", "results"} where each result has the same shape as a
+    symptom_checker response. With ?stream=true the results are streamed as
+    newline-delimited JSON, one line per query, in request order.
+    """
+    serializer = SymptomCheckerBatchSerializer(data=with_query_options(request.data, request.query_params))
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    # Limit to top 10 results
-    results = results[:10]
+    queries = [
+        (query['symptoms'], query['top_k'])
+        for query in serializer.validated_data['queries']
+    ]
+    responses = symptom_checker_responses(queries, serializer.validated_data)
 
-    serializer = SymptomCheckerResultSerializer(results, many=True)
+    if request.query_params.get('stream', '').lower() in ['true', '1', 'yes']:
+        encoder = JSONEncoder()
+        return StreamingHttpResponse(
+            (encoder.encode(payload) + '\n' for payload in responses),
+            content_type='application/x-ndjson'
+        )
 
     return Response({
-        'input_symptoms': input_symptoms,
-        'total_matches': len(results),
-        'results': serializer.data
+        'count': len(queries),
+        'results': list(responses)
     })
 
 
 @api_view(['GET'])
-def disease_stats(request):
+def symptom_suggest(request):
     """
-    Get statistics about the disease database
+    Suggest canonical symptom phrases for a prefix, most common first
     """
-    total_diseases = Disease.objects.count()
-    contagious_count = Disease.objects.filter(contagious=True).count()
-    chronic_count = Disease.objects.filter(chronic=True).count()
+    serializer = SymptomSuggestQuerySerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    query = serializer.validated_data['q']
+    suggestions = suggest_index.suggest(query, limit=serializer.validated_data['limit'])
 
     return Response({
-        'total_diseases': total_diseases,
-        'contagious_diseases': contagious_count,
-        'chronic_diseases': chronic_count,
-        'non_contagious_diseases': total_diseases - contagious_count,
-        'non_chronic_diseases': total_diseases - chronic_count,
+        'query': query,
+        'results': [
+            {'symptom': symptom, 'disease_count': disease_count}
+            for symptom, disease_count in suggestions
+        ]
     })
 
 
+@catalog_cached
+@api_view(['GET'])
+def disease_stats(request):
+    """
+    Get statistics about the disease database
+    """
+    return Response(get_stats())
+
+
 @api_view(['GET'])
 def health_check(request):
     """
     Simple health check endpoint to verify backend is working
     """
+    stats = get_stats()
     return Response({
         'status': 'healthy',
         'backend': 'django',
         'database_connected': True,
-        'diseases_loaded': Disease.objects.count() > 0,
-        'total_diseases': Disease.objects.count()
+        'diseases_loaded': stats['total_diseases'] > 0,
+        'total_diseases': stats['total_diseases']
     })
+
+
+@require_GET
+def metrics(request):
+    """
+    Request metrics in Prometheus text format; 404 unless REQUEST_PROFILING is on
+    """
+    if not profiling_enabled():
+        raise Http404
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['GET'])
+def liveness_check(request):
+    """
+    Liveness probe: the process is up and serving requests, no database access
+    """
+    return Response({'status': 'alive'})
+
+
+@api_view(['GET'])
+def readiness_check(request):
+    """
+    Readiness probe: the disease catalog is loaded, read from the cached stats snapshot
+    """
+    stats = get_stats()
+    ready = stats['total_diseases'] > 0
+    return Response(
+        {
+            'status': 'ready' if ready else 'not ready',
+            'total_diseases': stats['total_diseases'],
+        },
+        status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
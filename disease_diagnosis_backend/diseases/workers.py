@@ -0,0 +1,18 @@
+"""
+Process entry point of the parallel scoring engine's workers.
+
+Nothing from the app is imported at module load, so a worker started with
+the spawn or forkserver method (the default on macOS and Windows) can
+unpickle its initializer and set Django up before diseases.parallel and
+the models it depends on are imported.
+"""
+import django
+from django.apps import apps
+
+
+def init_worker(rows):
+    """Set Django up unless inherited from a forked parent, then load the shard"""
+    if not apps.ready:
+        django.setup()
+    from .parallel import _init_worker
+    _init_worker(rows)